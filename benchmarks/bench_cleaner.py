@@ -0,0 +1,64 @@
+"""Benchmark de clean_demand: motor vectorizado vs iterativo.
+
+Escala el catálogo de cloud/ replicando cada SKU `--escala` veces y mide
+ambos motores sobre los mismos datos, verificando que la salida sea idéntica.
+
+    python benchmarks/bench_cleaner.py --escala 10
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.cleaner import clean_demand
+
+BASE = os.path.join(os.path.dirname(__file__), "..", "cloud")
+
+
+def cargar_escalado(escala: int):
+    df_demanda = pd.read_csv(os.path.join(BASE, "demanda.csv"), encoding="utf-8-sig")
+    df_stock = pd.read_csv(os.path.join(BASE, "stock_historico.csv"), encoding="utf-8-sig")
+
+    def replicar(df):
+        copias = [df.assign(sku=df["sku"] + f"-R{i}") if i else df for i in range(escala)]
+        return pd.concat(copias, ignore_index=True)
+
+    return replicar(df_demanda), replicar(df_stock)
+
+
+def medir(demanda, stock, motor):
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = clean_demand(demanda, stock, motor=motor)
+    return time.perf_counter() - t0, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--escala", type=int, default=10)
+    parser.add_argument("--sin-iterativo", action="store_true", help="Mide solo el motor vectorizado")
+    args = parser.parse_args()
+
+    df_demanda, df_stock = cargar_escalado(args.escala)
+    demanda = df_demanda.to_dict(orient="records")
+    stock = df_stock.to_dict(orient="records")
+    print(f"📊 Escala x{args.escala}: {df_demanda['sku'].nunique()} SKUs, {len(df_demanda)} filas de demanda")
+
+    t_vec, res_vec = medir(demanda, stock, "vectorizado")
+    print(f"⚡ vectorizado: {t_vec:.2f} seg")
+
+    if not args.sin_iterativo:
+        t_ite, res_ite = medir(demanda, stock, "iterativo")
+        print(f"🐢 iterativo: {t_ite:.2f} seg")
+        pd.testing.assert_frame_equal(pd.DataFrame(res_vec), pd.DataFrame(res_ite))
+        print(f"✅ Salidas idénticas. Aceleración: x{t_ite / t_vec:.0f}")
+
+
+if __name__ == "__main__":
+    main()
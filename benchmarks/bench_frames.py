@@ -0,0 +1,87 @@
+"""Benchmark de memoria y latencia: cadena en registros vs cadena en DataFrames.
+
+Sobre los datos de cloud/ ejecuta limpieza → forecast → proyección de dos
+formas y compara tiempo y pico de memoria (tracemalloc) de cada etapa:
+
+- registros: como antes, con to_dict(orient="records") y pd.DataFrame(...)
+  entre etapas (clean_demand devuelve registros y project_stock_multi los recibe).
+- frames: clean_demand_df / forecast_engine / project_stock_multi con DataFrames.
+
+    python benchmarks/bench_frames.py [--backend numpy]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("PLANITY_EJECUTOR", "serial")  # todo en el proceso medido
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.cleaner import clean_demand, clean_demand_df
+from services.forecast import forecast_engine
+from services.pipeline import ARCHIVOS, leer_csv
+from services.stock_projector import project_stock_multi
+
+COLUMNAS_FORECAST = ["sku", "fecha", "demanda", "demanda_sin_outlier"]
+
+
+def medir(funcion, *args):
+    """(resultado, segundos, pico MB): el tiempo se mide sin tracemalloc y el pico en otra ejecución."""
+    t0 = time.perf_counter()
+    resultado = funcion(*args)
+    segundos = time.perf_counter() - t0
+    tracemalloc.start()
+    funcion(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, pico / 2**20
+
+
+def cadena_registros(tablas, backend):
+    etapas = {}
+    limpia, *etapas["limpieza"] = medir(lambda: pd.DataFrame(clean_demand(
+        tablas["demanda"].to_dict(orient="records"), tablas["stock_historico"].to_dict(orient="records"))))
+    limpia["demanda"] = limpia["demanda_sin_outlier"]
+    forecast, *etapas["forecast"] = medir(lambda: forecast_engine(limpia[COLUMNAS_FORECAST], backend=backend).fillna(0))
+    proyeccion, *etapas["proyeccion"] = medir(lambda: pd.DataFrame(project_stock_multi(
+        *[tablas[n].to_dict(orient="records") if n != "forecast" else forecast.to_dict(orient="records")
+          for n in ("forecast", "stock_actual", "reposiciones", "maestro")])))
+    return (limpia, forecast, proyeccion), etapas
+
+
+def cadena_frames(tablas, backend):
+    etapas = {}
+    limpia, *etapas["limpieza"] = medir(clean_demand_df, tablas["demanda"], tablas["stock_historico"])
+    limpia["demanda"] = limpia["demanda_sin_outlier"]
+    forecast, *etapas["forecast"] = medir(lambda: forecast_engine(limpia[COLUMNAS_FORECAST], backend=backend).fillna(0))
+    proyeccion, *etapas["proyeccion"] = medir(
+        project_stock_multi, forecast, tablas["stock_actual"], tablas["reposiciones"], tablas["maestro"])
+    return (limpia, forecast, proyeccion), etapas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default=None, help="Backend del SES (statsmodels | numpy)")
+    args = parser.parse_args()
+
+    base = os.path.join(os.path.dirname(__file__), "..", "cloud")
+    tablas = {nombre: leer_csv(os.path.join(base, archivo), nombre) for nombre, archivo in ARCHIVOS.items()}
+
+    salidas = {}
+    for nombre, cadena in (("registros", cadena_registros), ("frames", cadena_frames)):
+        salidas[nombre], etapas = cadena(tablas, args.backend)
+        total = sum(s for s, _ in etapas.values())
+        detalle = ", ".join(f"{etapa} {s:.2f} seg / {mb:.0f} MB" for etapa, (s, mb) in etapas.items())
+        print(f"📊 {nombre}: {total:.2f} seg ({detalle})")
+
+    for a, b in zip(salidas["registros"], salidas["frames"]):
+        assert a.to_dict(orient="records") == b.to_dict(orient="records")
+    print("✅ Salidas idénticas")
+
+
+if __name__ == "__main__":
+    main()
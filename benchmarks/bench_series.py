@@ -0,0 +1,98 @@
+"""Benchmark de la representación compacta de series por SKU (services/series.py).
+
+Genera demanda semanal sintética (por defecto 50k SKUs × 5 años) y compara:
+
+- memoria: formato largo como lo tenía la limpieza (sku, semana, demanda
+  int64 y dos columnas float) frente a catálogo + matriz int32 (sku × semana);
+- armado: reindex con MultiIndex frente a series_por_sku;
+- agregación mensual: to_period('M') + groupby frente a series_mensuales.
+
+    python benchmarks/bench_series.py [--skus 50000] [--semanas 260]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.forecast import series_mensuales
+from services.series import codificar_skus, ordinal_semana, series_por_sku
+
+
+def demanda_sintetica(n_skus, n_semanas, semilla=0):
+    """Formato largo con ~30 % de semanas sin registro (demanda intermitente)."""
+    rng = np.random.default_rng(semilla)
+    skus = np.array([f"SKU{i:06d}" for i in range(n_skus)], dtype=object)
+    lunes = pd.date_range("2020-01-06", periods=n_semanas, freq="W-MON").to_numpy()
+    presente = rng.random((n_skus, n_semanas)) < 0.7
+    fila, semana = np.nonzero(presente)
+    return pd.DataFrame({
+        "sku": skus[fila],
+        "fecha": lunes[semana] + rng.integers(0, 7, len(fila)).astype("timedelta64[D]"),
+        "demanda": rng.poisson(3, len(fila)).astype(np.int64),
+    })
+
+
+def cronometrar(funcion):
+    t0 = time.perf_counter()
+    resultado = funcion()
+    return resultado, time.perf_counter() - t0
+
+
+def largo_reindexado(df):
+    """Formato largo de la limpieza anterior: todas las semanas de cada SKU."""
+    df = df.assign(semana=df["fecha"] - pd.to_timedelta(df["fecha"].dt.weekday, unit="D"))
+    df = df[["sku", "semana", "demanda"]].rename(columns={"demanda": "demanda_original"})
+    index = pd.MultiIndex.from_product([df["sku"].unique(), sorted(df["semana"].unique())], names=["sku", "semana"])
+    df = df.set_index(["sku", "semana"]).reindex(index, fill_value=0).reset_index()
+    df["demanda_sin_stockout"] = np.nan
+    df["demanda_sin_outlier"] = np.nan
+    return df
+
+
+def compacto(df):
+    codigos, catalogo = codificar_skus(df["sku"])
+    return series_por_sku(codigos, ordinal_semana(df["fecha"]), df["demanda"].to_numpy(), catalogo)
+
+
+def mensual_pandas(df):
+    df = df.assign(mes=df["fecha"].dt.to_period("M"))
+    mensual = df.groupby(["sku", "mes"]).agg({"demanda": "sum", "demanda_sin_outlier": "sum"}).reset_index()
+    mensual["mes"] = mensual["mes"].dt.to_timestamp()
+    return mensual
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skus", type=int, default=50000)
+    parser.add_argument("--semanas", type=int, default=260)
+    args = parser.parse_args()
+
+    df = demanda_sintetica(args.skus, args.semanas)
+    print(f"📦 Demanda sintética: {len(df)} filas ({args.skus} SKUs × {args.semanas} semanas)")
+
+    largo, t_largo = cronometrar(lambda: largo_reindexado(df))
+    serie, t_compacto = cronometrar(lambda: compacto(df))
+    assert (largo["demanda_original"].to_numpy() == serie.valores.ravel()).all()
+
+    mb_largo = largo.memory_usage(deep=True).sum() / 2**20
+    mb_compacto = (serie.skus.memory_usage(deep=True) + serie.valores.nbytes + serie.periodos.nbytes) / 2**20
+    print(f"📊 Largo reindexado: {mb_largo:.0f} MB, armado {t_largo:.2f} seg")
+    print(f"📊 Compacto ({serie.valores.dtype}): {mb_compacto:.0f} MB, armado {t_compacto:.2f} seg "
+          f"({mb_compacto / mb_largo:.1%} de la memoria)")
+    del largo
+
+    df["demanda_sin_outlier"] = df["demanda"]
+    mensual, t_pandas = cronometrar(lambda: mensual_pandas(df))
+    (skus, limites, meses, sumas), t_series = cronometrar(lambda: series_mensuales(df, ["demanda", "demanda_sin_outlier"]))
+    assert (mensual["demanda"].to_numpy() == sumas["demanda"]).all()
+    assert (mensual["mes"].to_numpy() == meses).all()
+    print(f"📊 Agregación mensual: to_period + groupby {t_pandas:.2f} seg, series_mensuales {t_series:.2f} seg")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Suite de benchmarks: etapas y endpoints sobre datasets sintéticos a varias escalas.
+
+Para cada escala genera un dataset con benchmarks/generador.py (la forma de
+cloud/ multiplicada por la escala), mide cada etapa de servicio sobre las
+tablas leídas como las lee el pipeline y cada endpoint con el cliente ASGI
+de FastAPI, y guarda un JSON con tiempos (por repetición, mediana y
+mínimo), filas y pico de memoria (tracemalloc, en una corrida aparte) en
+benchmarks/resultados/. Dos resultados se comparan con benchmarks/comparar.py.
+
+    python benchmarks/bench_suite.py --escalas 1,10,100 --repeticiones 3
+
+La caché de forecast se desactiva salvo con --con-cache (en una carpeta
+temporal) para que los tiempos no dependan de corridas anteriores. Los
+endpoints que devuelven JSON por registros se omiten cuando superan
+--max-filas-json filas.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+from benchmarks.generador import escribir_dataset, generar_dataset
+
+
+def _configurar_entorno(args, temporal: str) -> str:
+    """Variables de entorno leídas al importar los servicios; devuelve la carpeta de datos."""
+    carpeta = os.path.join(temporal, "cloud")
+    os.environ["PLANITY_CLOUD_DIR"] = carpeta
+    os.environ["PLANITY_METRICAS_LOG"] = "0"
+    os.environ["PLANITY_FORECAST_CACHE"] = "1" if args.con_cache else "0"
+    os.environ["PLANITY_FORECAST_CACHE_PATH"] = os.path.join(temporal, "forecast.sqlite")
+    if args.ejecutor:
+        os.environ["PLANITY_EJECUTOR"] = args.ejecutor
+    if args.backend:
+        os.environ["PLANITY_FORECAST_BACKEND"] = args.backend
+    return carpeta
+
+
+def _silencioso(funcion):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return funcion()
+
+
+def medir(funcion, repeticiones: int, memoria: bool, preparar=None) -> tuple:
+    """(resultado de la primera corrida, métricas) de `funcion` sin argumentos.
+
+    `preparar` se llama antes de cada corrida y no se mide (p. ej. vaciar cachés).
+    """
+    segundos, resultado = [], None
+    for i in range(repeticiones):
+        if preparar:
+            preparar()
+        t0 = time.perf_counter()
+        salida = _silencioso(funcion)
+        segundos.append(round(time.perf_counter() - t0, 4))
+        if i == 0:
+            resultado = salida
+    metricas = {"segundos": segundos, "mediana": statistics.median(segundos), "minimo": min(segundos)}
+    if memoria:
+        if preparar:
+            preparar()
+        tracemalloc.start()
+        try:
+            _silencioso(funcion)
+            metricas["pico_memoria_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return resultado, metricas
+
+
+def _filas(resultado):
+    import pandas as pd
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    if isinstance(resultado, dict) and all(isinstance(v, pd.DataFrame) for v in resultado.values()):
+        return {nombre: len(df) for nombre, df in resultado.items()}
+    return None
+
+
+def medir_etapas(carpeta: str, args) -> tuple:
+    """Cada etapa de servicio, encadenando la salida de una como entrada de la siguiente."""
+    import pandas as pd
+    from services.pipeline import ARCHIVOS, _limpiar, leer_csv
+    from services.forecast import forecast_engine, generar_comparativa_forecasts, precargar_backends
+    from services.stock_projector import project_stock_multi
+    from services.inventory_managment import gestion_inventario_lote
+    from services.resumen_utils import consolidar_historico_stock
+    # statsmodels fija "always" para sus avisos de convergencia al importarse: ruido en la salida.
+    # Se importa antes (y fuera de las mediciones) para poder silenciarlos
+    precargar_backends()
+    warnings.simplefilter("ignore")
+
+    etapas = {}
+
+    def registrar(nombre, funcion, preparar=None):
+        resultado, metricas = medir(funcion, args.repeticiones, not args.sin_memoria, preparar)
+        metricas["filas"] = _filas(resultado)
+        etapas[nombre] = metricas
+        print(f"   ⏱️ {nombre}: {metricas['mediana']:.3f} seg (mediana)", flush=True)
+        return resultado
+
+    def leer():
+        return {nombre: leer_csv(os.path.join(carpeta, archivo), nombre) for nombre, archivo in ARCHIVOS.items()}
+
+    tablas = registrar("lectura_csv", leer, lambda: shutil.rmtree(os.path.join(carpeta, ".columnar"), ignore_errors=True))
+    tablas = registrar("lectura_columnar", leer)
+
+    # Limpieza como en el pipeline (clean_demand_df + columnas 'demanda' y 'fecha' para el forecast)
+    limpia = registrar("limpieza", lambda: _limpiar(tablas["demanda"], tablas["stock_historico"]))
+    columnas = limpia[["sku", "fecha", "demanda", "demanda_sin_outlier"]]
+    # Como en /forecast: la comparativa reutiliza los ajustes SES del forecast
+    ajustes = {}
+    forecast = registrar("forecast", lambda: forecast_engine(columnas, ajustes=ajustes).fillna(0))
+    registrar("comparativa", lambda: generar_comparativa_forecasts(columnas, ajustes=ajustes))
+    maestro, repos, actual = tablas["maestro"], tablas["reposiciones"], tablas["stock_actual"]
+    registrar("proyeccion", lambda: project_stock_multi(forecast, actual, repos, maestro).fillna(0))
+
+    # Entradas tipadas como las prepara /gestion_inventario
+    forecast_gi = forecast.assign(mes=pd.to_datetime(forecast["mes"], errors="coerce"))
+    repos_gi = repos.assign(fecha=pd.to_datetime(repos["fecha"], errors="coerce"))
+    registrar("gestion_inventario", lambda: gestion_inventario_lote(
+        forecast_gi, maestro.fillna(0), limpia.fillna(0), actual.fillna(0), repos_gi.fillna(0)
+    ))
+    registrar("resumen", lambda: consolidar_historico_stock(limpia.fillna(0), maestro.fillna(0)))
+    return etapas, {"limpieza": len(limpia), "forecast": len(forecast)}
+
+
+def medir_endpoints(carpeta: str, filas: dict, args) -> dict:
+    """Cada endpoint con el cliente ASGI (TestClient), como lo llamaría el frontend."""
+    from fastapi.testclient import TestClient
+    import main
+    from services import pipeline, dataset_store
+
+    cliente = TestClient(main.app)
+    endpoints = {}
+    estado = {}
+
+    def vaciar():
+        with pipeline._lock:
+            pipeline._estado.clear()
+
+    def registrar(nombre, funcion, preparar=None, omitir=None):
+        if omitir:
+            endpoints[nombre] = {"omitido": omitir}
+            print(f"   ⏭️ {nombre}: omitido ({omitir})", flush=True)
+            return None
+        respuesta, metricas = medir(funcion, args.repeticiones, not args.sin_memoria, preparar)
+        # Algunos endpoints informan el error en el cuerpo con código 200
+        if respuesta.status_code >= 400 or respuesta.content.startswith(b'{"error"'):
+            raise RuntimeError(f"❌ {nombre} respondió {respuesta.status_code}: {respuesta.text[:300]}")
+        metricas["codigo"] = respuesta.status_code
+        metricas["bytes_respuesta"] = len(respuesta.content)
+        endpoints[nombre] = metricas
+        print(f"   ⏱️ {nombre}: {metricas['mediana']:.3f} seg (mediana)", flush=True)
+        return respuesta
+
+    def cargar():
+        return cliente.get("/cloud/cargar_desde_nube", params={"formato": "ndjson"})
+
+    respuesta = registrar("GET /cloud/cargar_desde_nube (pipeline completo)", cargar, vaciar)
+    estado["dataset_id"] = json.loads(respuesta.text.split("\n", 1)[0])["dataset_id"]
+    registrar("GET /cloud/cargar_desde_nube (sin cambios)", cargar)
+
+    def trabajo():
+        respuesta = cliente.post("/cloud/trabajos")
+        trabajo_id = respuesta.json()["trabajo_id"]
+        while cliente.get(f"/cloud/trabajos/{trabajo_id}").json()["estado"] in ("en_cola", "en_curso"):
+            time.sleep(0.05)
+        return cliente.get(f"/cloud/trabajos/{trabajo_id}/resultado", params={"formato": "ndjson"})
+
+    registrar("POST /cloud/trabajos (hasta el resultado)", trabajo, vaciar)
+
+    dataset = {"dataset_id": estado["dataset_id"]}
+    # Los endpoints posteriores leen el dataset guardado; se vuelve a guardar por si venció
+    if dataset_store.obtener_dataset(dataset["dataset_id"]) is None:
+        estado["dataset_id"] = json.loads(cargar().text.split("\n", 1)[0])["dataset_id"]
+        dataset = {"dataset_id": estado["dataset_id"]}
+    registrar("GET /cloud/demanda_limpia", lambda: cliente.get(
+        "/cloud/demanda_limpia", params={**dataset, "formato": "ndjson"}))
+    registrar("GET /cloud/stock_historico", lambda: cliente.get("/cloud/stock_historico", params={"formato": "ndjson"}))
+    registrar("POST /gestion_inventario/", lambda: cliente.post("/gestion_inventario/", json=dataset))
+    registrar("POST /resumen_general", lambda: cliente.post("/resumen_general", json=dataset))
+    grande = filas["forecast"] > args.max_filas_json
+    registrar("POST /proyeccion-stock", lambda: cliente.post("/proyeccion-stock", json=dataset),
+              omitir=f"{filas['forecast']} filas > --max-filas-json" if grande else None)
+
+    def subir():
+        with open(os.path.join(carpeta, "demanda.csv"), "rb") as demanda, \
+                open(os.path.join(carpeta, "stock_historico.csv"), "rb") as stock:
+            return cliente.post("/limpiar-demanda", files={"demanda": demanda, "stock": stock})
+
+    grande = filas["limpieza"] > args.max_filas_json
+    registrar("POST /limpiar-demanda", subir,
+              omitir=f"{filas['limpieza']} filas > --max-filas-json" if grande else None)
+    cliente.close()
+    return endpoints
+
+
+def _commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True).stdout.strip()
+        sucio = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=RAIZ,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-sucio" if sucio else "") if commit else "desconocido"
+    except OSError:
+        return "desconocido"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--escalas", default="1,10,100", help="Escalas del catálogo separadas por coma")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--ejecutor", choices=("serial", "hilos", "procesos"), help="PLANITY_EJECUTOR")
+    parser.add_argument("--backend", choices=("statsmodels", "numpy"), help="PLANITY_FORECAST_BACKEND")
+    parser.add_argument("--con-cache", action="store_true", help="Usa la caché de forecast (temporal)")
+    parser.add_argument("--sin-memoria", action="store_true", help="No hace la corrida extra con tracemalloc")
+    parser.add_argument("--sin-endpoints", action="store_true")
+    parser.add_argument("--max-filas-json", type=int, default=500000)
+    parser.add_argument("--salida", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados"))
+    args = parser.parse_args()
+
+    temporal = tempfile.mkdtemp(prefix="planity_bench_")
+    carpeta = _configurar_entorno(args, temporal)
+    import numpy as np
+    import pandas as pd
+
+    informe = {
+        "commit": _commit(),
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "entorno": {
+            "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "cpus": os.cpu_count(), "plataforma": platform.platform(),
+        },
+        "config": {k: v for k, v in vars(args).items() if k != "salida"},
+        "escalas": [],
+    }
+    try:
+        for escala in [int(e) for e in args.escalas.split(",")]:
+            t0 = time.perf_counter()
+            tablas = generar_dataset(escala, args.semilla)
+            escribir_dataset(tablas, carpeta)
+            resultado = {
+                "escala": escala,
+                "generacion_segundos": round(time.perf_counter() - t0, 2),
+                "tablas": {nombre: {"filas": len(df), "skus": int(df["sku"].nunique())} for nombre, df in tablas.items()},
+            }
+            del tablas
+            print(f"📦 Escala x{escala}: {resultado['tablas']['demanda']['skus']} SKUs con demanda, "
+                  f"{resultado['tablas']['demanda']['filas']} filas", flush=True)
+
+            resultado["etapas"], filas = medir_etapas(carpeta, args)
+            if not args.sin_endpoints:
+                resultado["endpoints"] = medir_endpoints(carpeta, filas, args)
+            # ru_maxrss (KB en Linux) es el pico del proceso hasta aquí, no solo de esta escala
+            resultado["rss_pico_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            informe["escalas"].append(resultado)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    os.makedirs(args.salida, exist_ok=True)
+    ruta = os.path.join(args.salida, f"{datetime.datetime.now():%Y%m%d-%H%M%S}_{informe['commit']}.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"✅ Resultados en {ruta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compara dos resultados de benchmarks/bench_suite.py (base y nuevo).
+
+Muestra la mediana de cada etapa y endpoint en ambos, el cociente
+nuevo / base y marca como regresión lo que supere --umbral (por defecto
+x1.25). Con --estricto termina con código 1 si hay regresiones.
+
+    python benchmarks/comparar.py resultados/base.json resultados/nuevo.json
+"""
+import argparse
+import json
+import sys
+
+
+def medianas(informe: dict) -> dict:
+    """{(escala, grupo, nombre): (mediana, pico de memoria)} de un resultado."""
+    filas = {}
+    for escala in informe["escalas"]:
+        for grupo in ("etapas", "endpoints"):
+            for nombre, metricas in escala.get(grupo, {}).items():
+                if "mediana" in metricas:
+                    filas[(escala["escala"], grupo, nombre)] = (metricas["mediana"], metricas.get("pico_memoria_bytes"))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--umbral", type=float, default=1.25)
+    parser.add_argument("--estricto", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.nuevo, encoding="utf-8") as f:
+        nuevo = json.load(f)
+    print(f"📊 {base['commit']} → {nuevo['commit']}")
+
+    datos_base, datos_nuevo = medianas(base), medianas(nuevo)
+    regresiones = 0
+    for clave in sorted(set(datos_base) & set(datos_nuevo)):
+        (t_base, m_base), (t_nuevo, m_nuevo) = datos_base[clave], datos_nuevo[clave]
+        cociente = t_nuevo / t_base if t_base else float("inf")
+        marca = "⚠️ regresión" if cociente > args.umbral else "✅ mejora" if cociente < 1 / args.umbral else ""
+        regresiones += cociente > args.umbral
+        memoria = f"  mem {m_base / 2**20:.0f} → {m_nuevo / 2**20:.0f} MB" if m_base and m_nuevo else ""
+        escala, grupo, nombre = clave
+        print(f"x{escala:<4} {grupo:<9} {nombre:<50} {t_base:9.3f} → {t_nuevo:9.3f} seg  x{cociente:5.2f}{memoria}  {marca}")
+    for clave in sorted(set(datos_base) ^ set(datos_nuevo)):
+        print(f"x{clave[0]:<4} {clave[1]:<9} {clave[2]:<50} solo en {'base' if clave in datos_base else 'nuevo'}")
+
+    if args.estricto and regresiones:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
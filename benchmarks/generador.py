@@ -0,0 +1,194 @@
+"""Generador de datasets sintéticos con la forma de los CSV de cloud/.
+
+A escala 1 reproduce el tamaño del catálogo real (413 SKUs con demanda
+semanal de 174 semanas, ~1 900 SKUs con stock mensual, ~2 100 con stock
+actual, ~830 en el maestro y ~890 reposiciones); cada escala multiplica
+todos los catálogos. La demanda mezcla perfiles:
+
+- regular (Poisson con estacionalidad) e intermitente (pocas semanas con
+  demanda: más de la mitad de las semanas en 0, como en cloud/);
+- quiebres de stock: meses con stock < 4 en los que la demanda semanal cae;
+- SKUs obsoletos: sin demanda y con stock 0 registrado en los últimos meses;
+- altas tardías (semanas iniciales en 0) y outliers puntuales.
+
+    python benchmarks/generador.py --escala 10 --carpeta /tmp/cloud_x10
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Tamaños de cloud/ (escala 1)
+SKUS_DEMANDA = 413
+SKUS_SOLO_STOCK = 1458
+SKUS_SOLO_ACTUAL = 207
+SKUS_MAESTRO = 826
+REPOSICIONES = 886
+SKUS_CON_REPOSICION = 613
+
+PRIMER_LUNES = "2022-01-03"
+SEMANAS = 174
+PRIMER_MES = "2022-01-01"
+MESES_STOCK = 40
+FECHA_STOCK_ACTUAL = "2025-05-06"
+MESES_REPOSICION = pd.date_range("2025-05-01", periods=5, freq="MS")
+
+CATEGORIAS = {
+    "CL": "COLLAR PERRO", "AB": "ARNÉS BODY", "AR": "ARNÉS CLÁSICO", "CR": "CORREA",
+    "RV": "ARNÉS REVERSIBLE", "AC": "ACCESORIOS", "CP": "CAMA PERRO",
+}
+FRACCION_OBSOLETOS = 0.06
+FRACCION_AGOTADOS = 0.5
+FRACCION_INTERMITENTES = 0.45
+FRACCION_ALTAS_TARDIAS = 0.15
+MESES_OBSOLETO = 14
+
+
+def _nombres(n: int, desde: int, rng) -> tuple:
+    prefijos = np.array(list(CATEGORIAS))[rng.integers(0, len(CATEGORIAS), n)]
+    ids = np.arange(desde, desde + n)
+    skus = np.char.add(np.char.add(prefijos.astype(str), "-"), np.char.add(np.char.zfill(ids.astype(str), 6), "-1"))
+    return skus.astype(object), prefijos
+
+
+def generar_dataset(escala: int = 1, semilla: int = 0) -> dict:
+    """Tablas demanda, stock_historico, stock_actual, reposiciones y maestro (columnas de cloud/)."""
+    rng = np.random.default_rng(semilla)
+    n_dem = SKUS_DEMANDA * escala
+    n_hist = n_dem + SKUS_SOLO_STOCK * escala
+    n_total = n_hist + SKUS_SOLO_ACTUAL * escala
+    skus, prefijos = _nombres(n_total, 0, rng)
+
+    lunes = pd.date_range(PRIMER_LUNES, periods=SEMANAS, freq="W-MON")
+    meses = pd.date_range(PRIMER_MES, periods=MESES_STOCK, freq="MS")
+    # Mes (índice en `meses`) de cada semana; las semanas posteriores al último mes quedan en el último
+    mes_semana = np.minimum((lunes.year - meses[0].year) * 12 + lunes.month - meses[0].month, MESES_STOCK - 1)
+
+    # --- Demanda semanal (n_dem × SEMANAS) ---
+    nivel = rng.lognormal(0.6, 1.0, n_dem)
+    estacion = 1 + 0.3 * np.sin(2 * np.pi * (np.arange(SEMANAS) / 52 + rng.random((n_dem, 1))))
+    demanda = rng.poisson(nivel[:, None] * estacion)
+    intermitente = rng.random(n_dem) < FRACCION_INTERMITENTES
+    activa = rng.random((n_dem, SEMANAS)) < rng.uniform(0.1, 0.6, (n_dem, 1))
+    demanda = np.where(intermitente[:, None] & ~activa, 0, demanda)
+    outlier = rng.random((n_dem, SEMANAS)) < 0.004
+    demanda = np.where(outlier, demanda + rng.integers(10, 60, (n_dem, SEMANAS)), demanda)
+    alta = np.where(rng.random(n_dem) < FRACCION_ALTAS_TARDIAS, rng.integers(10, SEMANAS // 2, n_dem), 0)
+    demanda[np.arange(SEMANAS) < alta[:, None]] = 0
+
+    # --- Stock mensual (n_hist × MESES_STOCK) con quiebres y obsoletos ---
+    cobertura = rng.uniform(0.5, 8, (n_hist, 1))
+    nivel_stock = np.concatenate([nivel, rng.lognormal(0.6, 1.0, n_hist - n_dem)])
+    stock = np.round(nivel_stock[:, None] * 4.3 * cobertura * rng.uniform(0.3, 1.7, (n_hist, MESES_STOCK))).astype(np.int64)
+    # Quiebres: tramos de 1 a 3 meses con stock < 4
+    for _ in range(3):
+        inicio = rng.integers(0, MESES_STOCK, n_hist)
+        largo = rng.integers(1, 4, n_hist)
+        con_quiebre = rng.random(n_hist) < 0.6
+        tramo = (np.arange(MESES_STOCK) >= inicio[:, None]) & (np.arange(MESES_STOCK) < (inicio + largo)[:, None])
+        stock = np.where(tramo & con_quiebre[:, None], rng.integers(0, 4, (n_hist, MESES_STOCK)), stock)
+    # Descatalogados sin reponer: stock 0 desde un mes al azar (los obsoletos, al menos 14 meses)
+    agotado = rng.random(n_hist) < FRACCION_AGOTADOS
+    desde = rng.integers(MESES_STOCK // 4, MESES_STOCK, n_hist)
+    stock[agotado[:, None] & (np.arange(MESES_STOCK) >= desde[:, None])] = 0
+    obsoleto = rng.random(n_hist) < FRACCION_OBSOLETOS
+    stock[obsoleto, -MESES_OBSOLETO:] = 0
+    stock = np.where(rng.random((n_hist, MESES_STOCK)) < 0.003, -rng.integers(1, 7, (n_hist, MESES_STOCK)), stock)
+
+    # La demanda cae en los meses sin stock y desaparece en los SKUs obsoletos
+    sin_stock = stock[:n_dem][:, mes_semana] < 4
+    demanda = np.where(sin_stock & (rng.random((n_dem, SEMANAS)) < 0.6), 0, demanda)
+    demanda[obsoleto[:n_dem][:, None] & (mes_semana >= MESES_STOCK - MESES_OBSOLETO)] = 0
+
+    tablas = {}
+    tablas["demanda"] = pd.DataFrame({
+        "sku": np.repeat(skus[:n_dem], SEMANAS),
+        "fecha": np.tile(lunes.strftime("%Y-%m-%d").to_numpy(), n_dem),
+        "demanda": demanda.ravel(),
+    })
+
+    # Registros de stock: fin de mes, con meses sin registro (cobertura por SKU) y algún doble registro
+    presencia = rng.random((n_hist, MESES_STOCK)) < rng.uniform(0.3, 1.0, (n_hist, 1))
+    presencia[obsoleto, -MESES_OBSOLETO:] = True
+    fila, mes = np.nonzero(presencia)
+    fin_de_mes = (meses + pd.offsets.MonthEnd(0)).strftime("%Y-%m-%d").to_numpy()
+    historico = pd.DataFrame({"sku": skus[fila], "stock": stock[fila, mes], "fecha": fin_de_mes[mes]})
+    dobles = historico.sample(frac=0.02, random_state=semilla).assign(stock=0)
+    dobles["fecha"] = dobles["fecha"].str.slice(0, 8) + "01"
+    tablas["stock_historico"] = pd.concat([historico, dobles], ignore_index=True).sort_values(
+        ["fecha", "sku"], kind="stable", ignore_index=True
+    )
+
+    actual = np.concatenate([np.maximum(stock[:, -1], 0), rng.integers(0, 80, n_total - n_hist)])
+    actual = np.where(rng.random(n_total) < 0.3, 0, actual)
+    tablas["stock_actual"] = pd.DataFrame({
+        "sku": skus, "descripcion": [f"Producto {s}" for s in skus], "stock": actual, "fecha": FECHA_STOCK_ACTUAL,
+    })
+
+    con_reposicion = rng.choice(n_total, SKUS_CON_REPOSICION * escala, replace=False)
+    n_repos = REPOSICIONES * escala
+    tablas["reposiciones"] = pd.DataFrame({
+        "sku": skus[np.concatenate([con_reposicion, rng.choice(con_reposicion, n_repos - len(con_reposicion))])],
+        "fecha": MESES_REPOSICION.strftime("%Y-%m-%d").to_numpy()[rng.integers(0, len(MESES_REPOSICION), n_repos)],
+        "cantidad": rng.choice([0, 30, 45, 50, 60, 80, 100, 150, 200, 450], n_repos),
+    })
+
+    # Maestro: ~80 % de los SKUs con demanda y el resto de otros; algunos sin costo ni precio
+    n_maestro = SKUS_MAESTRO * escala
+    en_maestro = np.concatenate([
+        rng.choice(n_dem, int(n_dem * 0.8), replace=False),
+        n_dem + rng.choice(n_total - n_dem, n_maestro - int(n_dem * 0.8), replace=False),
+    ])
+    costo = rng.integers(1, 9, n_maestro).astype(float)
+    margen = rng.integers(2, 26, n_maestro).astype(float)
+    sin_precio = rng.random(n_maestro) < 0.057
+    costo[sin_precio] = np.nan
+    margen[sin_precio] = np.nan
+    tablas["maestro"] = pd.DataFrame({
+        "sku": skus[en_maestro],
+        "descripcion": [f"Producto {s}" for s in skus[en_maestro]],
+        "costo_fabricacion": costo,
+        "precio_venta": costo + margen,
+        "categoria": [CATEGORIAS[p] for p in prefijos[en_maestro]],
+        "margen": margen,
+    })
+    return tablas
+
+
+# Nombre de archivo de cada tabla, como en services.pipeline.ARCHIVOS
+ARCHIVOS = {
+    "demanda": "demanda.csv",
+    "stock_historico": "stock_historico.csv",
+    "stock_actual": "stock_actual.csv",
+    "reposiciones": "reposiciones.csv",
+    "maestro": "maestro_productos.csv",
+}
+
+
+def escribir_dataset(tablas: dict, carpeta: str) -> dict:
+    """Escribe las tablas como CSV en `carpeta` y devuelve {nombre: ruta}."""
+    os.makedirs(carpeta, exist_ok=True)
+    rutas = {}
+    for nombre, df in tablas.items():
+        rutas[nombre] = os.path.join(carpeta, ARCHIVOS[nombre])
+        # Enteros sin decimales aunque la columna tenga NaN (como en cloud/)
+        df.to_csv(rutas[nombre], index=False, float_format="%.10g")
+    return rutas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--escala", type=int, default=1)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--carpeta", required=True)
+    args = parser.parse_args()
+
+    tablas = generar_dataset(args.escala, args.semilla)
+    escribir_dataset(tablas, args.carpeta)
+    for nombre, df in tablas.items():
+        print(f"📦 {nombre}: {len(df)} filas, {df['sku'].nunique()} SKUs")
+
+
+if __name__ == "__main__":
+    main()
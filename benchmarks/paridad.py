@@ -0,0 +1,635 @@
+"""Paridad contra salidas de referencia ("golden") de los motores de cálculo.
+
+`capturar` guarda en benchmarks/golden/ las salidas de limpieza, forecast,
+comparativa, proyección y gestión de inventario del código original, el de
+COMMIT_REFERENCIA (anterior a las optimizaciones, extraído con git archive),
+sobre cloud/ y sobre un dataset sintético (benchmarks/generador.py).
+`verificar` corre cada motor actual (vectorizado, iterativo, ejecutor por
+hilos/procesos, caché de forecast, backend numpy…) contra esas salidas,
+columna por columna con su tolerancia, y muestra (y opcionalmente guarda en
+JSON) un informe de diferencias.
+
+Cada etapa se alimenta con la salida golden de la etapa anterior, así una
+diferencia en la limpieza no se arrastra al forecast y cada motor se evalúa
+por separado.
+
+La salida del código original depende de la versión de pandas (ver
+PREDICCION_SES en services/forecast.py): los golden se capturan con el
+Python de runtime.txt (el del deploy) y `verificar` falla si las versiones
+de Python, pandas o numpy no son las de la captura (--permitir-versiones
+lo convierte en un aviso).
+
+    python benchmarks/paridad.py capturar [--commit d9681ce]
+    python benchmarks/paridad.py verificar [--motores forecast.numpy,limpieza.iterativo]
+        [--tolerancia forecast.forecast=atol:1] [--informe /tmp/paridad.json]
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import warnings
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+from benchmarks.generador import ARCHIVOS, escribir_dataset, generar_dataset
+
+CARPETA_GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+# Último commit con las implementaciones originales (antes de las optimizaciones)
+COMMIT_REFERENCIA = "d9681ce"
+# Runtime del deploy ("python-3.10.8"): los golden se capturan con ese Python
+RUNTIME = os.path.join(RAIZ, "runtime.txt")
+DATASETS = ("cloud", "sintetico")
+# Fecha fija para gestión de inventario (por defecto usaría el mes actual)
+FECHA_ACTUAL = pd.Timestamp("2025-05-01")
+# Ejemplos de filas distintas por columna en el informe
+EJEMPLOS = 5
+
+EXACTO = {"atol": 0.0, "rtol": 0.0}
+
+# Salidas comparadas: columnas clave (una fila por clave) y tolerancia por columna
+SALIDAS = {
+    "limpieza": {
+        "claves": ("sku", "fecha"),
+        "columnas": {
+            "demanda_original": EXACTO, "demanda_sin_stockout": EXACTO,
+            "demanda_sin_outlier": EXACTO, "es_obsoleto": EXACTO,
+        },
+    },
+    "forecast": {
+        # Un mes sin demanda puede quedar a la vez como histórico y como proyección
+        "claves": ("sku", "mes", "tipo_mes"),
+        "columnas": {
+            "demanda": EXACTO, "demanda_limpia": EXACTO, "forecast": EXACTO, "forecast_up": EXACTO,
+            "metodo_forecast": EXACTO,
+        },
+    },
+    "comparativa": {
+        "claves": ("sku", "mes"),
+        "columnas": {
+            "forecast_promedio_movil": {"atol": 0.0, "rtol": 1e-12},
+            "forecast_ses": {"atol": 0.0, "rtol": 1e-9},
+            "real": EXACTO,
+        },
+    },
+    "proyeccion": {
+        "claves": ("sku", "mes"),
+        "columnas": {
+            "stock_inicial_mes": EXACTO, "repos_aplicadas": EXACTO, "forecast": EXACTO,
+            "stock_final_mes": EXACTO, "unidades_perdidas": EXACTO,
+            # Redondeada a 1 decimal: basta con que coincida el redondeo
+            "perdida_proyectada_euros": {"atol": 1e-9, "rtol": 0.0},
+        },
+    },
+    "gestion_inventario": {
+        "claves": ("sku",),
+        "columnas": {
+            "stock_actual": EXACTO, "unidades_en_camino": EXACTO, "demanda_mensual": EXACTO,
+            "stock_final_simulado": EXACTO, "accion": EXACTO, "costo_fabricacion": EXACTO,
+            "politica_demanda_mensual": EXACTO, "safety_stock": EXACTO, "rop_original": EXACTO,
+            "rop": EXACTO, "eoq": EXACTO,
+        },
+    },
+}
+
+
+# --- Entradas ---
+
+def _leer_original(ruta: str) -> pd.DataFrame:
+    # Como leía los CSV /cargar_desde_nube en el código original
+    df = pd.read_csv(ruta, encoding="utf-8-sig")
+    df.columns = df.columns.str.replace("\ufeff", "", regex=False).str.strip().str.lower()
+    return df
+
+
+def _leer_carpeta(carpeta: str, originales: bool = False) -> tuple:
+    """Tablas leídas como las lee el pipeline (o el código original) y huella del contenido de los CSV."""
+    from services.pipeline import leer_csv
+    huella = hashlib.blake2b(digest_size=16)
+    tablas = {}
+    for nombre in sorted(ARCHIVOS):
+        ruta = os.path.join(carpeta, ARCHIVOS[nombre])
+        with open(ruta, "rb") as f:
+            huella.update(f.read())
+        tablas[nombre] = _leer_original(ruta) if originales else leer_csv(ruta, nombre)
+    return tablas, huella.hexdigest()
+
+
+def cargar_entradas(dataset: str, originales: bool = False) -> tuple:
+    if dataset == "cloud":
+        return _leer_carpeta(os.path.join(RAIZ, "cloud"), originales)
+    temporal = tempfile.mkdtemp(prefix="planity_paridad_")
+    try:
+        escribir_dataset(generar_dataset(escala=1, semilla=0), temporal)
+        return _leer_carpeta(temporal, originales)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+def _entrada_forecast(golden: dict) -> pd.DataFrame:
+    # Como en el pipeline: 'demanda' del forecast es la demanda sin outliers
+    limpia = golden["limpieza"]
+    return pd.DataFrame({
+        "sku": limpia["sku"], "fecha": limpia["fecha"],
+        "demanda": limpia["demanda_sin_outlier"], "demanda_sin_outlier": limpia["demanda_sin_outlier"],
+    })
+
+
+def _entradas_gestion(tablas: dict, golden: dict) -> tuple:
+    # Tipos como los prepara /gestion_inventario sobre las tablas del pipeline
+    forecast = golden["forecast"].assign(mes=pd.to_datetime(golden["forecast"]["mes"], errors="coerce"))
+    repos = tablas["reposiciones"].fillna(0)
+    repos = repos.assign(fecha=pd.to_datetime(repos["fecha"], errors="coerce"),
+                         cantidad=pd.to_numeric(repos["cantidad"], errors="coerce").fillna(0))
+    return forecast, tablas["maestro"].fillna(0), golden["limpieza"], tablas["stock_actual"].fillna(0), repos
+
+
+# --- Motores actuales: (salida, función(tablas, golden) -> DataFrame) ---
+
+def _limpieza(motor="vectorizado", ejecucion=None):
+    def correr(tablas, golden):
+        from services.cleaner import clean_demand_df
+        return clean_demand_df(tablas["demanda"], tablas["stock_historico"], motor=motor, ejecucion=ejecucion)
+    return correr
+
+
+def _forecast(backend="statsmodels", ejecucion=None, cache=False):
+    def correr(tablas, golden):
+        from services.forecast import forecast_engine
+        entrada = _entrada_forecast(golden)
+        if not cache:
+            return forecast_engine(entrada, ejecucion=ejecucion, backend=backend, cache=False).fillna(0)
+        # Primera corrida llena una caché temporal; se compara la segunda, leída de la caché.
+        # Con `ajustes` se ajustan (y guardan) todos los SES, también los que la predicción
+        # "legado" no usa: así la segunda corrida lee de la caché con cualquier versión de pandas
+        from services import cache_forecast
+        temporal = tempfile.mkdtemp(prefix="planity_paridad_cache_")
+        ruta, cache_forecast.RUTA_CACHE = cache_forecast.RUTA_CACHE, os.path.join(temporal, "forecast.sqlite")
+        try:
+            forecast_engine(entrada, ejecucion=ejecucion, backend=backend, ajustes={}, cache=True)
+            antes = cache_forecast.estadisticas()
+            df = forecast_engine(entrada, ejecucion=ejecucion, backend=backend, ajustes={}, cache=True).fillna(0)
+            despues = cache_forecast.estadisticas()
+            if despues["aciertos"] == antes["aciertos"] or despues["fallos"] != antes["fallos"]:
+                raise ValueError("❌ La segunda corrida del forecast no se leyó entera de la caché")
+            return df
+        finally:
+            cache_forecast.RUTA_CACHE = ruta
+            shutil.rmtree(temporal, ignore_errors=True)
+    return correr
+
+
+def _comparativa(backend="statsmodels", reutilizar_ajustes=False):
+    def correr(tablas, golden):
+        from services.forecast import forecast_engine, generar_comparativa_forecasts
+        entrada = _entrada_forecast(golden)
+        ajustes = None
+        if reutilizar_ajustes:
+            ajustes = {}
+            forecast_engine(entrada, backend=backend, ajustes=ajustes, cache=False)
+        return generar_comparativa_forecasts(entrada, ajustes=ajustes, backend=backend)
+    return correr
+
+
+def _proyeccion(motor="vectorizado"):
+    def correr(tablas, golden):
+        from services.stock_projector import project_stock_multi
+        return project_stock_multi(
+            golden["forecast"], tablas["stock_actual"], tablas["reposiciones"], tablas["maestro"], motor=motor
+        ).fillna(0)
+    return correr
+
+
+def _gestion(evaluar_por_sku=False):
+    def correr(tablas, golden):
+        from services.inventory_managment import gestion_inventario_df
+        from services.evaluar_compra_sku import evaluar_compra_sku
+        forecast, maestro, limpia, stock, repos = _entradas_gestion(tablas, golden)
+        df = gestion_inventario_df(forecast, maestro, limpia, stock, repos, FECHA_ACTUAL)
+        if evaluar_por_sku:
+            # Simulación de compra SKU a SKU (referencia original) en lugar de la versión en lote
+            filas = [
+                evaluar_compra_sku(sku, fila.stock_actual, FECHA_ACTUAL, fila.demanda_mensual,
+                                   fila.safety_stock, fila.eoq, repos)
+                for sku, fila in df.iterrows()
+            ]
+            df["stock_final_simulado"] = [f["stock_final_simulado"] for f in filas]
+            df["accion"] = [f["accion"] for f in filas]
+        return df.rename_axis("sku").reset_index()
+    return correr
+
+
+HILOS = {"modo": "hilos", "workers": 2, "bloque": 64}
+PROCESOS = {"modo": "procesos", "workers": 2, "bloque": 64}
+
+MOTORES = {
+    "limpieza.vectorizado": ("limpieza", _limpieza()),
+    "limpieza.iterativo": ("limpieza", _limpieza("iterativo")),
+    "limpieza.hilos": ("limpieza", _limpieza(ejecucion=HILOS)),
+    "limpieza.procesos": ("limpieza", _limpieza(ejecucion=PROCESOS)),
+    "forecast.statsmodels": ("forecast", _forecast()),
+    "forecast.cache": ("forecast", _forecast(cache=True)),
+    "forecast.hilos": ("forecast", _forecast(ejecucion=HILOS)),
+    "forecast.procesos": ("forecast", _forecast(ejecucion=PROCESOS)),
+    "forecast.numpy": ("forecast", _forecast("numpy")),
+    "comparativa.statsmodels": ("comparativa", _comparativa()),
+    "comparativa.ajustes_forecast": ("comparativa", _comparativa(reutilizar_ajustes=True)),
+    "comparativa.numpy": ("comparativa", _comparativa("numpy")),
+    "proyeccion.vectorizado": ("proyeccion", _proyeccion()),
+    "proyeccion.iterativo": ("proyeccion", _proyeccion("iterativo")),
+    "gestion_inventario.lote": ("gestion_inventario", _gestion()),
+    "gestion_inventario.evaluar_por_sku": ("gestion_inventario", _gestion(evaluar_por_sku=True)),
+}
+# El backend numpy del SES no reproduce a statsmodels: solo se evalúa si se pide explícitamente
+MOTORES_OPCIONALES = ("forecast.numpy", "comparativa.numpy")
+
+
+# --- Código original (COMMIT_REFERENCIA): genera los golden ---
+
+@contextlib.contextmanager
+def codigo_original(commit: str):
+    """Durante el bloque, `services` se importa desde el árbol de `commit` y no desde el actual."""
+    temporal = tempfile.mkdtemp(prefix="planity_referencia_")
+    es_services = lambda modulo: modulo == "services" or modulo.startswith("services.")
+    try:
+        archivo = subprocess.run(["git", "archive", commit, "services"], cwd=RAIZ, capture_output=True, check=True).stdout
+        with tarfile.open(fileobj=io.BytesIO(archivo)) as tar:
+            tar.extractall(temporal, filter="data")
+        # Paquete regular: que no se mezcle con el services/ actual como paquete de espacio de nombres
+        open(os.path.join(temporal, "services", "__init__.py"), "a").close()
+        actuales = {m: sys.modules.pop(m) for m in list(sys.modules) if es_services(m)}
+        sys.path.insert(0, temporal)
+        try:
+            yield
+        finally:
+            sys.path.remove(temporal)
+            for modulo in [m for m in sys.modules if es_services(m)]:
+                del sys.modules[modulo]
+            sys.modules.update(actuales)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+class _PandasConHoy:
+    """pandas con "today" fijado en FECHA_ACTUAL (el código original usaba la fecha del sistema)."""
+
+    def __init__(self, modulo):
+        self._modulo = modulo
+
+    def to_datetime(self, valor, *args, **kwargs):
+        if isinstance(valor, str) and valor == "today":
+            return FECHA_ACTUAL
+        return self._modulo.to_datetime(valor, *args, **kwargs)
+
+    def __getattr__(self, nombre):
+        return getattr(self._modulo, nombre)
+
+
+def _limpieza_original(originales, golden):
+    from services.cleaner import clean_demand
+    return pd.DataFrame(clean_demand(originales["demanda"].to_dict(orient="records"),
+                                     originales["stock_historico"].to_dict(orient="records")))
+
+
+def _forecast_original(originales, golden):
+    from services.forecast import forecast_engine
+    return forecast_engine(_entrada_forecast(golden)).fillna(0)
+
+
+def _comparativa_original(originales, golden):
+    from services.forecast import generar_comparativa_forecasts
+    return generar_comparativa_forecasts(_entrada_forecast(golden)).fillna(0)
+
+
+def _proyeccion_original(originales, golden):
+    from services.stock_projector import project_stock_multi
+    # Tipos como los dejaba /cargar_desde_nube antes de proyectar
+    stock = originales["stock_actual"].assign(stock=pd.to_numeric(originales["stock_actual"]["stock"], errors="coerce").fillna(0))
+    repos = originales["reposiciones"].assign(
+        cantidad=pd.to_numeric(originales["reposiciones"]["cantidad"], errors="coerce").fillna(0))
+    return pd.DataFrame(project_stock_multi(
+        golden["forecast"].to_dict(orient="records"), stock.to_dict(orient="records"),
+        repos.to_dict(orient="records"), originales["maestro"].to_dict(orient="records"),
+    )).fillna(0)
+
+
+def _gestion_original(originales, golden):
+    """Bucle SKU a SKU de /gestion_inventario original, con fecha_actual = FECHA_ACTUAL."""
+    from services import inventory_managment
+    from services.inventory_managment import calcular_politicas_inventario
+    from services.evaluar_compra_sku import evaluar_compra_sku
+    inventory_managment.pd = _PandasConHoy(pd)
+    # Tablas como las recibía la ruta: las del payload de /cargar_desde_nube
+    df_forecast = golden["forecast"].assign(mes=pd.to_datetime(golden["forecast"]["mes"], errors="coerce"))
+    df_maestro = originales["maestro"].fillna(0)
+    df_demanda_limpia = golden["limpieza"]
+    df_stock = originales["stock_actual"].assign(
+        stock=pd.to_numeric(originales["stock_actual"]["stock"], errors="coerce").fillna(0)).fillna(0)
+    df_repos = originales["reposiciones"].fillna(0)
+    df_repos = df_repos.assign(fecha=pd.to_datetime(df_repos["fecha"], errors="coerce"),
+                               cantidad=pd.to_numeric(df_repos["cantidad"], errors="coerce").fillna(0))
+
+    filas = []
+    for sku in df_forecast['sku'].dropna().unique():
+        stock_actual = float(df_stock[df_stock['sku'] == sku]['stock'].iloc[0]) if sku in df_stock['sku'].values else 0
+        unidades_en_camino = float(df_repos[df_repos['sku'] == sku]['cantidad'].sum()) if sku in df_repos['sku'].values else 0
+        costo_fab = float(df_maestro[df_maestro['sku'] == sku]['costo_fabricacion'].iloc[0]) if sku in df_maestro['sku'].values else 0
+        forecast_4m = df_forecast[
+            (df_forecast['sku'] == sku) & (df_forecast['tipo_mes'] == 'proyección') & (df_forecast['mes'] >= FECHA_ACTUAL)
+        ]['forecast'].head(4)
+        demanda_mensual = int(round(forecast_4m.mean(), 0)) if not forecast_4m.empty else 0
+        politicas = calcular_politicas_inventario(df_forecast, sku, unidades_en_camino, df_maestro, df_demanda_limpia)
+        resultado = evaluar_compra_sku(sku, stock_actual, FECHA_ACTUAL, demanda_mensual,
+                                       politicas["safety_stock"], politicas["eoq"], df_repos)
+        filas.append({
+            "sku": sku, "stock_actual": stock_actual, "unidades_en_camino": unidades_en_camino,
+            "demanda_mensual": demanda_mensual, "stock_final_simulado": resultado["stock_final_simulado"],
+            "accion": resultado["accion"], "costo_fabricacion": costo_fab,
+            "politica_demanda_mensual": politicas["demanda_mensual"], "safety_stock": politicas["safety_stock"],
+            "rop_original": politicas["rop_original"], "rop": politicas["rop"], "eoq": politicas["eoq"],
+        })
+    return pd.DataFrame(filas)
+
+
+# Una etapa por salida, en orden: cada una se alimenta con los golden de las anteriores
+REFERENCIAS = {
+    "limpieza": _limpieza_original,
+    "forecast": _forecast_original,
+    "comparativa": _comparativa_original,
+    "proyeccion": _proyeccion_original,
+    "gestion_inventario": _gestion_original,
+}
+
+
+# --- Normalización y snapshots ---
+
+def _tipo(serie: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(serie):
+        return "booleano"
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return "fecha"
+    if pd.api.types.is_integer_dtype(serie):
+        return "entero"
+    if pd.api.types.is_float_dtype(serie):
+        return "real"
+    return "texto"
+
+
+def normalizar(df: pd.DataFrame, salida: str) -> pd.DataFrame:
+    """Claves + columnas comparadas, ordenadas por clave y con tipos estables."""
+    config = SALIDAS[salida]
+    columnas = list(config["claves"]) + list(config["columnas"])
+    faltan = [c for c in columnas if c not in df.columns]
+    if faltan:
+        raise ValueError(f"❌ La salida de {salida} no tiene las columnas {faltan}")
+    if df.duplicated(list(config["claves"])).any():
+        raise ValueError(f"❌ La salida de {salida} tiene claves {config['claves']} repetidas")
+    df = df[columnas].copy()
+    for columna in columnas:
+        tipo = _tipo(df[columna])
+        if tipo == "fecha":
+            df[columna] = pd.to_datetime(df[columna]).astype("datetime64[ns]")
+        elif tipo == "texto":
+            df[columna] = df[columna].astype(object).where(df[columna].notna(), None)
+    return df.sort_values(list(config["claves"]), kind="stable", ignore_index=True)
+
+
+def _ruta(dataset: str, salida: str) -> str:
+    return os.path.join(CARPETA_GOLDEN, dataset, f"{salida}.csv.gz")
+
+
+def guardar_golden(df: pd.DataFrame, dataset: str, salida: str) -> dict:
+    ruta = _ruta(dataset, salida)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    # mtime fijo en la cabecera gzip: el mismo contenido da el mismo archivo
+    df.to_csv(ruta, index=False, date_format="%Y-%m-%d", compression={"method": "gzip", "mtime": 0})
+    return {"filas": len(df), "tipos": {c: _tipo(df[c]) for c in df.columns}}
+
+
+def leer_golden(dataset: str, salida: str, tipos: dict) -> pd.DataFrame:
+    df = pd.read_csv(_ruta(dataset, salida), dtype={c: str for c, t in tipos.items() if t == "texto"},
+                     keep_default_na=False, na_values={c: [""] for c, t in tipos.items() if t != "texto"})
+    for columna, tipo in tipos.items():
+        if tipo == "fecha":
+            df[columna] = pd.to_datetime(df[columna]).astype("datetime64[ns]")
+        elif tipo == "booleano":
+            df[columna] = df[columna].astype(bool)
+        elif tipo == "texto":
+            df[columna] = df[columna].astype(object)
+    return df
+
+
+def _silencioso(funcion, *args):
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return funcion(*args)
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return "desconocido"
+
+
+def _versiones() -> dict:
+    # Python hasta la versión menor: es lo que fija qué pandas y numpy se instalan
+    return {"python": ".".join(platform.python_version_tuple()[:2]), "pandas": pd.__version__, "numpy": np.__version__}
+
+
+def _python_desplegado():
+    """Versión mayor.menor de Python de runtime.txt, o None si no hay."""
+    try:
+        with open(RUNTIME, encoding="utf-8") as f:
+            version = f.read().strip().removeprefix("python-")
+    except FileNotFoundError:
+        return None
+    return ".".join(version.split(".")[:2]) or None
+
+
+def _distintas(esperadas: dict, actuales: dict, permitir: bool, contexto: str):
+    """Falla (o avisa, con `permitir`) si alguna versión esperada no es la actual."""
+    distintas = {k: (v, actuales[k]) for k, v in esperadas.items() if v is not None and v != actuales[k]}
+    if not distintas:
+        return {}
+    detalle = ", ".join(f"{k} {esperada} → {actual}" for k, (esperada, actual) in distintas.items())
+    if not permitir:
+        raise ValueError(f"❌ {contexto}: versiones distintas ({detalle}). Usar --permitir-versiones para seguir igual")
+    print(f"⚠️⚠️ {contexto}: versiones distintas ({detalle}); las diferencias pueden deberse a ellas", flush=True)
+    return distintas
+
+
+def capturar(datasets, commit: str = COMMIT_REFERENCIA, permitir_versiones: bool = False):
+    """Golden de cada dataset con el código original de `commit`, con el Python de runtime.txt."""
+    versiones = _versiones()
+    _distintas({"python": _python_desplegado()}, versiones, permitir_versiones, "Captura fuera del runtime de runtime.txt")
+    for dataset in datasets:
+        originales, huella = cargar_entradas(dataset, originales=True)
+        manifiesto = {
+            "dataset": dataset, "huella_entradas": huella, "commit": commit, "capturado_en": _commit(),
+            "fecha": datetime.datetime.now().isoformat(timespec="seconds"), **versiones, "salidas": {},
+        }
+        golden = {}
+        with codigo_original(commit):
+            for salida, correr in REFERENCIAS.items():
+                df = normalizar(_silencioso(correr, originales, golden), salida)
+                manifiesto["salidas"][salida] = {"motor": f"original.{salida}", **guardar_golden(df, dataset, salida)}
+                # La etapa siguiente se alimenta con la salida tal como quedó guardada
+                golden[salida] = leer_golden(dataset, salida, manifiesto["salidas"][salida]["tipos"])
+                print(f"📸 {dataset}/{salida}: {len(df)} filas (código de {commit})", flush=True)
+        with open(os.path.join(CARPETA_GOLDEN, dataset, "manifiesto.json"), "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+
+
+# --- Comparación ---
+
+def _distintos(ref: pd.Series, nuevo: pd.Series, tolerancia: dict) -> tuple:
+    """Máscara de filas distintas y (máx. diferencia absoluta, máx. relativa) si son numéricas."""
+    ambos_nulos = ref.isna().to_numpy() & nuevo.isna().to_numpy()
+    numericas = (pd.api.types.is_numeric_dtype(ref) and pd.api.types.is_numeric_dtype(nuevo)
+                 and not pd.api.types.is_bool_dtype(ref) and not pd.api.types.is_bool_dtype(nuevo))
+    if not numericas:
+        distintos = (ref.astype(object).to_numpy() != nuevo.astype(object).to_numpy()) & ~ambos_nulos
+        return distintos, None
+    a = ref.to_numpy(dtype=float)
+    b = nuevo.to_numpy(dtype=float)
+    diferencia = np.abs(b - a)
+    distintos = ~(diferencia <= tolerancia["atol"] + tolerancia["rtol"] * np.abs(a)) & ~ambos_nulos
+    if not distintos.any():
+        return distintos, None
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relativa = diferencia[distintos] / np.abs(a[distintos])
+    return distintos, (float(np.nanmax(diferencia[distintos])), float(np.nanmax(relativa)))
+
+
+def comparar(ref: pd.DataFrame, nuevo: pd.DataFrame, salida: str, tolerancias: dict = None) -> dict:
+    """Informe de diferencias entre la salida golden y la de un motor (ambas normalizadas)."""
+    config = SALIDAS[salida]
+    claves = list(config["claves"])
+    tolerancias = {**config["columnas"], **(tolerancias or {})}
+    unidas = ref.merge(nuevo, on=claves, how="outer", suffixes=("_ref", "_nuevo"), indicator=True)
+    informe = {"filas_ref": len(ref), "filas_nuevo": len(nuevo), "columnas": {}}
+    for lado, etiqueta in (("left_only", "faltantes"), ("right_only", "sobrantes")):
+        filas = unidas[unidas["_merge"] == lado]
+        informe[etiqueta] = len(filas)
+        if len(filas):
+            informe[f"ejemplos_{etiqueta}"] = filas[claves].head(EJEMPLOS).astype(str).to_dict(orient="records")
+    comunes = unidas[unidas["_merge"] == "both"]
+    for columna, tolerancia in tolerancias.items():
+        a, b = comunes[f"{columna}_ref"], comunes[f"{columna}_nuevo"]
+        distintos, maximos = _distintos(a, b, tolerancia)
+        detalle = {"distintas": int(distintos.sum()), "tolerancia": tolerancia}
+        if distintos.any():
+            if maximos:
+                detalle["max_dif_abs"], detalle["max_dif_rel"] = maximos
+            ejemplos = comunes.loc[distintos, claves].astype(str).assign(
+                ref=a[distintos].astype(str), nuevo=b[distintos].astype(str))
+            detalle["ejemplos"] = ejemplos.head(EJEMPLOS).to_dict(orient="records")
+        informe["columnas"][columna] = detalle
+    informe["ok"] = (informe["faltantes"] == 0 and informe["sobrantes"] == 0
+                     and all(c["distintas"] == 0 for c in informe["columnas"].values()))
+    return informe
+
+
+def _tolerancias_cli(valores: list) -> dict:
+    """{salida: {columna: {"atol", "rtol"}}} a partir de "salida.columna=atol[:rtol]"."""
+    resultado = {}
+    for valor in valores or []:
+        destino, _, limites = valor.partition("=")
+        salida, _, columna = destino.partition(".")
+        if salida not in SALIDAS or columna not in SALIDAS[salida]["columnas"]:
+            raise ValueError(f"❌ Columna desconocida para --tolerancia: {destino}")
+        atol, _, rtol = limites.partition(":")
+        resultado.setdefault(salida, {})[columna] = {"atol": float(atol or 0), "rtol": float(rtol or 0)}
+    return resultado
+
+
+def verificar(datasets, motores, tolerancias: dict, permitir_versiones: bool = False) -> dict:
+    versiones = _versiones()
+    informe = {"commit": _commit(), "fecha": datetime.datetime.now().isoformat(timespec="seconds"), **versiones,
+               "resultados": [], "versiones_distintas": {}}
+    for dataset in datasets:
+        with open(os.path.join(CARPETA_GOLDEN, dataset, "manifiesto.json"), encoding="utf-8") as f:
+            manifiesto = json.load(f)
+        # Un manifiesto sin "python" es de antes de registrar el runtime: no sirve para comparar
+        esperadas = {"python": manifiesto.get("python", "sin registrar"), "pandas": manifiesto.get("pandas"),
+                     "numpy": manifiesto.get("numpy")}
+        distintas = _distintas(esperadas, versiones, permitir_versiones, f"Golden de {dataset}")
+        if distintas:
+            informe["versiones_distintas"][dataset] = distintas
+        tablas, huella = cargar_entradas(dataset)
+        if huella != manifiesto["huella_entradas"]:
+            raise ValueError(f"❌ Las entradas de {dataset} cambiaron desde la captura: volver a correr 'capturar'")
+        golden = {salida: leer_golden(dataset, salida, datos["tipos"]) for salida, datos in manifiesto["salidas"].items()}
+
+        for nombre in motores:
+            salida, correr = MOTORES[nombre]
+            resultado = comparar(golden[salida], normalizar(_silencioso(correr, tablas, golden), salida),
+                                 salida, tolerancias.get(salida))
+            informe["resultados"].append({"dataset": dataset, "motor": nombre, "salida": salida, **resultado})
+            _imprimir(dataset, nombre, resultado)
+    informe["ok"] = all(r["ok"] for r in informe["resultados"])
+    return informe
+
+
+def _imprimir(dataset: str, motor: str, resultado: dict):
+    if resultado["ok"]:
+        print(f"✅ {dataset:<10} {motor:<36} {resultado['filas_nuevo']} filas idénticas", flush=True)
+        return
+    print(f"❌ {dataset:<10} {motor:<36} filas {resultado['filas_ref']} → {resultado['filas_nuevo']} "
+          f"(faltantes {resultado['faltantes']}, sobrantes {resultado['sobrantes']})", flush=True)
+    for columna, detalle in resultado["columnas"].items():
+        if detalle["distintas"]:
+            maximos = (f", máx. dif. {detalle['max_dif_abs']:.6g} (rel. {detalle['max_dif_rel']:.3g})"
+                       if "max_dif_abs" in detalle else "")
+            print(f"     {columna}: {detalle['distintas']} distintas{maximos}; p. ej. {detalle['ejemplos'][0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("accion", choices=("capturar", "verificar"))
+    parser.add_argument("--datasets", default=",".join(DATASETS))
+    parser.add_argument("--commit", default=COMMIT_REFERENCIA, help="Commit del código original para capturar")
+    parser.add_argument("--motores", help=f"Motores separados por coma (opciones: {', '.join(MOTORES)})")
+    parser.add_argument("--tolerancia", action="append", help="salida.columna=atol[:rtol], p. ej. forecast.forecast=1")
+    parser.add_argument("--informe", help="Ruta del informe JSON de verificar")
+    parser.add_argument("--permitir-versiones", action="store_true",
+                        help="Avisar en lugar de fallar si Python/pandas/numpy no son los de la captura")
+    args = parser.parse_args()
+
+    datasets = args.datasets.split(",")
+    desconocidos = [d for d in datasets if d not in DATASETS]
+    if desconocidos:
+        parser.error(f"Datasets desconocidos: {desconocidos}")
+    motores = args.motores.split(",") if args.motores else [m for m in MOTORES if m not in MOTORES_OPCIONALES]
+    desconocidos = [m for m in motores if m not in MOTORES]
+    if desconocidos:
+        parser.error(f"Motores desconocidos: {desconocidos}")
+    try:
+        if args.accion == "capturar":
+            capturar(datasets, args.commit, args.permitir_versiones)
+            return
+        informe = verificar(datasets, motores, _tolerancias_cli(args.tolerancia), args.permitir_versiones)
+    except ValueError as e:
+        print(e, flush=True)
+        sys.exit(2)
+    if args.informe:
+        with open(args.informe, "w", encoding="utf-8") as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+    sys.exit(0 if informe["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
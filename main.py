@@ -1,19 +1,37 @@
+import os
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import pandas as pd
-import io
 import numpy as np
 
 from services.cleaner import clean_demand
-from services.forecast import forecast_engine
-from services.stock_projector import project_stock_multi
-from routes.cloud_loader import router as cloud_router
+from services.ingesta import leer_csv_subido
+from services.forecast import forecast_engine, precargar_backends
+from services.executor import cerrar_pools
+from services.stock_projector import project_stock_multi, proyectar_riesgo_stock, CAMINOS_RIESGO
+from services.dataset_store import tablas_desde_payload
+from routes.cloud_loader import router as cloud_router, restaurar_snapshot_nube
 from routes.resumen import router as resumen_router
+from routes.forecast import router as forecast_router
+from routes.metricas import router as metricas_router, medir_request
 
 
 
+# ✅ Arranque en caliente: snapshot del último pipeline (si los CSV no cambiaron) y
+# statsmodels importado en segundo plano, sin demorar las primeras respuestas
+@asynccontextmanager
+async def arranque(app):
+    restaurar_snapshot_nube()
+    if os.getenv("PLANITY_PRECALENTAR", "1") != "0":
+        threading.Thread(target=precargar_backends, name="planity-precalentar", daemon=True).start()
+    yield
+    cerrar_pools()
+
 # ✅ Crear app primero
-app = FastAPI()
+app = FastAPI(lifespan=arranque)
 
 print("🧠 ESTOY EN EL BACKEND CORRECTO", flush=True)
 
@@ -32,8 +50,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ Métricas por request (duración, memoria, perfil) y endpoint /metrics
+app.middleware("http")(medir_request)
+
 app.include_router(cloud_router)
 app.include_router(resumen_router)
+app.include_router(forecast_router)
+app.include_router(metricas_router)
 
 
 
@@ -47,27 +70,20 @@ def read_root():
     return {"mensaje": "API de Planity activa!"}
 
 # --- Limpieza de demanda ---
-@app.post("/limpiar-demanda")
-async def limpiar_demanda(demanda: UploadFile = File(...), stock: UploadFile = File(...)):
-    try:
-        contenido_demanda = await demanda.read()
-        contenido_stock = await stock.read()
+def _limpiar_archivos(archivo_demanda, archivo_stock):
+    # Parseo por bloques desde el archivo temporal de la subida, con columnas validadas
+    df_demanda = leer_csv_subido(archivo_demanda, "demanda")
+    df_stock = leer_csv_subido(archivo_stock, "stock")
 
-        df_demanda = pd.read_csv(io.BytesIO(contenido_demanda), encoding="utf-8", sep=",")
-        df_stock = pd.read_csv(io.BytesIO(contenido_stock), encoding="utf-8", sep=",")
+    print("📋 Columnas DEMANDA:", df_demanda.columns.tolist())
+    print("📋 Columnas STOCK:", df_stock.columns.tolist())
 
-        df_demanda.columns = df_demanda.columns.str.strip().str.lower()
-        df_stock.columns = df_stock.columns.str.strip().str.lower()
+    return clean_demand(df_demanda, df_stock)
 
-        print("📋 Columnas DEMANDA:", df_demanda.columns.tolist())
-        print("📋 Columnas STOCK:", df_stock.columns.tolist())
-
-        df_limpia = clean_demand(
-            df_demanda.to_dict(orient="records"),
-            df_stock.to_dict(orient="records")
-        )
-
-        return df_limpia
+@app.post("/limpiar-demanda")
+async def limpiar_demanda(demanda: UploadFile = File(...), stock: UploadFile = File(...)):
+    try:
+        return await run_in_threadpool(_limpiar_archivos, demanda.file, stock.file)
 
     except Exception as e:
         print("❌ ERROR AL PROCESAR:", e)
@@ -97,18 +113,55 @@ async def calcular_forecast(request: Request):
 async def calcular_proyeccion_stock(request: Request):
     try:
         data = await request.json()
-        forecast = data.get("forecast", [])
-        stock_actual = data.get("stock_actual", [])
-        reposiciones = data.get("reposiciones", [])
-        maestro = data.get("maestro", [])
+        tablas = tablas_desde_payload(data, ["forecast", "stock_actual", "reposiciones", "maestro"])
+        if tablas is None:
+            raise HTTPException(status_code=404, detail="Dataset no encontrado o expirado")
+        forecast = tablas["forecast"]
+        stock_actual = tablas["stock_actual"]
+        reposiciones = tablas["reposiciones"]
+        maestro = tablas["maestro"]
 
         df_resultado = project_stock_multi(forecast, stock_actual, reposiciones, maestro)
         return df_resultado.to_dict(orient="records")
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ ERROR EN PROYECCIÓN DE STOCK:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- Riesgo de quiebre (Monte Carlo sobre la proyección) ---
+def _riesgo_stock(tablas, caminos, semilla, percentil, detalle):
+    df_detalle, df_totales = proyectar_riesgo_stock(
+        tablas["forecast"], tablas["stock_actual"], tablas["reposiciones"], tablas["maestro"],
+        caminos=caminos, semilla=semilla, percentil=percentil,
+    )
+    respuesta = {"caminos": caminos, "semilla": semilla, "totales": df_totales.to_dict(orient="records")}
+    if detalle:
+        respuesta["detalle"] = df_detalle.to_dict(orient="records")
+    return respuesta
+
+@app.post("/proyeccion-stock/riesgo")
+async def calcular_riesgo_stock(request: Request):
+    try:
+        data = await request.json()
+        tablas = tablas_desde_payload(data, ["forecast", "stock_actual", "reposiciones", "maestro"])
+        if tablas is None:
+            raise HTTPException(status_code=404, detail="Dataset no encontrado o expirado")
+
+        return await run_in_threadpool(
+            _riesgo_stock, tablas, int(data.get("caminos", CAMINOS_RIESGO)), int(data.get("semilla", 0)),
+            float(data.get("percentil", 0.9)), data.get("detalle", True),
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print("❌ ERROR EN RIESGO DE STOCK:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
 
 
 
@@ -1,120 +1,223 @@
 import os
+import json
+import asyncio
 import pandas as pd
 import numpy as np
-from fastapi import APIRouter
+from typing import List
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from services.cleaner import clean_demand
-from services.forecast import forecast_engine
-from services.stock_projector import project_stock_multi
+from services import trabajos
+from services.pipeline import ARCHIVOS, ETAPAS_PIPELINE, cargar_snapshot, ejecutar_pipeline
+from services.almacen_columnar import leer_tabla, descategorizar
+from services.dataset_store import guardar_dataset, obtener_dataset
+from services.indice_filas import construir_indice, obtener_indice
+from services.serializacion import serializar, validar_formato
 
 print("✅ cloud_loader.py importado correctamente", flush=True)
-# Variables globales
-demanda_limpia_global = []
 
 
 router = APIRouter(prefix="/cloud", tags=["Cloud Loader"])
 
+# Carpeta con los CSV de la nube (sobrescribible, p. ej. para los benchmarks)
+BASE_NUBE = os.getenv("PLANITY_CLOUD_DIR", os.path.join(os.path.dirname(__file__), "..", "cloud"))
+# Intervalo entre eventos de /trabajos/{id}/eventos
+INTERVALO_EVENTOS = 0.5
 
-@router.get("/cargar_desde_nube")
-def cargar_desde_nube():
-    try:
-        print("📡 Invocando endpoint /cargar_desde_nube", flush=True)
+# dataset_id y tablas del último pipeline de cloud/: el dataset por defecto de
+# /demanda_limpia y /demanda_limpia/consulta, que vive mientras viva el proceso
+_dataset_nube = None
+_tablas_nube = None
 
-        base = os.path.join(os.path.dirname(__file__), "..", "cloud")
 
-        # ✅ Leer archivos CSV
-        df_demanda = pd.read_csv(os.path.join(base, "demanda.csv"), encoding="utf-8-sig")
-        df_stock_historico = pd.read_csv(os.path.join(base, "stock_historico.csv"), encoding="utf-8-sig")
-        df_stock_actual = pd.read_csv(os.path.join(base, "stock_actual.csv"), encoding="utf-8-sig")
-        df_reposiciones = pd.read_csv(os.path.join(base, "reposiciones.csv"), encoding="utf-8-sig")
-        df_maestro = pd.read_csv(os.path.join(base, "maestro_productos.csv"), encoding="utf-8-sig")
+def _guardar_dataset_nube(tablas: dict) -> str:
+    global _dataset_nube, _tablas_nube
+    _dataset_nube, _tablas_nube = guardar_dataset(tablas), tablas
+    return _dataset_nube
 
-        # ✅ Normalizar encabezados
-        for df in [df_demanda, df_stock_historico, df_stock_actual, df_reposiciones, df_maestro]:
-            df.columns = df.columns.str.replace("﻿", "", regex=False).str.strip().str.lower()
 
-        if "demanda" not in df_demanda.columns:
-            raise ValueError(f"❌ Falta columna 'demanda'. Columnas: {df_demanda.columns.tolist()}")
+def _tablas_dataset(dataset_id: str, nombres: list):
+    """(dataset_id, tablas) pedidas; sin ID, las del último pipeline de cloud/ (o (None, None) si no hubo).
 
-        # ✅ Ejecutar limpieza
-        df_demanda_limpia = clean_demand(
-            df_demanda.to_dict(orient="records"),
-            df_stock_historico.to_dict(orient="records")
-        )
-        df_demanda_limpia = pd.DataFrame(df_demanda_limpia)
+    El dataset de la nube se vuelve a guardar si el almacén lo expulsó por
+    TTL o LRU (mismo contenido, mismo ID). Un ID explícito vencido da None.
+    """
+    if dataset_id:
+        return dataset_id, obtener_dataset(dataset_id, nombres)
+    if _dataset_nube is None:
+        return None, None
+    tablas = obtener_dataset(_dataset_nube, nombres)
+    if tablas is None:
+        guardar_dataset(_tablas_nube)
+        tablas = obtener_dataset(_dataset_nube, nombres)
+    return _dataset_nube, tablas
 
-        if "demanda_original" not in df_demanda_limpia.columns:
-            df_demanda_limpia["demanda_original"] = 0
 
-        if "demanda_sin_outlier" not in df_demanda_limpia.columns:
-            df_demanda_limpia["demanda_sin_outlier"] = df_demanda_limpia["demanda_original"]
+def _respuesta_por_bloques(tablas, formato: str, extra: dict = None):
+    """Respuesta enviada por partes ("stream", "ndjson" o "split") sin pasar por to_dict."""
+    media_type = "application/x-ndjson" if formato == "ndjson" else "application/json"
+    return StreamingResponse(serializar(tablas, formato, extra), media_type=media_type)
 
-        # ✅ Reconstruir columna 'demanda'
-        df_demanda_limpia["demanda"] = df_demanda_limpia["demanda_sin_outlier"].fillna(0)
 
-        if "fecha" not in df_demanda_limpia.columns and "semana" in df_demanda_limpia.columns:
-            df_demanda_limpia["fecha"] = pd.to_datetime(df_demanda_limpia["semana"], errors="coerce")
-        else:
-            df_demanda_limpia["fecha"] = pd.to_datetime(df_demanda_limpia["fecha"], errors="coerce")
+def _respuesta_pipeline(tablas: dict, dataset_id: str, formato: str):
+    if formato != "json":
+        return _respuesta_por_bloques(tablas, formato, {"dataset_id": dataset_id})
+    respuesta = {nombre: df.to_dict(orient="records") for nombre, df in tablas.items()}
+    respuesta["dataset_id"] = dataset_id
+    return respuesta
 
-        df_demanda_limpia["demanda_sin_outlier"] = df_demanda_limpia["demanda_sin_outlier"].fillna(0)
 
-        # ✅ Forecast
-        df_forecast = forecast_engine(df_demanda_limpia[["sku", "fecha", "demanda", "demanda_sin_outlier"]])
+def restaurar_snapshot_nube():
+    """Al arrancar: tablas del último pipeline de cloud/ desde su snapshot, ya guardadas como dataset."""
+    tablas = cargar_snapshot(BASE_NUBE)
+    if tablas is not None:
+        print(f"🗂️ Dataset {_guardar_dataset_nube(tablas)} restaurado desde el snapshot", flush=True)
 
-        # ✅ Reemplazar NaNs en forecast
-        df_forecast = df_forecast.fillna(0)
 
-        # ✅ Tipos correctos
-        df_stock_historico["stock"] = pd.to_numeric(df_stock_historico["stock"], errors="coerce").fillna(0)
-        df_stock_actual["stock"] = pd.to_numeric(df_stock_actual["stock"], errors="coerce").fillna(0)
-        df_reposiciones["cantidad"] = pd.to_numeric(df_reposiciones["cantidad"], errors="coerce").fillna(0)
+def _pipeline_nube(base: str, progreso=None) -> dict:
+    """Pipeline completo de la carpeta cloud/; las tablas quedan en el almacén de datasets."""
+    tablas = ejecutar_pipeline(base, progreso)
+    return {"dataset_id": _guardar_dataset_nube(tablas)}
 
-        # ✅ Proyección de stock
-        df_stock_proj = project_stock_multi(
-            df_forecast.to_dict(orient="records"),
-            df_stock_actual.to_dict(orient="records"),
-            df_reposiciones.to_dict(orient="records"),
-            df_maestro.to_dict(orient="records"),
-        )
 
-        df_stock_proj = pd.DataFrame(df_stock_proj).fillna(0)
+@router.get("/cargar_desde_nube")
+def cargar_desde_nube(formato: str = "json"):
+    try:
+        print("📡 Invocando endpoint /cargar_desde_nube", flush=True)
+        validar_formato(formato)
+
+        # ✅ Lectura, limpieza, forecast y proyección (con caché por etapa y SKU)
+        tablas = ejecutar_pipeline(BASE_NUBE)
 
-        global demanda_limpia_global
-        demanda_limpia_global = df_demanda_limpia.fillna(0).to_dict(orient="records")
+        # ✅ Guardar el dataset en servidor: los endpoints posteriores pueden
+        # recibir solo el dataset_id en lugar de reenviar todas las tablas
+        dataset_id = _guardar_dataset_nube(tablas)
 
-        return {
-            "demanda_limpia": demanda_limpia_global,
-            "forecast": df_forecast.to_dict(orient="records"),
-            "maestro": df_maestro.fillna(0).to_dict(orient="records"),
-            "reposiciones": df_reposiciones.fillna(0).to_dict(orient="records"),
-            "stock_actual": df_stock_actual.fillna(0).to_dict(orient="records"),
-            "stock_historico": df_stock_historico.fillna(0).to_dict(orient="records"),
-            "stock_proyectado": df_stock_proj.to_dict(orient="records"),
-        }
+        return _respuesta_pipeline(tablas, dataset_id, formato)
 
 
     except Exception as e:
         print("❌ ERROR en /cargar_desde_nube:", e, flush=True)
         return {"error": str(e)}
 
+
+@router.post("/trabajos", status_code=202)
+def crear_trabajo():
+    """Lanza el pipeline de cloud/ en segundo plano y devuelve el trabajo.
+
+    Si ya hay un trabajo activo sobre los mismos archivos (misma carpeta,
+    mtime y tamaño) se devuelve ese con "deduplicado": true.
+    """
+    base = os.path.abspath(BASE_NUBE)
+    try:
+        archivos = []
+        for archivo in ARCHIVOS.values():
+            info = os.stat(os.path.join(base, archivo))
+            archivos.append((archivo, info.st_mtime_ns, info.st_size))
+        clave = ("pipeline", base, tuple(archivos))
+        trabajo, nuevo = trabajos.encolar("pipeline", clave, ETAPAS_PIPELINE, _pipeline_nube, base)
+    except FileNotFoundError as e:
+        return JSONResponse(content={"error": f"❌ Falta un archivo en cloud/: {e.filename}"}, status_code=400)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=429)
+    print(f"📡 Trabajo {trabajo['trabajo_id']} {'encolado' if nuevo else 'deduplicado'}", flush=True)
+    return {**trabajo, "deduplicado": not nuevo}
+
+
+@router.get("/trabajos")
+def listar_trabajos():
+    return trabajos.listar()
+
+
+@router.get("/trabajos/{trabajo_id}")
+def obtener_trabajo(trabajo_id: str):
+    trabajo = trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return JSONResponse(content={"error": "Trabajo no encontrado"}, status_code=404)
+    return trabajo
+
+
+@router.get("/trabajos/{trabajo_id}/eventos")
+async def eventos_trabajo(trabajo_id: str):
+    """NDJSON con el estado del trabajo cada vez que cambia, hasta que termina."""
+    if trabajos.obtener(trabajo_id) is None:
+        return JSONResponse(content={"error": "Trabajo no encontrado"}, status_code=404)
+
+    async def eventos():
+        anterior = None
+        while True:
+            trabajo = trabajos.obtener(trabajo_id)
+            if trabajo is None:
+                return
+            linea = json.dumps(trabajo, ensure_ascii=False)
+            if linea != anterior:
+                yield linea + "\n"
+                anterior = linea
+            if trabajo["estado"] in trabajos.ESTADOS_FINALES:
+                return
+            await asyncio.sleep(INTERVALO_EVENTOS)
+
+    return StreamingResponse(eventos(), media_type="application/x-ndjson")
+
+
+@router.get("/trabajos/{trabajo_id}/resultado")
+def resultado_trabajo(trabajo_id: str, formato: str = "json"):
+    """Tablas del trabajo terminado, con la misma forma que /cargar_desde_nube."""
+    try:
+        validar_formato(formato)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    consulta = trabajos.resultado(trabajo_id)
+    if consulta is None:
+        return JSONResponse(content={"error": "Trabajo no encontrado"}, status_code=404)
+    estado, resultado = consulta
+    if estado != "completado":
+        return JSONResponse(content={"error": f"El trabajo no está completado (estado: {estado})"}, status_code=409)
+    tablas = obtener_dataset(resultado["dataset_id"])
+    if tablas is None:
+        return JSONResponse(content={"error": "Dataset del trabajo expirado"}, status_code=410)
+    return _respuesta_pipeline(tablas, resultado["dataset_id"], formato)
+
+
+@router.delete("/trabajos/{trabajo_id}")
+def cancelar_trabajo(trabajo_id: str):
+    trabajo = trabajos.cancelar(trabajo_id)
+    if trabajo is None:
+        return JSONResponse(content={"error": "Trabajo no encontrado"}, status_code=404)
+    return trabajo
+
 @router.get("/stock_historico")
-def obtener_stock_historico():
+def obtener_stock_historico(formato: str = "json"):
     try:
-        base = os.path.join(os.path.dirname(__file__), "..", "cloud")
-        df_stock_historico = pd.read_csv(os.path.join(base, "stock_historico.csv"), encoding="utf-8-sig")
-        df_stock_historico.columns = df_stock_historico.columns.str.replace("﻿", "", regex=False).str.strip().str.lower()
-        df_stock_historico["fecha"] = pd.to_datetime(df_stock_historico["fecha"], errors="coerce")
-        df_stock_historico["stock"] = pd.to_numeric(df_stock_historico["stock"], errors="coerce").fillna(0)
-        return df_stock_historico.fillna(0).to_dict(orient="records")
+        validar_formato(formato)
+        # ✅ Copia columnar tipada (fecha datetime, stock entero), resincronizada si el CSV cambió
+        df_stock_historico = descategorizar(leer_tabla(os.path.join(BASE_NUBE, "stock_historico.csv"), ("stock",)))
+        df_stock_historico = df_stock_historico.fillna(0)
+        if formato != "json":
+            return _respuesta_por_bloques(df_stock_historico, formato)
+        return df_stock_historico.to_dict(orient="records")
     except Exception as e:
         print("❌ Error al obtener stock histórico:", e)
         return {"error": str(e)}
 
 @router.get("/demanda_limpia")
-def obtener_demanda_limpia():
-    global demanda_limpia_global
-    return demanda_limpia_global
+def obtener_demanda_limpia(dataset_id: str = None, formato: str = "json"):
+    try:
+        validar_formato(formato)
+    except ValueError as e:
+        return {"error": str(e)}
+    dataset_id, tablas = _tablas_dataset(dataset_id, ["demanda_limpia"])
+    if dataset_id and tablas is None:
+        return JSONResponse(content={"error": "Dataset no encontrado o expirado"}, status_code=404)
+    # Antes del primer pipeline de cloud/ no hay demanda limpia: lista vacía
+    df = tablas["demanda_limpia"] if tablas else pd.DataFrame()
+    if formato != "json":
+        return _respuesta_por_bloques(df, formato)
+    return df.to_dict(orient="records")
+
+
+
+
 
 
 
@@ -123,5 +226,64 @@ def obtener_demanda_limpia():
 
 
 
+def _version_archivo(ruta: str) -> tuple:
+    info = os.stat(ruta)
+    return (os.path.abspath(ruta), info.st_mtime_ns, info.st_size)
 
 
+def _consulta_indice(indice, sku, categoria, desde, hasta, offset, limite, columnas):
+    """Página de filas de un índice (sku, fecha) con el total del filtro."""
+    columnas = [c.strip() for c in columnas.split(",") if c.strip()] if columnas else None
+    pagina, total = indice.consultar(
+        skus=sku or None, categorias=categoria or None, desde=desde, hasta=hasta,
+        offset=offset, limite=limite, columnas=columnas,
+    )
+    siguiente = offset + len(pagina)
+    return {
+        "total": total, "offset": offset, "limite": limite,
+        "siguiente_offset": siguiente if siguiente < total else None,
+        "filas": json.loads(pagina.to_json(orient="records", date_format="iso", date_unit="s")),
+    }
+
+
+@router.get("/stock_historico/consulta")
+def consultar_stock_historico(sku: List[str] = Query(None), categoria: List[str] = Query(None), desde: str = None,
+                              hasta: str = None, offset: int = 0, limite: int = 1000, columnas: str = None):
+    """Filas de stock_historico por SKU/categoría y rango de fechas, paginadas y con proyección de columnas.
+
+    El índice ordenado por (sku, fecha) se construye una vez por versión
+    (mtime y tamaño) del CSV y del maestro.
+    """
+    ruta_stock = os.path.join(BASE_NUBE, ARCHIVOS["stock_historico"])
+    ruta_maestro = os.path.join(BASE_NUBE, ARCHIVOS["maestro"])
+    try:
+        clave = ("stock_historico", _version_archivo(ruta_stock), _version_archivo(ruta_maestro))
+        indice = obtener_indice(clave, lambda: construir_indice(
+            descategorizar(leer_tabla(ruta_stock, ("stock",))).fillna(0),
+            descategorizar(leer_tabla(ruta_maestro)),
+        ))
+        return _consulta_indice(indice, sku, categoria, desde, hasta, offset, limite, columnas)
+    except FileNotFoundError as e:
+        return JSONResponse(content={"error": f"❌ Falta un archivo en cloud/: {e.filename}"}, status_code=400)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+
+@router.get("/demanda_limpia/consulta")
+def consultar_demanda_limpia(dataset_id: str = None, sku: List[str] = Query(None), categoria: List[str] = Query(None),
+                             desde: str = None, hasta: str = None, offset: int = 0, limite: int = 1000,
+                             columnas: str = None):
+    """Filas de la demanda limpia de un dataset (el del último pipeline de cloud/ si no se indica).
+
+    Sin dataset_id no se usa el último dataset tocado: podría ser el
+    payload de otro cliente guardado por cualquier endpoint.
+    """
+    dataset_id, tablas = _tablas_dataset(dataset_id, ["demanda_limpia", "maestro"])
+    if tablas is None or "demanda_limpia" not in tablas:
+        return JSONResponse(content={"error": "Dataset no encontrado o expirado"}, status_code=404)
+    clave = ("demanda_limpia", dataset_id)
+    try:
+        indice = obtener_indice(clave, lambda: construir_indice(tablas["demanda_limpia"], tablas.get("maestro")))
+        return _consulta_indice(indice, sku, categoria, desde, hasta, offset, limite, columnas)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
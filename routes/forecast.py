@@ -1,21 +1,29 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 import pandas as pd
 from services.forecast import forecast_engine, generar_comparativa_forecasts
 
 router = APIRouter()
 
-@router.post("/forecast")
-async def calcular_forecast(request: Request):
+def _forecast_y_comparativa(df):
+    # Los ajustes SES del forecast se reutilizan en la comparativa: cada SKU se ajusta una sola vez
+    ajustes = {}
+    forecast = forecast_engine(df, ajustes=ajustes)
+    comparativa = generar_comparativa_forecasts(df, ajustes=ajustes)
+    return {
+        "forecast": forecast.fillna(0).to_dict(orient="records"),
+        "comparativa": comparativa.fillna(0).to_dict(orient="records")
+    }
+
+@router.post("/forecast/comparativa")
+async def calcular_forecast_comparativa(request: Request):
+    """Forecast y comparativa de media móvil vs SES (valores ajustados por mes) de los mismos datos.
+
+    /forecast (main.py) devuelve solo el forecast.
+    """
     try:
         data = await request.json()
-        df = pd.DataFrame(data)
-        forecast = forecast_engine(df)
-        comparativa = generar_comparativa_forecasts(df)
-
-        return {
-            "forecast": forecast.fillna(0).to_dict(orient="records"),
-            "comparativa": comparativa.fillna(0).to_dict(orient="records")
-        }
+        return await run_in_threadpool(_forecast_y_comparativa, pd.DataFrame(data))
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,80 @@
+import time
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from services import metricas, trabajos, cache_forecast
+from services.dataset_store import cantidad_datasets
+
+router = APIRouter(tags=["Métricas"])
+
+metricas.registrar_ayuda("planity_forecast_cache_total", "counter", "Caché de forecast: aciertos, fallos, guardadas y desalojadas")
+metricas.registrar_ayuda("planity_trabajos", "gauge", "Trabajos en segundo plano guardados por estado")
+metricas.registrar_ayuda("planity_datasets", "gauge", "Datasets guardados en el almacén en memoria")
+
+
+def _activado(request: Request, parametro: str) -> bool:
+    valor = request.query_params.get(parametro) or request.headers.get(f"x-planity-{parametro}")
+    return valor in ("1", "true", "si")
+
+
+async def medir_request(request: Request, call_next):
+    """Middleware HTTP: duración, código y (opcional) pico de memoria y perfil de cada request.
+
+    `?perfilar=1` (o la cabecera X-Planity-Perfilar: 1) muestrea el request y
+    devuelve el ID del perfil en X-Planity-Perfil; `?memoria=1` (o
+    PLANITY_METRICAS_MEMORIA=1) mide el pico de memoria con tracemalloc.
+    """
+    perfilar = _activado(request, "perfilar")
+    memoria = metricas.MEMORIA_SIEMPRE or _activado(request, "memoria")
+    perfil = token = None
+    if perfilar:
+        perfil, token = metricas.iniciar_perfil(request.url.path)
+    if memoria:
+        metricas.iniciar_memoria()
+    t0 = time.perf_counter()
+    codigo = 500
+    try:
+        respuesta = await call_next(request)
+        codigo = respuesta.status_code
+    finally:
+        segundos = time.perf_counter() - t0
+        # Ruta de la plantilla (p. ej. /cloud/trabajos/{trabajo_id}) para no multiplicar etiquetas
+        ruta = getattr(request.scope.get("route"), "path", "sin_ruta")
+        metricas.observar("planity_request_segundos", segundos, ruta=ruta, metodo=request.method)
+        metricas.incrementar("planity_requests_total", ruta=ruta, metodo=request.method, codigo=codigo)
+        if memoria:
+            metricas.observar("planity_request_memoria_pico_bytes", metricas.finalizar_memoria(),
+                              buckets=metricas.BUCKETS_BYTES, ruta=ruta)
+        if perfil is not None:
+            perfil.ruta = ruta
+            metricas.finalizar_perfil(perfil, token)
+    if perfil is not None:
+        respuesta.headers["X-Planity-Perfil"] = perfil.id
+    return respuesta
+
+
+@router.get("/metrics")
+def exportar_metricas():
+    for clave, valor in cache_forecast.estadisticas().items():
+        metricas.fijar("planity_forecast_cache_total", valor, resultado=clave)
+    estados = {estado: 0 for estado in trabajos.ESTADOS_ACTIVOS + trabajos.ESTADOS_FINALES}
+    for trabajo in trabajos.listar():
+        estados[trabajo["estado"]] += 1
+    for estado, cantidad in estados.items():
+        metricas.fijar("planity_trabajos", cantidad, estado=estado)
+    metricas.fijar("planity_datasets", cantidad_datasets())
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/metrics/perfiles")
+def listar_perfiles():
+    return metricas.perfiles()
+
+
+@router.get("/metrics/perfiles/{perfil_id}")
+def obtener_perfil(perfil_id: str):
+    """Pilas en formato colapsado (una línea "pila muestras"), para flamegraph.pl o speedscope."""
+    perfil = metricas.obtener_perfil(perfil_id)
+    if perfil is None:
+        return JSONResponse(content={"error": "Perfil no encontrado"}, status_code=404)
+    return PlainTextResponse(perfil.colapsado())
@@ -1,25 +1,44 @@
 from fastapi import APIRouter, Request
-from services.resumen_utils import consolidar_historico_stock
+from services.cubo_resumen import DIMENSIONES, consultar_cubo, obtener_cubo, resumen_historico
+from services.dataset_store import tablas_desde_payload
 from fastapi.responses import JSONResponse
 
 router = APIRouter()
 
+# Campos del body que convierten la llamada en una consulta sobre el cubo
+CAMPOS_CONSULTA = ("skus", "categorias", "desde", "hasta", "agrupar")
+
 @router.post("/resumen_general")
 async def generar_resumen(request: Request):
-    body = await request.json()
-
-    demanda_limpia = body.get("demanda_limpia", [])
-    maestro = body.get("maestro", [])
-
-    if not demanda_limpia or not maestro:
-        return JSONResponse(content={"error": "Faltan datos de entrada"}, status_code=400)
-
-    df_historico = consolidar_historico_stock(demanda_limpia, maestro)
-    return df_historico.to_dict(orient="records")
-
-
+    """Ventas y pérdidas históricas por SKU y mes, desde el cubo del dataset.
 
+    Sin campos de consulta devuelve la tabla completa (sku, mes, unidades,
+    precio y euros). Con "skus", "categorias", "desde"/"hasta" (YYYY-MM) y
+    "agrupar" (subconjunto de sku, mes, categoria) devuelve las medidas
+    filtradas y agregadas.
+    """
+    body = await request.json()
 
+    tablas = tablas_desde_payload(body, ["demanda_limpia", "maestro"])
+    if tablas is None:
+        return JSONResponse(content={"error": "Dataset no encontrado o expirado"}, status_code=404)
 
+    demanda_limpia = tablas["demanda_limpia"]
+    maestro = tablas["maestro"]
 
+    if demanda_limpia.empty or maestro.empty:
+        return JSONResponse(content={"error": "Faltan datos de entrada"}, status_code=400)
 
+    # Un cubo por versión del dataset: con dataset_id no hace falta hashear las tablas
+    cubo = obtener_cubo(demanda_limpia, maestro, body.get("dataset_id"))
+    if not any(campo in body for campo in CAMPOS_CONSULTA):
+        return resumen_historico(cubo).to_dict(orient="records")
+
+    try:
+        df = consultar_cubo(
+            cubo, skus=body.get("skus"), categorias=body.get("categorias"), desde=body.get("desde"),
+            hasta=body.get("hasta"), agrupar=body.get("agrupar", ["sku", "mes"]),
+        )
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e), "dimensiones": list(DIMENSIONES)}, status_code=400)
+    return df.to_dict(orient="records")
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Carpeta de los archivos columnares (por defecto junto a cada CSV, en .columnar/)
+CARPETA_COLUMNAR = os.getenv("PLANITY_COLUMNAR_DIR")
+VERSION_FORMATO = 2
+# Archivo con el nombre de la subcarpeta de la versión publicada
+PUNTERO = "actual"
+# Temporales más viejos que esto son de conversiones interrumpidas y se borran
+SEGUNDOS_TEMPORAL = 3600
+
+_lock = threading.Lock()
+
+
+def carpeta_columnar(ruta_csv: str) -> str:
+    base, archivo = os.path.split(os.path.abspath(ruta_csv))
+    raiz = CARPETA_COLUMNAR or os.path.join(base, ".columnar")
+    return os.path.join(raiz, os.path.splitext(archivo)[0])
+
+
+def tipar_tabla(df: pd.DataFrame, columnas_enteras=()) -> pd.DataFrame:
+    """Tipos compactos: texto como categórico, `fecha` datetime64 y cantidades enteras.
+
+    Las `columnas_enteras` se convierten a número con los inválidos en 0 (igual
+    que hacen la limpieza y el loader); quedan en int64 si no tienen decimales.
+    """
+    df = df.copy()
+    for columna in df.columns:
+        if columna in columnas_enteras:
+            valores = pd.to_numeric(df[columna], errors="coerce").fillna(0)
+            enteros = valores.round() == valores
+            df[columna] = valores.astype(np.int64) if enteros.all() else valores.astype(float)
+        elif columna == "fecha":
+            df[columna] = pd.to_datetime(df[columna], errors="coerce")
+        elif not pd.api.types.is_numeric_dtype(df[columna]) and not pd.api.types.is_bool_dtype(df[columna]):
+            df[columna] = df[columna].astype("category")
+    return df
+
+
+def _archivos_columna(carpeta: str, i: int) -> tuple:
+    return os.path.join(carpeta, f"{i}.npy"), os.path.join(carpeta, f"{i}.categorias.npy")
+
+
+def _version_actual(carpeta: str):
+    """Subcarpeta de la versión publicada (según el puntero), o None."""
+    try:
+        with open(os.path.join(carpeta, PUNTERO)) as f:
+            nombre = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(carpeta, nombre) if nombre else None
+
+
+def _borrar_versiones(carpeta: str, conservar: set):
+    """Borra las versiones (y archivos del formato anterior) que no están en `conservar`."""
+    for entrada in os.listdir(carpeta):
+        ruta = os.path.join(carpeta, entrada)
+        if entrada == PUNTERO or ruta in conservar:
+            continue
+        try:
+            if entrada.startswith(".tmp-") and time.time() - os.path.getmtime(ruta) < SEGUNDOS_TEMPORAL:
+                continue
+            if os.path.isdir(ruta):
+                shutil.rmtree(ruta, ignore_errors=True)
+            else:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+
+def escribir_columnar(df: pd.DataFrame, carpeta: str, origen: dict):
+    """Guarda la tabla como una versión nueva: un .npy por columna y su meta.json.
+
+    Los categóricos se guardan como códigos + categorías.
+    Cada conversión se escribe en su propia subcarpeta y se publica
+    reemplazando con os.replace el archivo `actual` que apunta a ella: un
+    lector sigue el puntero una sola vez y ve la versión anterior o la nueva
+    completa, nunca una mezcla. Se conservan la versión publicada y la
+    anterior (que puede estar leyéndose); las más viejas se borran.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    temporal = tempfile.mkdtemp(prefix=".tmp-", dir=carpeta)
+    try:
+        columnas = []
+        for i, columna in enumerate(df.columns):
+            valores, categorias = _archivos_columna(temporal, i)
+            serie = df[columna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                np.save(valores, serie.cat.codes.to_numpy(dtype=np.int32))
+                np.save(categorias, serie.cat.categories.to_numpy().astype(str))
+                columnas.append({"nombre": columna, "tipo": "categoria"})
+            else:
+                np.save(valores, serie.to_numpy())
+                columnas.append({"nombre": columna, "tipo": str(serie.dtype)})
+        with open(os.path.join(temporal, "meta.json"), "w") as f:
+            json.dump({"version": VERSION_FORMATO, "origen": origen, "filas": len(df), "columnas": columnas}, f)
+        version = os.path.join(carpeta, "v-" + os.path.basename(temporal)[len(".tmp-"):])
+        os.rename(temporal, version)
+    except Exception:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+
+    with _lock:
+        anterior = _version_actual(carpeta)
+        descriptor, puntero = tempfile.mkstemp(prefix=".tmp-", dir=carpeta)
+        with os.fdopen(descriptor, "w") as f:
+            f.write(os.path.basename(version))
+        os.replace(puntero, os.path.join(carpeta, PUNTERO))
+        _borrar_versiones(carpeta, {version, anterior})
+
+
+def leer_meta(carpeta: str):
+    try:
+        with open(os.path.join(carpeta, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == VERSION_FORMATO else None
+
+
+def leer_columnar(carpeta: str, meta: dict) -> pd.DataFrame:
+    """Carga la tabla con los .npy mapeados en memoria (sin parsear texto).
+
+    Las columnas son vistas de solo lectura sobre el archivo (ndarray, no
+    np.memmap): no admiten escritura en sitio.
+    """
+    datos = {}
+    for i, columna in enumerate(meta["columnas"]):
+        valores, categorias = _archivos_columna(carpeta, i)
+        mapeado = np.asarray(np.load(valores, mmap_mode="r", allow_pickle=False))
+        if columna["tipo"] == "categoria":
+            datos[columna["nombre"]] = pd.Categorical.from_codes(mapeado, categories=np.load(categorias))
+        else:
+            datos[columna["nombre"]] = mapeado
+    return pd.DataFrame(datos, copy=False)
+
+
+def leer_csv_normalizado(ruta_csv: str) -> pd.DataFrame:
+    df = pd.read_csv(ruta_csv, encoding="utf-8-sig")
+    df.columns = df.columns.str.replace("﻿", "", regex=False).str.strip().str.lower()
+    return df
+
+
+def leer_tabla(ruta_csv: str, columnas_enteras=()) -> pd.DataFrame:
+    """Tabla tipada desde su copia columnar, reconvirtiendo desde el CSV si hace falta.
+
+    La copia se considera al día si registra el mismo mtime y tamaño que el
+    CSV actual (o si el CSV ya no existe). Si el CSV es más nuevo se vuelve a
+    importar y se reescribe la copia; si no se puede escribir (disco de solo
+    lectura) se devuelve igualmente la tabla importada. Si la copia está
+    incompleta (p. ej. la versión se borró mientras se leía) también se
+    importa el CSV.
+    """
+    carpeta = carpeta_columnar(ruta_csv)
+    version = _version_actual(carpeta)
+    meta = leer_meta(version) if version else None
+    if not os.path.exists(ruta_csv):
+        if meta is None:
+            raise FileNotFoundError(ruta_csv)
+        return leer_columnar(version, meta)
+
+    info = os.stat(ruta_csv)
+    origen = {"mtime_ns": info.st_mtime_ns, "tamano": info.st_size, "columnas_enteras": sorted(columnas_enteras)}
+    if meta is not None and meta["origen"] == origen:
+        try:
+            return leer_columnar(version, meta)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Copia columnar de {ruta_csv} incompleta, se lee el CSV: {e}", flush=True)
+
+    df = tipar_tabla(leer_csv_normalizado(ruta_csv), columnas_enteras)
+    try:
+        escribir_columnar(df, carpeta, origen)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar la copia columnar de {ruta_csv}: {e}", flush=True)
+    return df
+
+
+def descategorizar(df: pd.DataFrame) -> pd.DataFrame:
+    """Devuelve las columnas categóricas como texto plano (los NaN se conservan)."""
+    categoricas = {c: df[c].cat.categories.dtype for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)}
+    return df.astype(categoricas) if categoricas else df
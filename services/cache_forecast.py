@@ -0,0 +1,119 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Caché persistente de ajustes de forecast (SQLite). Ruta, tamaño máximo y
+# espera por bloqueos sobrescribibles por variables de entorno;
+# PLANITY_FORECAST_CACHE=0 la desactiva. Por defecto vive en el directorio
+# temporal del sistema, fuera del árbol de código.
+CACHE_ACTIVA = os.getenv("PLANITY_FORECAST_CACHE", "1") != "0"
+RUTA_CACHE = os.getenv(
+    "PLANITY_FORECAST_CACHE_PATH", os.path.join(tempfile.gettempdir(), "planity", "forecast.sqlite"),
+)
+MAX_BYTES_CACHE = int(float(os.getenv("PLANITY_FORECAST_CACHE_MB", "64")) * 2**20)
+ESPERA_SEGUNDOS = float(os.getenv("PLANITY_FORECAST_CACHE_ESPERA", "5"))
+# Fracción de las entradas menos usadas que se descarta al superar el tamaño
+FRACCION_DESALOJO = 0.25
+
+_estadisticas = {"aciertos": 0, "fallos": 0, "guardadas": 0, "desalojadas": 0, "errores": 0}
+_lock = threading.Lock()
+
+
+@contextmanager
+def _conectar(ruta: str):
+    """Conexión a la caché (crea archivo y tabla si faltan); confirma y cierra al salir."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    conexion = sqlite3.connect(ruta, timeout=ESPERA_SEGUNDOS)
+    try:
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS ajustes ("
+            "clave TEXT PRIMARY KEY, pred REAL, alpha REAL, l0 REAL, usado REAL)"
+        )
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def _real(valor) -> float:
+    # SQLite guarda NaN como NULL
+    return float("nan") if valor is None else valor
+
+
+def _fallo(operacion: str, ruta: str, error: Exception):
+    print(f"⚠️ Caché de forecast no disponible ({operacion} en {ruta}), se sigue sin caché: {error}", flush=True)
+    with _lock:
+        _estadisticas["errores"] += 1
+
+
+def buscar(claves: list, ruta: str = None) -> dict:
+    """{clave: (pred, alpha, l0)} de las claves guardadas; marca su uso para el desalojo LRU.
+
+    Si la caché no se puede abrir o leer (ruta inválida, base bloqueada o
+    dañada) se avisa y se devuelve {}: el forecast sigue sin caché.
+    """
+    claves = list(dict.fromkeys(claves))
+    encontrados = {}
+    ruta = ruta or RUTA_CACHE
+    if claves:
+        try:
+            with _lock, _conectar(ruta) as conexion:
+                for inicio in range(0, len(claves), 500):
+                    parte = claves[inicio:inicio + 500]
+                    filas = conexion.execute(
+                        f"SELECT clave, pred, alpha, l0 FROM ajustes WHERE clave IN ({','.join('?' * len(parte))})", parte
+                    ).fetchall()
+                    encontrados.update({c: (_real(p), _real(a), _real(l)) for c, p, a, l in filas})
+                ahora = time.time()
+                conexion.executemany("UPDATE ajustes SET usado = ? WHERE clave = ?", [(ahora, c) for c in encontrados])
+        except (sqlite3.Error, OSError) as e:
+            _fallo("lectura", ruta, e)
+            encontrados = {}
+    with _lock:
+        _estadisticas["aciertos"] += len(encontrados)
+        _estadisticas["fallos"] += len(claves) - len(encontrados)
+    return encontrados
+
+
+def _desalojar(conexion: sqlite3.Connection, max_bytes: int) -> int:
+    """Descarta las entradas menos usadas mientras las páginas ocupadas superen max_bytes."""
+    desalojadas = 0
+    while True:
+        paginas = conexion.execute("PRAGMA page_count").fetchone()[0] - conexion.execute("PRAGMA freelist_count").fetchone()[0]
+        entradas = conexion.execute("SELECT COUNT(*) FROM ajustes").fetchone()[0]
+        if paginas * conexion.execute("PRAGMA page_size").fetchone()[0] <= max_bytes or entradas == 0:
+            return desalojadas
+        cantidad = max(1, int(entradas * FRACCION_DESALOJO))
+        conexion.execute(
+            "DELETE FROM ajustes WHERE clave IN (SELECT clave FROM ajustes ORDER BY usado LIMIT ?)", (cantidad,)
+        )
+        desalojadas += cantidad
+
+
+def guardar(nuevos: dict, ruta: str = None, max_bytes: int = None):
+    """Guarda {clave: (pred, alpha, l0)} y aplica el límite de tamaño; si falla solo se avisa."""
+    if not nuevos:
+        return
+    ahora = time.time()
+    ruta = ruta or RUTA_CACHE
+    try:
+        with _lock, _conectar(ruta) as conexion:
+            conexion.executemany(
+                "INSERT OR REPLACE INTO ajustes (clave, pred, alpha, l0, usado) VALUES (?, ?, ?, ?, ?)",
+                [(c, float(p), float(a), float(l), ahora) for c, (p, a, l) in nuevos.items()],
+            )
+            desalojadas = _desalojar(conexion, max_bytes or MAX_BYTES_CACHE)
+            _estadisticas["guardadas"] += len(nuevos)
+            _estadisticas["desalojadas"] += desalojadas
+    except (sqlite3.Error, OSError) as e:
+        _fallo("escritura", ruta, e)
+
+
+def estadisticas() -> dict:
+    """Contadores acumulados del proceso: aciertos, fallos, guardadas y desalojadas."""
+    with _lock:
+        return dict(_estadisticas)
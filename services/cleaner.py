@@ -1,108 +1,234 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-import time
+from numpy.lib.stride_tricks import sliding_window_view
+
+from services.executor import dividir_en_bloques, ejecutar_en_bloques, resolver_ejecucion
+from services.frames import como_frame
+from services.indice_stock import indice_stock
+from services.metricas import medido, tramo
+from services.series import (
+    ORDINAL_NULO, codificar_skus, entero_compacto, lunes_de_semana, ordinal_mes, ordinal_semana, series_por_sku,
+)
+from services.ventana_percentiles import VentanaPercentiles
+
+# Semanas previas usadas para los percentiles P15/P60 de la imputación
+VENTANA_SEMANAS = 24
+# Stock mínimo mensual para considerar que no hubo quiebre
+STOCK_MINIMO = 4
+# Meses seguidos con stock registrado en 0 para marcar un SKU como obsoleto
+MESES_OBSOLESCENCIA = 12
+# Filas procesadas por bloque al evaluar ventanas (acota la memoria)
+BLOQUE_VENTANAS = 65536
+
+
+def _percentiles_positivos(valores: np.ndarray, percentiles: list) -> np.ndarray:
+    """Percentiles por fila considerando solo los valores > 0.
+
+    Devuelve un array (len(percentiles), filas) con NaN en las filas sin
+    valores positivos. Las filas se agrupan por cantidad de positivos para
+    usar np.percentile (interpolación lineal) y obtener exactamente los
+    mismos valores que el cálculo fila a fila.
+    """
+    positivos = valores > 0
+    conteo = positivos.sum(axis=1)
+    centinela = np.where(positivos, valores, np.iinfo(valores.dtype).max)
+    ordenados = np.sort(centinela, axis=1)
+
+    resultado = np.full((len(percentiles), len(valores)), np.nan)
+    for n in np.unique(conteo[conteo > 0]):
+        filas = np.nonzero(conteo == n)[0]
+        resultado[:, filas] = np.percentile(ordenados[filas, :n], percentiles, axis=1)
+    return resultado
+
+
+def limpiar_matriz(demanda: np.ndarray, stock_ok: np.ndarray) -> tuple:
+    """Limpieza de quiebres y outliers sobre una matriz (sku × semana).
+
+    `demanda` es entera (int32 o int64) con las semanas ordenadas por fila y `stock_ok` marca
+    las semanas con stock >= STOCK_MINIMO en el mes anterior, actual y
+    posterior. Devuelve (demanda_sin_stockout, demanda_sin_outlier).
+    """
+    n_skus = demanda.shape[0]
+    sin_stockout = demanda.copy()
+
+    # Cuando falla stock_ok siempre se imputa: basta comparar contra P15
+    filas, semanas = np.nonzero(~stock_ok)
+    if len(filas):
+        relleno = np.zeros((n_skus, VENTANA_SEMANAS), dtype=demanda.dtype)
+        ventanas = sliding_window_view(np.hstack([relleno, demanda]), VENTANA_SEMANAS, axis=1)
+
+        for inicio in range(0, len(filas), BLOQUE_VENTANAS):
+            f = filas[inicio:inicio + BLOQUE_VENTANAS]
+            s = semanas[inicio:inicio + BLOQUE_VENTANAS]
+            p15, p60 = np.nan_to_num(_percentiles_positivos(ventanas[f, s], [15, 60]), nan=0)
+            imputar = demanda[f, s] < p15
+            sin_stockout[f[imputar], s[imputar]] = np.rint(p60[imputar])
+
+    p95 = _percentiles_positivos(sin_stockout, [95])[0][:, None]
+    sin_outlier = np.where(sin_stockout > p95, np.rint(p95), sin_stockout).astype(np.int64)
+    return sin_stockout, sin_outlier
+
+
+def _limpiar_vectorizado(df: pd.DataFrame, stock_df: pd.DataFrame, ejecucion: dict = None, skus: list = None) -> pd.DataFrame:
+    # Grilla de semanas (ordinales) de todo el dataset, aunque se limpie un subconjunto
+    semanas = ordinal_semana(df["fecha"])
+    periodos = np.unique(semanas[semanas != ORDINAL_NULO])
+    if skus is not None:
+        filtro = df["sku"].isin(skus).to_numpy()
+        df, semanas = df[filtro], semanas[filtro]
+
+    # Matriz densa sku × semana (0 en las semanas sin registro)
+    with tramo("limpieza.series", len(df), log=False):
+        codigos, catalogo = codificar_skus(df["sku"])
+        valores = df["demanda_original"].to_numpy()
+        demanda = series_por_sku(codigos, semanas, valores, catalogo, periodos, dtype=entero_compacto(valores))
+    if ((codigos >= 0) & (semanas != ORDINAL_NULO)).sum() != demanda.presentes.sum():
+        raise ValueError("❌ Hay registros de demanda duplicados para un mismo SKU y semana")
+    print(f"✅ Series por SKU: {demanda.valores.shape[0]} SKUs × {demanda.valores.shape[1]} semanas ({demanda.valores.dtype})")
+
+    # Meses (ordinales) del mes anterior y posterior de cada semana: el mes
+    # actual queda entre ambos, así que basta revisar ese rango contiguo
+    lunes = lunes_de_semana(demanda.periodos)
+    cuatro_semanas = np.timedelta64(28, "D")
+    mes_anterior = ordinal_mes(lunes - cuatro_semanas)
+    mes_posterior = ordinal_mes(lunes + cuatro_semanas)
+
+    with tramo("limpieza.indice_stock", len(stock_df), log=False):
+        indice = indice_stock(stock_df, catalogo, STOCK_MINIMO)
+        stock_ok = indice.meses_con_minimo(mes_anterior, mes_posterior) == mes_posterior - mes_anterior + 1
+
+    # Bloques de SKUs independientes: se envían como arrays y se unen en orden
+    config = resolver_ejecucion(ejecucion, bloque_defecto=2048)
+    bloques = dividir_en_bloques(len(catalogo), config["bloque"])
+    with tramo("limpieza.matriz", demanda.valores.size, log=False):
+        resultados = ejecutar_en_bloques(
+            limpiar_matriz,
+            [(demanda.valores[b], stock_ok[b]) for b in bloques],
+            modo=config["modo"],
+            workers=config["workers"],
+        )
+    n_semanas = len(demanda.periodos)
+    return pd.DataFrame({
+        "sku": catalogo.take(np.repeat(np.arange(len(catalogo)), n_semanas)),
+        "semana": np.tile(lunes.astype(df["fecha"].dtype), len(catalogo)),
+        "demanda_original": demanda.valores.ravel().astype(np.int64),
+        "demanda_sin_stockout": np.vstack([r[0] for r in resultados]).ravel().astype(np.int64),
+        "demanda_sin_outlier": np.vstack([r[1] for r in resultados]).ravel(),
+        "es_obsoleto": np.repeat(indice.obsoletos(MESES_OBSOLESCENCIA), n_semanas),
+    })
+
+
+def _reindexar_semanas(df: pd.DataFrame) -> pd.DataFrame:
+    """Formato largo con todas las semanas para cada SKU (motor iterativo)."""
+    df = df.assign(semana=df["fecha"] - pd.to_timedelta(df["fecha"].dt.weekday, unit='D'))
+    df = df[["sku", "semana", "demanda_original"]]
+    semanas_totales = sorted(df["semana"].unique())
+    index = pd.MultiIndex.from_product([df["sku"].unique(), semanas_totales], names=["sku", "semana"])
+    df = df.set_index(["sku", "semana"]).reindex(index, fill_value=0).reset_index()
+    df["demanda_sin_stockout"] = np.nan
+    df["demanda_sin_outlier"] = np.nan
+    return df
+
 
+def clean_demand(demanda_raw: list, stock_raw: list, motor: str = "vectorizado", ejecucion: dict = None, skus: list = None) -> list:
+    """Adaptador en registros de clean_demand_df (para respuestas HTTP)."""
+    return clean_demand_df(demanda_raw, stock_raw, motor=motor, ejecucion=ejecucion, skus=skus).to_dict(orient="records")
 
-def clean_demand(demanda_raw: list, stock_raw: list) -> list:
+
+@medido("limpieza")
+def clean_demand_df(df_demanda, df_stock, motor: str = "vectorizado", ejecucion: dict = None, skus: list = None) -> pd.DataFrame:
+    """Demanda semanal limpia (sin quiebres de stock ni outliers) por SKU.
+
+    Recibe DataFrames (o registros), que no se modifican, y devuelve un
+    DataFrame ordenado por sku y fecha. Con `skus` solo se limpian esos SKUs; la grilla de semanas y la ventana de
+    obsolescencia se siguen calculando con todo el dataset, así que sus filas
+    coinciden con las de una limpieza completa.
+    """
     print("🧠 Iniciando función clean_demand...")
-    t0 = time.time()
 
     # --- Preprocesar demanda ---
-    df = pd.DataFrame(demanda_raw)
-    print("🧪 Columnas recibidas en df_demanda (desde demanda_raw):", df.columns.tolist(), flush=True)
+    with tramo("limpieza.preprocesamiento") as t:
+        df = como_frame(df_demanda)
+        print("🧪 Columnas recibidas en df_demanda:", df.columns.tolist(), flush=True)
 
-    # Convertir fecha y semana
-    df["fecha"] = pd.to_datetime(df["fecha"])
-    df["semana"] = df["fecha"] - pd.to_timedelta(df["fecha"].dt.weekday, unit='D')
+        df["fecha"] = pd.to_datetime(df["fecha"])
 
-    # Validar existencia de columna 'demanda'
-    if "demanda" not in df.columns:
-        raise ValueError(f"❌ Columna 'demanda' no encontrada. Columnas actuales: {df.columns.tolist()}")
+        # Validar existencia de columna 'demanda'
+        if "demanda" not in df.columns:
+            raise ValueError(f"❌ Columna 'demanda' no encontrada. Columnas actuales: {df.columns.tolist()}")
 
-    # Reemplazar valores no válidos por 0
-    df["demanda"] = df["demanda"].replace(["N/A", "n/a", "undefined", "", None], 0)
+        # Reemplazar valores no válidos por 0
+        df["demanda"] = df["demanda"].replace(["N/A", "n/a", "undefined", "", None], 0)
 
-    # Convertir a número, luego a entero
-    df["demanda_original"] = pd.to_numeric(df["demanda"], errors="coerce").fillna(0).astype(int)
+        # Convertir a número, luego a entero
+        df["demanda_original"] = pd.to_numeric(df["demanda"], errors="coerce").fillna(0).astype(int)
 
-    # Filtrar columnas
-    df = df[["sku", "semana", "demanda_original"]]
-    print(f"✅ Preprocesamiento demanda: {round(time.time() - t0, 2)} seg")
-
-    # --- Reindexar ---
-    semanas_totales = sorted(df["semana"].unique())
-    skus = df["sku"].unique()
-    index = pd.MultiIndex.from_product([skus, semanas_totales], names=["sku", "semana"])
-    df = df.set_index(["sku", "semana"]).reindex(index, fill_value=0).reset_index()
-    df["demanda_sin_stockout"] = np.nan
-    df["demanda_sin_outlier"] = np.nan
-    print(f"✅ Reindexado con semanas: {round(time.time() - t0, 2)} seg")
+        # Filtrar columnas
+        df = df[["sku", "fecha", "demanda_original"]]
+        t.filas_salida = len(df)
 
     # --- Procesar stock ---
-    stock_df = pd.DataFrame(stock_raw)
-    stock_df["fecha"] = pd.to_datetime(stock_df["fecha"])
-    stock_df["mes"] = stock_df["fecha"].dt.to_period("M").dt.to_timestamp()
-    stock_df["stock"] = pd.to_numeric(stock_df["stock"], errors="coerce").fillna(0).astype(int)
-    stock_map = stock_df.groupby(["sku", "mes"])["stock"].sum().to_dict()
-    print(f"📦 Procesamiento stock: {round(time.time() - t0, 2)} seg")
-
-    fecha_max = stock_df["mes"].max()
-    fecha_min = fecha_max - pd.DateOffset(months=11)
-    ultimos_12 = stock_df[stock_df["mes"].between(fecha_min, fecha_max)]
-    resumen = ultimos_12.groupby(["sku", "mes"])["stock"].sum().reset_index()
-    resumen["sin_stock"] = resumen["stock"] == 0
-    conteo = resumen.groupby("sku")["sin_stock"].sum()
-    skus_obsoletos = conteo[conteo == 12].index.tolist()
-    ultimos_3_meses = sorted(stock_df["mes"].unique())[-3:]
-
-    # --- Limpieza por SKU ---
-    def procesar_grupo(grupo):
+    with tramo("limpieza.stock") as t:
+        stock_df = como_frame(df_stock)
+        stock_df["stock"] = pd.to_numeric(stock_df["stock"], errors="coerce").fillna(0).astype(int)
+        t.filas_salida = len(stock_df)
+
+    # --- Limpieza por SKU (motor iterativo de referencia) ---
+    def procesar_grupo(grupo, indice, obsoletos):
         sku = grupo["sku"].iloc[0]
+        fila = indice.skus.get_loc(sku)
         grupo = grupo.sort_values("semana").reset_index(drop=True)
-        grupo["es_obsoleto"] = sku in skus_obsoletos
+        grupo["es_obsoleto"] = bool(obsoletos[fila])
         demanda_sin_stockout = []
+        ultimos_3_meses = indice.meses[-3:]
 
         # Cálculo de P10 histórico (solo valores > 0)
         historico = grupo[grupo["demanda_original"] > 0]["demanda_original"]
         p10_total = np.percentile(historico, 10) if not historico.empty else 0
 
+        # Meses (ordinales) de cada semana y de 4 semanas antes y después
+        semanas = grupo["semana"].to_numpy()
+        meses_actuales = ordinal_mes(semanas)
+        meses_anteriores = ordinal_mes(semanas - np.timedelta64(28, "D"))
+        meses_posteriores = ordinal_mes(semanas + np.timedelta64(28, "D"))
+
+        # Ventana de las VENTANA_SEMANAS semanas previas (P15/P60 de los positivos y suma)
+        demandas = grupo["demanda_original"].tolist()
+        ventana = VentanaPercentiles(VENTANA_SEMANAS)
+
         for i in range(len(grupo)):
-            demanda_actual = grupo.loc[i, "demanda_original"]
-            fecha_semana = grupo.loc[i, "semana"]
-            mes_actual = fecha_semana.to_period("M").to_timestamp()
-            mes_anterior = (fecha_semana - pd.DateOffset(weeks=4)).to_period("M").to_timestamp()
-            mes_posterior = (fecha_semana + pd.DateOffset(weeks=4)).to_period("M").to_timestamp()
-
-            # Criterio base: si stock >= 4 en meses clave, no limpiar
-            meses_revisar = [mes_anterior, mes_actual, mes_posterior]
-            stock_ok = all(stock_map.get((sku, m), 0) >= 4 for m in meses_revisar)
+            if i > 0:
+                ventana.agregar(demandas[i - 1])
+            demanda_actual = demandas[i]
+            mes_actual = meses_actuales[i]
+            mes_anterior = meses_anteriores[i]
+            mes_posterior = meses_posteriores[i]
+
+            # Criterio base: si stock >= 4 en meses clave (anterior..posterior), no limpiar
+            meses_revisar = mes_posterior - mes_anterior + 1
+            stock_ok = indice.meses_con_minimo(mes_anterior, mes_posterior, fila) == meses_revisar
             if stock_ok:
                 demanda_sin_stockout.append(demanda_actual)
                 continue
 
-            ultimas_24 = grupo.iloc[max(0, i - 24):i]
-            demanda_valida = ultimas_24[ultimas_24["demanda_original"] > 0]["demanda_original"]
-            p15 = np.percentile(demanda_valida, 15) if not demanda_valida.empty else 0
-            p60 = np.percentile(demanda_valida, 60) if not demanda_valida.empty else 0
+            p15 = ventana.percentil(15)
+            p60 = ventana.percentil(60)
 
             aplicar_limpieza = False
             imputar = False
 
-            stock_actual = stock_map.get((sku, mes_actual), 0)
-            stock_anterior = stock_map.get((sku, mes_anterior), 0)
-            meses_futuros = [mes_actual + pd.DateOffset(months=m) for m in range(1, 7)]
-            stock_futuro = sum(stock_map.get((sku, m), 0) for m in meses_futuros)
+            stock_actual = indice.stock_en(mes_actual, fila)
+            stock_anterior = indice.stock_en(mes_anterior, fila)
+            stock_futuro = indice.stock_entre(mes_actual + 1, mes_actual + 6, fila)
 
             if (stock_actual < 4 or stock_anterior < 4) and (stock_futuro > 0 or mes_actual in ultimos_3_meses):
                 aplicar_limpieza = imputar = True
 
-            if any(stock_map.get((sku, m), 0) < 4 for m in meses_revisar):
+            if indice.meses_con_minimo(mes_anterior, mes_posterior, fila) < meses_revisar:
                 aplicar_limpieza = imputar = True
 
-            suma_ultimas_24 = ultimas_24["demanda_original"].sum()
-            if suma_ultimas_24 > p10_total:
+            if ventana.suma > p10_total:
                 aplicar_limpieza = True
                 imputar = True
 
@@ -124,22 +250,30 @@ def clean_demand(demanda_raw: list, stock_raw: list) -> list:
         ]
         return grupo
 
-    # --- Paralelizar ---
-    t1 = time.time()
-    with ThreadPoolExecutor() as executor:
-        resultados = list(executor.map(procesar_grupo, [g for _, g in df.groupby("sku")]))
-    print(f"🧪 Limpieza por SKU: {round(time.time() - t1, 1)} seg")
-
-    df_final = pd.concat(resultados).sort_values(["sku", "semana"])
+    # --- Limpieza: motor vectorizado (por defecto) o iterativo por SKU ---
+    with tramo(f"limpieza.{motor}") as t:
+        if motor == "vectorizado":
+            df_final = _limpiar_vectorizado(df, stock_df, ejecucion, skus)
+        elif motor == "iterativo":
+            df = _reindexar_semanas(df)
+            if skus is not None:
+                df = df[df["sku"].isin(skus)]
+            indice = indice_stock(stock_df, pd.Index(df["sku"].unique()), STOCK_MINIMO)
+            obsoletos = indice.obsoletos(MESES_OBSOLESCENCIA)
+            # Referencia por SKU (serial: con hilos el GIL no aporta paralelismo)
+            resultados = []
+            for _, grupo in df.groupby("sku", observed=True):
+                with tramo("limpieza.iterativo.sku", len(grupo), log=False):
+                    resultados.append(procesar_grupo(grupo, indice, obsoletos))
+            df_final = pd.concat(resultados).sort_values(["sku", "semana"])
+        else:
+            raise ValueError(f"❌ Motor de limpieza desconocido: {motor}")
+        t.filas_salida = len(df_final)
 
     # ✅ Mantener 'semana' y generar columna 'fecha' correcta
     df_final["fecha"] = pd.to_datetime(df_final["semana"])  # fecha = lunes de cada semana, tipo datetime
 
-    resultado = df_final.sort_values(["sku", "fecha"]).to_dict(orient="records")
-
-    print(f"✅ Limpieza completada. Total filas: {len(resultado)}")
-    print(f"⏱️ Tiempo total: {round(time.time() - t0, 1)} seg")
-    return resultado
+    return df_final.sort_values(["sku", "fecha"]).reset_index(drop=True)
 
 
 
@@ -0,0 +1,251 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from services.dataset_store import huella_frames
+from services.metricas import medido, tramo
+from services.series import ORDINAL_NULO, codificar_skus, inicio_de_mes, ordinal_mes, series_por_sku
+
+# Cubos guardados (uno por versión de dataset)
+MAX_CUBOS = int(os.getenv("PLANITY_CUBOS_MAX", "8"))
+DIMENSIONES = ("sku", "mes", "categoria")
+MEDIDAS = ("unidades_vendidas", "unidades_perdidas", "venta_real_euros", "venta_perdida_euros")
+SIN_CATEGORIA = "SIN CATEGORÍA"
+# Columnas de demanda_limpia que entran en el cubo (y en la huella de sus filas)
+COLUMNAS_DEMANDA = ["sku", "fecha", "demanda", "demanda_sin_outlier"]
+
+_cubos = OrderedDict()
+_lock = threading.Lock()
+
+
+@dataclass
+class CuboResumen:
+    """Ventas y pérdidas por (sku × mes) con la categoría y el precio de cada SKU.
+
+    `skus` está ordenado (como un groupby('sku')) y `meses` son ordinales
+    contiguos; `vendidas` y `perdidas` son matrices densas (sku × mes) y
+    `presentes` marca las celdas con algún registro de demanda. Los euros
+    salen de unidades × precio de venta al consultar. `ultima_fecha` y
+    `huella_filas` (suma de los hash de las filas, independiente del orden)
+    permiten sumar semanas nuevas sin reconstruir el cubo.
+    """
+    skus: pd.Index
+    meses: np.ndarray
+    vendidas: np.ndarray
+    perdidas: np.ndarray
+    presentes: np.ndarray
+    categorias: np.ndarray
+    precios: np.ndarray
+    maestro: pd.DataFrame
+    huella_maestro: str
+    ultima_fecha: pd.Timestamp
+    huella_filas: np.uint64
+    filas: int
+    enteros: bool
+
+
+def _preparar_demanda(demanda_limpia: pd.DataFrame) -> pd.DataFrame:
+    df = demanda_limpia[COLUMNAS_DEMANDA].copy()
+    # Las tablas del pipeline ya traen la fecha parseada; solo se convierte la del payload
+    if not pd.api.types.is_datetime64_any_dtype(df['fecha']):
+        df['fecha'] = pd.to_datetime(df['fecha'])
+    return df
+
+
+def _huella_filas(df: pd.DataFrame) -> np.uint64:
+    # Suma (mod 2**64) de los hash de cada fila: no depende del orden de las filas
+    return np.uint64(pd.util.hash_pandas_object(df, index=False).to_numpy().sum(dtype=np.uint64))
+
+
+def _atributos_sku(maestro: pd.DataFrame, skus: pd.Index) -> tuple:
+    """Categoría y precio de venta de cada SKU (primer registro del maestro)."""
+    primeros = maestro.drop_duplicates('sku', keep='first').set_index('sku')
+    precios = pd.to_numeric(primeros['precio_venta'], errors='coerce').reindex(skus).fillna(0)
+    if 'categoria' in primeros.columns:
+        categorias = primeros['categoria'].reindex(skus).fillna(SIN_CATEGORIA).astype(str)
+    else:
+        categorias = pd.Series(SIN_CATEGORIA, index=skus)
+    return categorias.to_numpy(dtype=object), precios.to_numpy(dtype=float)
+
+
+def _acumular(df: pd.DataFrame, skus: pd.Index, meses: np.ndarray):
+    """Unidades vendidas y perdidas de `df` sumadas en la grilla (skus × meses)."""
+    vendidas = pd.to_numeric(df['demanda'], errors='coerce').to_numpy(dtype=float)
+    sin_outlier = pd.to_numeric(df['demanda_sin_outlier'], errors='coerce').to_numpy(dtype=float)
+    perdidas = np.maximum(sin_outlier - vendidas, 0)
+    serie = series_por_sku(
+        codificar_skus(df['sku'], skus)[0], ordinal_mes(df['fecha']), np.vstack([vendidas, perdidas]),
+        skus, meses, dtype=float,
+    )
+    return serie.valores[0], serie.valores[1], serie.presentes
+
+
+def _grilla_meses(ordinales: np.ndarray) -> np.ndarray:
+    conocidos = ordinales[ordinales != ORDINAL_NULO]
+    if len(conocidos) == 0:
+        return np.array([], dtype=np.int64)
+    return np.arange(conocidos.min(), conocidos.max() + 1)
+
+
+@medido("cubo_resumen")
+def construir_cubo(demanda_limpia: pd.DataFrame, maestro: pd.DataFrame) -> CuboResumen:
+    """Cubo completo a partir de la demanda limpia y el maestro de productos."""
+    df = _preparar_demanda(demanda_limpia)
+    skus = pd.Index(np.sort(df['sku'].dropna().unique()))
+    meses = _grilla_meses(ordinal_mes(df['fecha']))
+    vendidas, perdidas, presentes = _acumular(df, skus, meses)
+    categorias, precios = _atributos_sku(maestro, skus)
+    enteros = all(pd.api.types.is_integer_dtype(df[c]) for c in ('demanda', 'demanda_sin_outlier'))
+    return CuboResumen(
+        skus, meses, vendidas, perdidas, presentes, categorias, precios, maestro,
+        huella_frames({"maestro": maestro}), df['fecha'].max(), _huella_filas(df), len(df), enteros,
+    )
+
+
+def agregar_semanas(cubo: CuboResumen, demanda_nueva: pd.DataFrame) -> CuboResumen:
+    """Cubo nuevo con las filas de `demanda_nueva` posteriores a `cubo.ultima_fecha`.
+
+    Amplía la grilla con los SKUs y meses nuevos y suma solo esas filas; las
+    filas hasta `ultima_fecha` se ignoran (ya están en el cubo).
+    """
+    df = _preparar_demanda(demanda_nueva)
+    df = df[df['fecha'] > cubo.ultima_fecha]
+    if df.empty:
+        return cubo
+
+    skus = cubo.skus.union(pd.Index(df['sku'].dropna().unique()))
+    ordinales = np.concatenate([cubo.meses, ordinal_mes(df['fecha'])])
+    meses = _grilla_meses(ordinales)
+    filas_previas = skus.get_indexer(cubo.skus)
+    columnas_previas = cubo.meses - meses[0] if len(meses) else cubo.meses
+
+    vendidas, perdidas, presentes = _acumular(df, skus, meses)
+    celda = np.ix_(filas_previas, columnas_previas)
+    vendidas[celda] += cubo.vendidas
+    perdidas[celda] += cubo.perdidas
+    presentes[celda] |= cubo.presentes
+    categorias, precios = _atributos_sku(cubo.maestro, skus)
+    enteros = cubo.enteros and all(pd.api.types.is_integer_dtype(df[c]) for c in ('demanda', 'demanda_sin_outlier'))
+    return CuboResumen(
+        skus, meses, vendidas, perdidas, presentes, categorias, precios, cubo.maestro, cubo.huella_maestro,
+        df['fecha'].max(), np.uint64(cubo.huella_filas + _huella_filas(df)), cubo.filas + len(df), enteros,
+    )
+
+
+def _desde_previo(demanda_limpia: pd.DataFrame, maestro: pd.DataFrame):
+    """Cubo actualizado a partir de uno guardado si la demanda nueva solo agrega semanas posteriores."""
+    with _lock:
+        previos = list(reversed(_cubos.values()))
+    if not previos:
+        return None
+    huella_maestro = huella_frames({"maestro": maestro})
+    df = _preparar_demanda(demanda_limpia)
+    for previo in previos:
+        if previo.huella_maestro != huella_maestro:
+            continue
+        anteriores = df[df['fecha'] <= previo.ultima_fecha]
+        if len(anteriores) == previo.filas and _huella_filas(anteriores) == previo.huella_filas:
+            return agregar_semanas(previo, df)
+    return None
+
+
+def obtener_cubo(demanda_limpia: pd.DataFrame, maestro: pd.DataFrame, version: str = None) -> CuboResumen:
+    """Cubo de una versión de dataset (dataset_id o huella de las tablas), construido una sola vez.
+
+    Si no está guardado pero otro cubo tiene la misma demanda hasta su
+    última fecha (y el mismo maestro), se le suman solo las semanas nuevas.
+    """
+    if version is None:
+        version = huella_frames({"demanda_limpia": demanda_limpia[COLUMNAS_DEMANDA], "maestro": maestro})
+    with _lock:
+        cubo = _cubos.get(version)
+        if cubo is not None:
+            _cubos.move_to_end(version)
+            return cubo
+
+    with tramo("cubo_resumen.actualizacion", len(demanda_limpia), log=False):
+        cubo = _desde_previo(demanda_limpia, maestro)
+    if cubo is None:
+        cubo = construir_cubo(demanda_limpia, maestro)
+    with _lock:
+        _cubos[version] = cubo
+        _cubos.move_to_end(version)
+        while len(_cubos) > MAX_CUBOS:
+            _cubos.popitem(last=False)
+    return cubo
+
+
+def _mes_ordinal(valor, nombre: str) -> int:
+    try:
+        return int(ordinal_mes([pd.Timestamp(valor)])[0])
+    except (ValueError, TypeError):
+        raise ValueError(f"❌ '{nombre}' debe ser un mes (YYYY-MM): {valor!r}")
+
+
+def consultar_cubo(cubo: CuboResumen, skus=None, categorias=None, desde=None, hasta=None,
+                   agrupar=("sku", "mes")) -> pd.DataFrame:
+    """Medidas del cubo filtradas por SKUs, categorías y rango de meses, agregadas por `agrupar`.
+
+    `agrupar` es un subconjunto de ("sku", "mes", "categoria"); sin
+    dimensiones se devuelve una sola fila con los totales. Solo aparecen
+    los grupos con algún registro de demanda.
+    """
+    if isinstance(agrupar, str) or any(d not in DIMENSIONES for d in agrupar):
+        raise ValueError(f"❌ 'agrupar' debe ser una lista con dimensiones de {list(DIMENSIONES)}")
+    agrupar = [d for d in DIMENSIONES if d in agrupar]
+
+    filas = np.ones(len(cubo.skus), dtype=bool)
+    if skus is not None:
+        filas &= cubo.skus.isin(skus)
+    if categorias is not None:
+        filas &= np.isin(cubo.categorias, list(categorias))
+    columnas = np.ones(len(cubo.meses), dtype=bool)
+    if desde is not None:
+        columnas &= cubo.meses >= _mes_ordinal(desde, "desde")
+    if hasta is not None:
+        columnas &= cubo.meses <= _mes_ordinal(hasta, "hasta")
+
+    seleccion = np.ix_(filas, columnas)
+    precios = cubo.precios[filas][:, None]
+    vendidas, perdidas = cubo.vendidas[seleccion], cubo.perdidas[seleccion]
+    medidas = [vendidas, perdidas, vendidas * precios, perdidas * precios]
+    presentes = cubo.presentes[seleccion]
+    skus_sel, meses_sel, categorias_sel = cubo.skus[filas], cubo.meses[columnas], cubo.categorias[filas]
+
+    # Agregación por filas (sku o categoría) y luego por columnas (mes)
+    if "sku" in agrupar:
+        etiquetas_fila = {"sku": skus_sel.to_numpy(dtype=object), "categoria": categorias_sel}
+    elif "categoria" in agrupar:
+        nombres, grupo = np.unique(categorias_sel.astype(str), return_inverse=True)
+        sumar = lambda m: np.stack([np.bincount(grupo, weights=c, minlength=len(nombres)) for c in m.T], axis=1) \
+            if m.shape[1] else np.zeros((len(nombres), 0))
+        medidas = [sumar(m) for m in medidas]
+        presentes = sumar(presentes.astype(float)) > 0
+        etiquetas_fila = {"categoria": nombres.astype(object)}
+    else:
+        medidas = [m.sum(axis=0, keepdims=True) for m in medidas]
+        presentes = presentes.any(axis=0, keepdims=True)
+        etiquetas_fila = {}
+    if "mes" not in agrupar:
+        medidas = [m.sum(axis=1, keepdims=True) for m in medidas]
+        presentes = presentes.any(axis=1, keepdims=True)
+
+    fila, columna = np.nonzero(presentes)
+    resultado = {d: etiquetas_fila[d][fila] for d in agrupar if d in etiquetas_fila}
+    if "mes" in agrupar:
+        resultado["mes"] = np.datetime_as_string(inicio_de_mes(meses_sel[columna]))
+    df = pd.DataFrame({**resultado, **{nombre: m[fila, columna] for nombre, m in zip(MEDIDAS, medidas)}})
+    if cubo.enteros:
+        df[list(MEDIDAS[:2])] = df[list(MEDIDAS[:2])].astype(np.int64)
+    return df[[d for d in agrupar] + list(MEDIDAS)]
+
+
+def resumen_historico(cubo: CuboResumen) -> pd.DataFrame:
+    """Tabla de consolidar_historico_stock (sku, mes, unidades, precio y euros) desde el cubo."""
+    df = consultar_cubo(cubo)
+    df.insert(4, 'precio_venta', cubo.precios[cubo.skus.get_indexer(df['sku'])])
+    return df
@@ -0,0 +1,97 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Límites del almacén en memoria, sobrescribibles por variables de entorno
+MAX_DATASETS = int(os.getenv("PLANITY_DATASETS_MAX", "8"))
+TTL_SEGUNDOS = float(os.getenv("PLANITY_DATASETS_TTL", "3600"))
+
+_datasets = OrderedDict()
+_lock = threading.Lock()
+
+
+def huella_frames(tablas: dict) -> str:
+    """Hash de contenido de un conjunto de tablas (nombres, columnas y valores)."""
+    h = hashlib.blake2b(digest_size=12)
+    for nombre in sorted(tablas):
+        df = tablas[nombre]
+        h.update(nombre.encode())
+        h.update("|".join(map(str, df.columns)).encode())
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _expirar(ahora: float):
+    for dataset_id in [k for k, v in _datasets.items() if ahora - v["usado"] > TTL_SEGUNDOS]:
+        del _datasets[dataset_id]
+
+
+def guardar_dataset(tablas: dict) -> str:
+    """Guarda las tablas y devuelve su ID (hash de contenido).
+
+    Si el mismo contenido ya estaba guardado se reutiliza la entrada. Se
+    descartan las entradas vencidas por TTL y las menos usadas por encima de
+    MAX_DATASETS.
+    """
+    dataset_id = huella_frames(tablas)
+    ahora = time.time()
+    with _lock:
+        _expirar(ahora)
+        entrada = _datasets.get(dataset_id)
+        if entrada is None:
+            entrada = {"tablas": dict(tablas), "creado": ahora}
+            _datasets[dataset_id] = entrada
+        entrada["usado"] = ahora
+        _datasets.move_to_end(dataset_id)
+        while len(_datasets) > MAX_DATASETS:
+            _datasets.popitem(last=False)
+    return dataset_id
+
+
+def obtener_dataset(dataset_id: str = None, nombres: list = None):
+    """Tablas de un dataset (el último guardado si no se indica ID), o None.
+
+    Se devuelven copias superficiales para que los endpoints puedan
+    reasignar columnas sin alterar lo guardado.
+    """
+    ahora = time.time()
+    with _lock:
+        _expirar(ahora)
+        if dataset_id is None:
+            if not _datasets:
+                return None
+            dataset_id = next(reversed(_datasets))
+        entrada = _datasets.get(dataset_id)
+        if entrada is None:
+            return None
+        entrada["usado"] = ahora
+        _datasets.move_to_end(dataset_id)
+        tablas = entrada["tablas"]
+
+    nombres = nombres or list(tablas)
+    return {nombre: tablas[nombre].copy(deep=False) for nombre in nombres if nombre in tablas}
+
+
+def tablas_desde_payload(data: dict, nombres: list):
+    """Tablas para un endpoint: del almacén si el body trae `dataset_id`, si no del payload.
+
+    Devuelve None si el `dataset_id` no existe o expiró.
+    """
+    dataset_id = data.get("dataset_id")
+    if dataset_id:
+        tablas = obtener_dataset(dataset_id, nombres)
+        if tablas is None:
+            return None
+        return {nombre: tablas.get(nombre, pd.DataFrame()) for nombre in nombres}
+    return {nombre: pd.DataFrame(data.get(nombre, [])) for nombre in nombres}
+
+
+def cantidad_datasets() -> int:
+    """Datasets guardados en este momento (sin contar los vencidos)."""
+    with _lock:
+        _expirar(time.time())
+        return len(_datasets)
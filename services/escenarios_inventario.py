@@ -0,0 +1,162 @@
+import os
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from services.evaluar_compra_sku import MESES_SIMULADOS, reposiciones_por_mes
+from services.inventory_managment import (
+    FACTOR_SERVICIO, LEAD_TIME, MESES_EOQ,
+    demanda_mensual_proyectada, desviacion_mensual_reciente, primer_valor_por_sku,
+)
+from services.metricas import medido, tramo
+
+# Parámetros de un escenario y su valor por defecto (los de /gestion_inventario)
+PARAMETROS_ESCENARIO = {
+    "lead_time": LEAD_TIME,
+    "factor_servicio": FACTOR_SERVICIO,
+    "meses_eoq": MESES_EOQ,
+    "horizonte": MESES_SIMULADOS,
+}
+MAX_ESCENARIOS = int(os.getenv("PLANITY_ESCENARIOS_MAX", "1000"))
+MAX_HORIZONTE = 36
+# Celdas (escenario × SKU) evaluadas a la vez: acota la memoria con catálogos grandes
+CELDAS_POR_BLOQUE = int(os.getenv("PLANITY_ESCENARIOS_BLOQUE", "2000000"))
+
+
+def normalizar_escenarios(escenarios=None, grilla=None) -> list:
+    """Lista de escenarios completos a partir de una lista explícita y/o una grilla.
+
+    `grilla` es {parametro: [valores]} y se expande como producto cartesiano;
+    los parámetros que falten toman el valor por defecto. Sin escenarios ni
+    grilla se evalúa solo el escenario por defecto.
+    """
+    lista = list(escenarios or [])
+    if grilla:
+        if not isinstance(grilla, dict):
+            raise ValueError("❌ 'grilla' debe ser un objeto {parametro: [valores]}")
+        nombres = list(grilla)
+        valores = [v if isinstance(v, list) else [v] for v in grilla.values()]
+        lista += [dict(zip(nombres, combinacion)) for combinacion in itertools.product(*valores)]
+    if not lista:
+        lista = [{}]
+    if len(lista) > MAX_ESCENARIOS:
+        raise ValueError(f"❌ Demasiados escenarios: {len(lista)} (máximo {MAX_ESCENARIOS})")
+
+    normalizados = []
+    for i, escenario in enumerate(lista):
+        if not isinstance(escenario, dict):
+            raise ValueError(f"❌ El escenario {i} debe ser un objeto")
+        desconocidos = set(escenario) - set(PARAMETROS_ESCENARIO) - {"nombre"}
+        if desconocidos:
+            raise ValueError(f"❌ Parámetros desconocidos en el escenario {i}: {sorted(desconocidos)}")
+        completo = {**PARAMETROS_ESCENARIO, **{k: v for k, v in escenario.items() if k != "nombre"}}
+        for parametro, valor in completo.items():
+            if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not valor >= 0:
+                raise ValueError(f"❌ '{parametro}' del escenario {i} debe ser un número >= 0")
+        if int(completo["horizonte"]) != completo["horizonte"] or not 1 <= completo["horizonte"] <= MAX_HORIZONTE:
+            raise ValueError(f"❌ 'horizonte' del escenario {i} debe ser un entero entre 1 y {MAX_HORIZONTE}")
+        completo["horizonte"] = int(completo["horizonte"])
+        normalizados.append({"nombre": str(escenario.get("nombre", f"escenario_{i}")), **completo})
+    return normalizados
+
+
+def bases_por_sku(df_forecast, df_maestro, df_demanda_limpia, df_stock, fecha_actual) -> pd.DataFrame:
+    """Magnitudes por SKU que no dependen del escenario (como en gestion_inventario_df)."""
+    skus = pd.Index(df_forecast['sku'].dropna().unique())
+    return pd.DataFrame({
+        'stock_actual': primer_valor_por_sku(df_stock, 'stock', skus).astype(float),
+        # Como en la tabla resumen de /gestion_inventario: costo redondeado a céntimos
+        'costo_fabricacion': primer_valor_por_sku(df_maestro, 'costo_fabricacion', skus).astype(float).round(2),
+        'demanda_mensual': demanda_mensual_proyectada(df_forecast, fecha_actual, ordenar=False).reindex(skus, fill_value=0),
+        'politica_demanda_mensual': demanda_mensual_proyectada(df_forecast, fecha_actual).reindex(skus, fill_value=0),
+        'desviacion': desviacion_mensual_reciente(df_demanda_limpia, skus),
+    }, index=skus)
+
+
+def _evaluar_bloque(bases, repos_acumuladas, escenarios) -> dict:
+    """Política y acción de compra de un bloque de escenarios: arrays (escenario × SKU)."""
+    columna = lambda nombre: np.array([e[nombre] for e in escenarios], dtype=float)[:, None]
+    horizonte = np.array([e["horizonte"] for e in escenarios])
+    inicial = bases['stock_actual'].to_numpy(dtype=float)[None, :]
+    demanda = bases['demanda_mensual'].to_numpy(dtype=float)[None, :]
+    politica = bases['politica_demanda_mensual'].to_numpy(dtype=float)[None, :]
+
+    safety_stock = np.round(bases['desviacion'].to_numpy()[None, :] * columna("factor_servicio"))
+    rop_original = politica * columna("lead_time")
+    eoq = np.round(politica * columna("meses_eoq"))
+
+    # Simulación de evaluar_compra_lote: stock inicial + reposiciones - demanda mes a mes
+    en_camino = repos_acumuladas[:, horizonte - 1].T
+    stock_final = inicial + en_camino - demanda * horizonte[:, None]
+    con_repos = en_camino > 0
+    umbral = np.where(con_repos, safety_stock, demanda * horizonte[:, None] + safety_stock)
+    comprar = np.where(con_repos, stock_final, inicial) < umbral
+
+    return {
+        "safety_stock": safety_stock, "rop_original": rop_original, "rop": rop_original + safety_stock,
+        "eoq": eoq, "stock_final_simulado": np.rint(stock_final), "comprar": comprar,
+    }
+
+
+def _detalle(skus, bloque, fila, filtro) -> list:
+    comprar = bloque["comprar"][fila][filtro]
+    eoq = bloque["eoq"][fila][filtro]
+    return [
+        {
+            "sku": sku, "safety_stock": int(ss), "rop_original": float(rop_original), "rop": float(rop),
+            "eoq": int(e), "stock_final_simulado": int(final),
+            "accion": "Comprar" if c else "No comprar", "unidades_sugeridas": int(e) if c else 0,
+        }
+        for sku, ss, rop_original, rop, e, final, c in zip(
+            skus[filtro], bloque["safety_stock"][fila][filtro], bloque["rop_original"][fila][filtro],
+            bloque["rop"][fila][filtro], eoq, bloque["stock_final_simulado"][fila][filtro], comprar,
+        )
+    ]
+
+
+@medido("escenarios")
+def evaluar_escenarios(df_forecast, df_maestro, df_demanda_limpia, df_stock, df_repos, escenarios,
+                       fecha_actual=None, detalle=False, skus_detalle=None) -> list:
+    """KPIs de compra de cada escenario (lead time, factor de servicio, meses de EOQ, horizonte).
+
+    Todas las combinaciones se evalúan a la vez como matrices (escenario ×
+    SKU). Con los parámetros por defecto los KPIs coinciden con los de
+    /gestion_inventario. El lead time solo cambia el ROP del detalle: la
+    acción de compra depende del safety stock, el EOQ y el horizonte.
+    Con `detalle` se añade por escenario el detalle por SKU (solo de
+    `skus_detalle` si se indica).
+    """
+    if fecha_actual is None:
+        fecha_actual = pd.to_datetime("today").replace(day=1)
+    bases = bases_por_sku(df_forecast, df_maestro, df_demanda_limpia, df_stock, fecha_actual)
+    skus = bases.index
+    costo = bases['costo_fabricacion'].to_numpy(dtype=float)
+    filtro = np.ones(len(skus), dtype=bool) if skus_detalle is None else skus.isin(skus_detalle)
+
+    horizonte_max = max(e["horizonte"] for e in escenarios)
+    repos_acumuladas = np.cumsum(reposiciones_por_mes(df_repos, skus, fecha_actual, horizonte_max), axis=1)
+
+    resultados = []
+    paso = max(1, CELDAS_POR_BLOQUE // max(len(skus), 1))
+    with tramo("escenarios.evaluacion", len(escenarios) * len(skus), log=False):
+        for inicio in range(0, len(escenarios), paso):
+            lote = escenarios[inicio:inicio + paso]
+            bloque = _evaluar_bloque(bases, repos_acumuladas, lote)
+            unidades = np.where(bloque["comprar"], bloque["eoq"], 0)
+            total_skus = bloque["comprar"].sum(axis=1)
+            total_unidades = unidades.sum(axis=1)
+            total_costo = unidades @ costo
+            for fila, escenario in enumerate(lote):
+                resultado = {
+                    "escenario": escenario,
+                    "kpis": {
+                        "total_skus": int(total_skus[fila]),
+                        "total_unidades": int(total_unidades[fila]),
+                        "total_costo": float(total_costo[fila]),
+                    },
+                }
+                if detalle:
+                    resultado["detalle"] = _detalle(skus, bloque, fila, filtro)
+                resultados.append(resultado)
+    return resultados
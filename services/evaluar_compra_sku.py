@@ -1,6 +1,11 @@
 import pandas as pd
+import numpy as np
 from dateutil.relativedelta import relativedelta
 
+from services.series import codificar_skus, ordinal_mes, series_por_sku
+
+MESES_SIMULADOS = 5
+
 def evaluar_compra_sku(
     sku: str,
     stock_inicial: int,
@@ -10,7 +15,7 @@ def evaluar_compra_sku(
     eoq: float,
     df_repos: pd.DataFrame = None
 ):
-    meses_simulados = 5
+    meses_simulados = MESES_SIMULADOS
     stock = float(stock_inicial)
 
     repos_por_mes = {i: 0 for i in range(meses_simulados)}
@@ -53,3 +58,62 @@ def evaluar_compra_sku(
     }
 
 
+def reposiciones_compactas(df_repos, skus) -> tuple:
+    """(código de SKU en `skus`, mes ordinal, cantidad) de cada reposición; None si no hay tabla."""
+    if df_repos is None or df_repos.empty or 'sku' not in df_repos.columns:
+        return None
+    cantidad = pd.to_numeric(df_repos['cantidad'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    return codificar_skus(df_repos['sku'], pd.Index(skus))[0], ordinal_mes(df_repos['fecha']), cantidad
+
+
+def reposiciones_por_mes(df_repos, skus, fecha_actual, meses_simulados=MESES_SIMULADOS, compactas=None):
+    """Matriz (sku × mes simulado) con las reposiciones de cada mes desde fecha_actual.
+
+    `compactas` son las reposiciones ya codificadas (reposiciones_compactas);
+    si se pasan no se vuelve a leer `df_repos`.
+    """
+    repos = np.zeros((len(skus), meses_simulados))
+    if compactas is None:
+        compactas = reposiciones_compactas(df_repos, skus)
+    if compactas is None:
+        return repos
+
+    # Columnas: meses ordinales desde el actual (NaT y meses fuera de rango se descartan)
+    codigos, ordinales, cantidad = compactas
+    actual = ordinal_mes([fecha_actual])[0]
+    serie = series_por_sku(
+        codigos, ordinales, cantidad, pd.Index(skus), np.arange(actual, actual + meses_simulados), dtype=float,
+    )
+    return serie.valores
+
+
+def evaluar_compra_lote(stock_inicial, fecha_actual, demanda_mensual, safety_stock, eoq, df_repos=None,
+                        compactas=None):
+    """Versión en lote de evaluar_compra_sku: un valor por SKU en cada array.
+
+    `stock_inicial`, `demanda_mensual`, `safety_stock` y `eoq` son Series
+    indexadas por SKU; las reposiciones salen de `df_repos` o de
+    `compactas`. Devuelve un DataFrame con accion, sugerido,
+    stock_final_simulado y umbral.
+    """
+    skus = stock_inicial.index
+    repos = reposiciones_por_mes(df_repos, skus, fecha_actual, compactas=compactas)
+    demanda = demanda_mensual.to_numpy(dtype=float)
+    inicial = stock_inicial.to_numpy(dtype=float)
+
+    stock = inicial.copy()
+    for i in range(repos.shape[1]):
+        stock = stock + repos[:, i]
+        stock = stock - demanda
+
+    en_camino = repos.sum(axis=1) > 0
+    umbral = np.where(en_camino, safety_stock.to_numpy(dtype=float), demanda * repos.shape[1] + safety_stock.to_numpy())
+    comparar_con = np.where(en_camino, stock, inicial)
+    comprar = comparar_con < umbral
+
+    return pd.DataFrame({
+        'accion': np.where(comprar, 'Comprar', 'No comprar'),
+        'sugerido': np.where(comprar, np.rint(eoq.to_numpy(dtype=float)), 0).astype(int),
+        'stock_final_simulado': np.rint(stock).astype(int),
+        'umbral': umbral,
+    }, index=skus)
@@ -0,0 +1,92 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Modos de ejecución disponibles para el trabajo por bloques de SKUs
+MODOS = ("serial", "hilos", "procesos")
+
+# Configuración por defecto, sobrescribible por variables de entorno.
+# El servidor web corre con hilos (threadpool, trabajos, perfilador): los
+# procesos son opt-in y nunca se crean con fork.
+MODO_DEFECTO = os.getenv("PLANITY_EJECUTOR", "serial")
+WORKERS_DEFECTO = int(os.getenv("PLANITY_WORKERS", "0")) or os.cpu_count() or 1
+BLOQUE_DEFECTO = int(os.getenv("PLANITY_BLOQUE", "0")) or None
+INICIO_PROCESOS = os.getenv(
+    "PLANITY_INICIO_PROCESOS",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def _obtener_pool(modo: str, workers: int):
+    """Reutiliza un pool por (modo, workers) para no pagar el arranque en cada request."""
+    clave = (modo, workers)
+    with _lock:
+        if clave not in _pools:
+            if modo == "hilos":
+                _pools[clave] = ThreadPoolExecutor(max_workers=workers)
+            else:
+                contexto = multiprocessing.get_context(INICIO_PROCESOS)
+                _pools[clave] = ProcessPoolExecutor(max_workers=workers, mp_context=contexto)
+        return _pools[clave]
+
+
+def _descartar_pool(modo: str, workers: int, pool) -> None:
+    """Saca del caché un pool roto (si sigue siendo el guardado) y lo cierra."""
+    with _lock:
+        if _pools.get((modo, workers)) is pool:
+            del _pools[(modo, workers)]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def cerrar_pools() -> None:
+    """Cierra todos los pools (al apagar el servidor)."""
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def dividir_en_bloques(n: int, tamano_bloque: int) -> list:
+    """Slices contiguos [0, n) de a lo sumo `tamano_bloque` elementos."""
+    tamano_bloque = max(1, int(tamano_bloque))
+    return [slice(inicio, min(inicio + tamano_bloque, n)) for inicio in range(0, n, tamano_bloque)]
+
+
+def resolver_ejecucion(ejecucion: dict = None, bloque_defecto: int = 256) -> dict:
+    """Completa la configuración {"modo", "workers", "bloque"} con los valores por defecto."""
+    ejecucion = dict(ejecucion or {})
+    modo = ejecucion.get("modo") or MODO_DEFECTO
+    if modo not in MODOS:
+        raise ValueError(f"❌ Modo de ejecución desconocido: {modo}. Opciones: {MODOS}")
+    return {
+        "modo": modo,
+        "workers": int(ejecucion.get("workers") or WORKERS_DEFECTO),
+        "bloque": int(ejecucion.get("bloque") or BLOQUE_DEFECTO or bloque_defecto),
+    }
+
+
+def ejecutar_en_bloques(funcion, tareas: list, modo: str = "serial", workers: int = 1) -> list:
+    """Aplica `funcion(*tarea)` a cada tarea y devuelve los resultados en el orden de entrada.
+
+    En modo "procesos" la función debe ser de nivel de módulo y las tareas
+    deberían ser arrays de NumPy (se serializan de forma compacta). Con una
+    sola tarea o un único worker se ejecuta en línea. Si un worker muere, el
+    pool roto se descarta y las tareas se reintentan una vez en un pool nuevo.
+    """
+    if modo == "serial" or workers <= 1 or len(tareas) <= 1:
+        return [funcion(*tarea) for tarea in tareas]
+    for intento in range(2):
+        pool = _obtener_pool(modo, workers)
+        try:
+            return list(pool.map(funcion, *zip(*tareas)))
+        except BrokenProcessPool:
+            print("⚠️ Pool de procesos roto: se descarta y se crea uno nuevo")
+            _descartar_pool(modo, workers, pool)
+            if intento:
+                raise
@@ -1,14 +1,44 @@
+import os
+import hashlib
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.holtwinters import SimpleExpSmoothing
+
+from services import cache_forecast
+from services.executor import dividir_en_bloques, ejecutar_en_bloques, resolver_ejecucion
+from services.metricas import medido, tramo
+from services.series import ORDINAL_NULO, codificar_skus, inicio_de_mes, ordinal_mes, series_por_sku
+from services.suavizado import matriz_rellena, ajustar_ses, valores_ajustados
+
+# Backend del SES: "statsmodels" (un ajuste por SKU) o "numpy" (ajuste en lote)
+BACKENDS_FORECAST = ("statsmodels", "numpy")
+BACKEND_FORECAST = os.getenv("PLANITY_FORECAST_BACKEND", "statsmodels")
+# Predicción de los SKUs con SES: "legado" reproduce el motor original y
+# "modelo" usa siempre la predicción a un paso del SES ajustado. El original
+# llamaba a modelo.forecast(1)[0] con la serie indexada por fecha: con meses
+# consecutivos statsmodels infiere la frecuencia MS y, con pandas < 3, el [0]
+# cae a la posición y devuelve la predicción del SES; con meses faltantes (sin
+# frecuencia) o con pandas 3 (el [0] es solo por etiqueta) lanzaba KeyError y
+# caía a la media de los últimos 4 meses.
+PREDICCIONES_SES = ("legado", "modelo")
+PREDICCION_SES = os.getenv("PLANITY_PREDICCION_SES", "legado")
+SES_POSICIONAL = int(pd.__version__.split(".")[0]) < 3
+# Versión de las entradas de caché: cambiarla invalida los ajustes guardados
+VERSION_CACHE = 1
 
 def forecast_promedio_movil(serie, ventana=4):
     forecast = serie.rolling(window=ventana, min_periods=1).mean()
     return forecast, None
 
+def precargar_backends():
+    """Importa statsmodels, que tarda segundos: se importa en el primer SES o aquí, en segundo plano al arrancar."""
+    from statsmodels.tsa.holtwinters import SimpleExpSmoothing  # noqa: F401
+
 def forecast_ses(serie):
-    model = SimpleExpSmoothing(serie, initialization_method="estimated").fit()
-    return model.fittedvalues, model
+    from statsmodels.tsa.holtwinters import SimpleExpSmoothing
+    # Se ajusta sobre los valores: con un índice de fechas sin frecuencia
+    # (meses faltantes) statsmodels no puede predecir fuera de la muestra
+    model = SimpleExpSmoothing(np.asarray(serie, dtype=float), initialization_method="estimated").fit()
+    return pd.Series(model.fittedvalues, index=serie.index), model
 
 def safe_forecast(serie, metodo_forecast):
     try:
@@ -20,73 +50,256 @@ def safe_forecast(serie, metodo_forecast):
             pred = forecast_serie.iloc[-1] if len(forecast_serie) > 0 else serie.tail(4).mean()
     except:
         pred = serie.tail(4).mean()
+    return sanear_prediccion(pred, serie)
+
+def sanear_prediccion(pred, serie):
     if pd.isna(pred) or np.isinf(pred) or pred < 0:
         pred = serie.tail(3).mean()
     if pd.isna(pred) or np.isinf(pred) or pred < 0:
         pred = 0
     return round(pred)
 
-def forecast_engine(df):
-    df = df.dropna(subset=["fecha", "sku", "demanda"])  # evita NaNs
-    df['fecha'] = pd.to_datetime(df['fecha'])
-    df['mes'] = df['fecha'].dt.to_period('M')
-    df_mensual = df.groupby(['sku', 'mes']).agg({
-        'demanda': 'sum',
-        'demanda_sin_outlier': 'sum'
-    }).reset_index()
-    df_mensual.rename(columns={'demanda_sin_outlier': 'demanda_limpia'}, inplace=True)
-    df_mensual['mes'] = df_mensual['mes'].dt.to_timestamp()
+def _forecast_sku(sku, meses, demanda, demanda_limpia, pred=None):
+    """Filas históricas y de proyección de un SKU a partir de sus arrays mensuales.
+
+    `pred` permite pasar una predicción ya calculada (p. ej. el SES en lote).
+    """
+    valid = demanda_limpia > 0
+    if valid.sum() < 2:
+        return []
+    meses_valid = meses[valid]
+    serie = pd.Series(demanda_limpia[valid], index=pd.DatetimeIndex(meses_valid, name='mes'), name='demanda_limpia')
+
+    # Selección simple según historia
+    if len(serie) < 6:
+        metodo_nombre = 'promedio_movil'
+        metodo_forecast = lambda s: forecast_promedio_movil(s, 4)
+    else:
+        metodo_nombre = 'ses'
+        metodo_forecast = forecast_ses
 
     resultados = []
-    for sku in df_mensual['sku'].unique():
-        df_sku = df_mensual[df_mensual['sku'] == sku].copy()
-        df_valid = df_sku[df_sku['demanda_limpia'] > 0]
-        if len(df_valid) < 2:
-            continue
-        serie = df_valid.set_index('mes')['demanda_limpia']
-
-        # Selección simple según historia
-        if len(serie) < 6:
-            metodo_nombre = 'promedio_movil'
-            metodo_forecast = lambda s: forecast_promedio_movil(s, 4)
-        else:
-            metodo_nombre = 'ses'
-            metodo_forecast = forecast_ses
-
-        for _, row in df_sku.iterrows():
-            resultados.append({
-                'sku': sku,
-                'mes': row['mes'],
-                'demanda': row['demanda'],
-                'demanda_limpia': row['demanda_limpia'],
-                'forecast': np.nan,
-                'forecast_up': np.nan,
-                'tipo_mes': 'histórico',
-                'metodo_forecast': metodo_nombre
-            })
-
-        # Proyección de próximos 6 meses
-        last_month = df_valid['mes'].max()
-        forecast_horizon = pd.date_range(start=last_month + pd.DateOffset(months=1), periods=6, freq='MS')
-        std_dev = df_valid['demanda_limpia'].tail(4).std()
-
-        for mes in forecast_horizon:
-            serie_corte = df_valid[df_valid['mes'] <= mes - pd.DateOffset(months=1)]
-            if len(serie_corte) < 2:
-                continue
-            serie_val = serie_corte.set_index('mes')['demanda_limpia']
-            pred = safe_forecast(serie_val, metodo_forecast)
-            forecast_up = round(pred + std_dev) if pd.notnull(std_dev) else round(pred)
-            resultados.append({
-                'sku': sku,
-                'mes': mes,
-                'demanda': np.nan,
-                'demanda_limpia': np.nan,
-                'forecast': pred,
-                'forecast_up': forecast_up,
-                'tipo_mes': 'proyección',
-                'metodo_forecast': metodo_nombre
-            })
+    for i in range(len(meses)):
+        resultados.append({
+            'sku': sku,
+            'mes': pd.Timestamp(meses[i]),
+            'demanda': demanda[i],
+            'demanda_limpia': demanda_limpia[i],
+            'forecast': np.nan,
+            'forecast_up': np.nan,
+            'tipo_mes': 'histórico',
+            'metodo_forecast': metodo_nombre
+        })
+
+    # Proyección de próximos 6 meses: todos los meses del horizonte son
+    # posteriores al último mes real, así que el corte siempre es la serie
+    # completa y basta con un único ajuste
+    last_month = serie.index.max()
+    forecast_horizon = pd.date_range(start=last_month + pd.DateOffset(months=1), periods=6, freq='MS')
+    std_dev = serie.tail(4).std()
+    if pred is None:
+        pred = safe_forecast(serie, metodo_forecast)
+
+    for mes in forecast_horizon:
+        forecast_up = round(pred + std_dev) if pd.notnull(std_dev) else round(pred)
+        resultados.append({
+            'sku': sku,
+            'mes': mes,
+            'demanda': np.nan,
+            'demanda_limpia': np.nan,
+            'forecast': pred,
+            'forecast_up': forecast_up,
+            'tipo_mes': 'proyección',
+            'metodo_forecast': metodo_nombre
+        })
+    return resultados
+
+def huella_serie(valores):
+    """Huella estable (entre procesos) de una serie mensual de demanda limpia."""
+    return hashlib.blake2b(np.asarray(valores, dtype=float).tobytes(), digest_size=8).hexdigest()
+
+def ajustar_ses_lote(series, backend="statsmodels"):
+    """Ajusta SES para varias series y devuelve arrays (alpha, l0, pred a un paso).
+
+    Con "statsmodels" se ajusta un modelo por serie; si falla, alpha/l0 quedan
+    en NaN y la predicción cae a la media de los últimos 4 meses, igual que
+    safe_forecast. Con "numpy" se ajustan todas juntas en una matriz rellena.
+    """
+    if backend == "numpy":
+        y, longitudes = matriz_rellena([np.asarray(s, dtype=float) for s in series])
+        alpha, l0 = ajustar_ses(y, longitudes)
+        _, pred = valores_ajustados(y, longitudes, alpha, l0)
+        return alpha, l0, pred
+
+    alpha, l0, pred = np.full(len(series), np.nan), np.full(len(series), np.nan), np.zeros(len(series))
+    for i, serie in enumerate(series):
+        try:
+            _, modelo = forecast_ses(serie)
+            alpha[i] = modelo.params['smoothing_level']
+            l0[i] = modelo.params['initial_level']
+            pred[i] = modelo.forecast(1)[0]
+        except Exception:
+            pred[i] = serie.tail(4).mean()
+    return alpha, l0, pred
+
+def prediccion_con_modelo(meses_validos, prediccion_ses="legado"):
+    """Si un SKU con SES usa la predicción del modelo (si no, la media de sus últimos 4 meses)."""
+    if prediccion_ses == "modelo":
+        return True
+    ordinales = np.asarray(meses_validos).astype('datetime64[M]').astype(np.int64)
+    return SES_POSICIONAL and bool(np.all(np.diff(ordinales) == 1))
+
+def series_ses(limites, meses, demanda_limpia, prediccion_ses="legado", todas=False):
+    """{j: demanda limpia de los meses > 0} de los SKUs con SES (>= 6 de esos meses) que hay que ajustar.
+
+    Con `todas` se incluyen todos; si no, solo los que usan la predicción del modelo.
+    """
+    ajustar = {}
+    for j in range(len(limites) - 1):
+        fila = slice(limites[j], limites[j + 1])
+        valido = demanda_limpia[fila] > 0
+        if valido.sum() >= 6 and (todas or prediccion_con_modelo(meses[fila][valido], prediccion_ses)):
+            ajustar[j] = demanda_limpia[fila][valido]
+    return ajustar
+
+def clave_cache(valores, backend):
+    """Clave de caché de un ajuste SES: serie mensual válida + método, backend y versión."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"v{VERSION_CACHE}|ses|{backend}|".encode())
+    h.update(np.asarray(valores, dtype=float).tobytes())
+    return h.hexdigest()
+
+def _forecast_bloque(skus, limites, meses, demanda, demanda_limpia, backend="statsmodels", guardados=None,
+                     prediccion_ses="legado", ajustar=True):
+    """Forecast de un bloque de SKUs en formato columnar (limites = offsets por SKU).
+
+    `guardados` = {j: (pred, alpha, l0)} son ajustes SES ya conocidos (caché)
+    que no se vuelven a calcular. Devuelve (filas, ajustes, nuevos) donde
+    ajustes = {(sku, huella): (alpha, l0)} de los SKUs proyectados con SES y
+    nuevos = {clave de caché: (pred, alpha, l0)} de los ajustados aquí. Con
+    `ajustar` se ajustan todos los SES (para devolver sus parámetros); si no,
+    solo los que usan la predicción del modelo (ver prediccion_con_modelo).
+    """
+    guardados = guardados or {}
+    filas = [slice(limites[j], limites[j + 1]) for j in range(len(skus))]
+
+    series = {}
+    for j, fila in enumerate(filas):
+        valido = demanda_limpia[fila] > 0
+        if valido.sum() >= 6:
+            series[j] = (pd.Series(demanda_limpia[fila][valido]), prediccion_con_modelo(meses[fila][valido], prediccion_ses))
+
+    preds, ajustes, nuevos = {}, {}, {}
+    parametros = {j: guardados[j] for j in series if j in guardados}
+    por_ajustar = [j for j, (_, con_modelo) in series.items() if j not in guardados and (ajustar or con_modelo)]
+    if por_ajustar:
+        alpha, l0, pred = ajustar_ses_lote([series[j][0] for j in por_ajustar], backend)
+        for k, j in enumerate(por_ajustar):
+            parametros[j] = (sanear_prediccion(pred[k], series[j][0]), alpha[k], l0[k])
+            nuevos[clave_cache(series[j][0], backend)] = parametros[j]
+    for j, (serie, con_modelo) in series.items():
+        if j in parametros:
+            preds[j], alpha_j, l0_j = parametros[j]
+            if np.isfinite(alpha_j):
+                ajustes[(skus[j], huella_serie(serie))] = (alpha_j, l0_j)
+        if not con_modelo:
+            preds[j] = sanear_prediccion(serie.tail(4).mean(), serie)
+
+    resultados = []
+    for j, (sku, fila) in enumerate(zip(skus, filas)):
+        resultados.extend(_forecast_sku(sku, meses[fila], demanda[fila], demanda_limpia[fila], preds.get(j)))
+    return resultados, ajustes, nuevos
+
+def series_mensuales(df, columnas):
+    """Suma mensual por SKU de `columnas` sobre la representación compacta (sku × mes).
+
+    Devuelve (skus, limites, meses, {columna: sumas}) con una fila por cada
+    (sku, mes) con registros, en el orden de un groupby(['sku', 'mes']): las
+    filas del SKU j van de limites[j] a limites[j + 1].
+    """
+    codigos, catalogo = codificar_skus(df['sku'])
+    ordinales = ordinal_mes(df['fecha'])
+    conocidos = ordinales[ordinales != ORDINAL_NULO]
+    periodos = np.arange(conocidos.min(), conocidos.max() + 1) if len(conocidos) else np.array([], dtype=np.int32)
+
+    valores = [df[columna].to_numpy() for columna in columnas]
+    serie = series_por_sku(codigos, ordinales, np.vstack(valores), catalogo, periodos, dtype=float)
+
+    # Las columnas enteras vuelven a int64, como la suma de un groupby
+    sumas = {}
+    for k, columna in enumerate(columnas):
+        tipo = np.int64 if np.issubdtype(valores[k].dtype, np.integer) else float
+        sumas[columna] = serie.valores[k][serie.presentes].astype(tipo)
+
+    filas, columnas_mes = np.nonzero(serie.presentes)
+    inicios = np.flatnonzero(np.r_[True, filas[1:] != filas[:-1]]) if len(filas) else np.array([], dtype=np.int64)
+    skus = catalogo.to_numpy()[filas[inicios]]
+    limites = np.append(inicios, len(filas))
+    meses = inicio_de_mes(periodos[columnas_mes]).astype('datetime64[ns]')
+    return skus, limites, meses, sumas
+
+@medido("forecast")
+def forecast_engine(df, ejecucion=None, backend=None, ajustes=None, cache=None, prediccion_ses=None):
+    """Forecast mensual a 6 meses por SKU.
+
+    `prediccion_ses` (por defecto PREDICCION_SES) elige la predicción de los
+    SKUs con SES: "legado" mantiene la salida del motor original y "modelo"
+    usa el SES ajustado. En "legado" solo se ajustan los SES cuya predicción
+    es la del modelo, salvo que se pida `ajustes`.
+    Si se pasa `ajustes` (dict), se completa con los parámetros SES de cada
+    SKU para que generar_comparativa_forecasts los reutilice sin reajustar.
+    Con la caché activa (`cache`, por defecto CACHE_ACTIVA) los SKUs cuya
+    serie ya se ajustó toman la predicción y los parámetros guardados y solo
+    se ajustan los nuevos o cambiados.
+    """
+    df = df.dropna(subset=["fecha", "sku", "demanda"])  # evita NaNs
+    with tramo("forecast.series_mensuales", len(df), log=False) as t:
+        skus, limites, meses, sumas = series_mensuales(df, ['demanda', 'demanda_sin_outlier'])
+        t.filas_salida = len(skus)
+    demanda, demanda_limpia = sumas['demanda'], sumas['demanda_sin_outlier']
+
+    backend = backend or BACKEND_FORECAST
+    if backend not in BACKENDS_FORECAST:
+        raise ValueError(f"❌ Backend de forecast desconocido: {backend}. Opciones: {BACKENDS_FORECAST}")
+    prediccion_ses = prediccion_ses or PREDICCION_SES
+    if prediccion_ses not in PREDICCIONES_SES:
+        raise ValueError(f"❌ Predicción SES desconocida: {prediccion_ses}. Opciones: {PREDICCIONES_SES}")
+    ajustar = ajustes is not None
+    a_ajustar = series_ses(limites, meses, demanda_limpia, prediccion_ses, todas=ajustar)
+
+    # La caché cubre exactamente los SES que esta llamada ajustaría
+    usar_cache = cache_forecast.CACHE_ACTIVA if cache is None else cache
+    with tramo("forecast.cache", len(skus), log=False):
+        claves = {j: clave_cache(valores, backend) for j, valores in a_ajustar.items()} if usar_cache else {}
+        en_cache = cache_forecast.buscar(list(claves.values()))
+    # La predicción guardada es la ya saneada (entera), como la de sanear_prediccion
+    guardados = {j: (int(en_cache[c][0]), *en_cache[c][1:]) for j, c in claves.items() if c in en_cache}
+
+    config = resolver_ejecucion(ejecucion, bloque_defecto=64)
+    tareas = []
+    for b in dividir_en_bloques(len(skus), config["bloque"]):
+        fila = slice(limites[b.start], limites[b.stop])
+        tareas.append((
+            skus[b], limites[b.start:b.stop + 1] - limites[b.start],
+            meses[fila], demanda[fila], demanda_limpia[fila], backend,
+            {j - b.start: guardados[j] for j in range(b.start, b.stop) if j in guardados},
+            prediccion_ses, ajustar,
+        ))
+
+    resultados, nuevos = [], {}
+    with tramo("forecast.ajuste", len(a_ajustar) - len(guardados), log=False) as t:
+        for filas, ajustes_bloque, nuevos_bloque in ejecutar_en_bloques(
+            _forecast_bloque, tareas, modo=config["modo"], workers=config["workers"]
+        ):
+            resultados.extend(filas)
+            nuevos.update(nuevos_bloque)
+            if ajustes is not None:
+                ajustes.update(ajustes_bloque)
+        t.filas_salida = len(resultados)
+    if claves:
+        cache_forecast.guardar(nuevos)
+        print(f"🗃️ Caché de forecast: {len(guardados)} aciertos, {len(claves) - len(guardados)} fallos "
+              f"(SKUs con SES de {len(skus)})", flush=True)
 
     df_result = pd.DataFrame(resultados)
     df_result['mes'] = pd.to_datetime(df_result['mes']).dt.strftime('%Y-%m')
@@ -95,41 +308,56 @@ def forecast_engine(df):
     df_result = df_result.fillna(0)
     return df_result
 
-def generar_comparativa_forecasts(df):
-    df['fecha'] = pd.to_datetime(df['fecha'])
-    df['mes'] = df['fecha'].dt.to_period('M')
-    df_mensual = df.groupby(['sku', 'mes']).agg({'demanda_sin_outlier': 'sum'}).reset_index()
-    df_mensual.rename(columns={'demanda_sin_outlier': 'demanda_limpia'}, inplace=True)
-    df_mensual['mes'] = df_mensual['mes'].dt.to_timestamp()
-
-    comparativas = []
-    for sku in df_mensual['sku'].unique():
-        df_sku = df_mensual[df_mensual['sku'] == sku].copy()
-        df_sku = df_sku[df_sku['demanda_limpia'] > 0]
-        if len(df_sku) < 2:
-            continue
-
-        serie = df_sku.set_index('mes')['demanda_limpia']
+def _promedio_movil_matriz(y, ventana=4):
+    """Media móvil (min_periods=1) por fila de una matriz alineada a la izquierda."""
+    acumulada = np.hstack([np.zeros((len(y), 1)), np.cumsum(y, axis=1)])
+    t = np.arange(y.shape[1])
+    desde = np.maximum(0, t + 1 - ventana)
+    return (acumulada[:, t + 1] - acumulada[:, desde]) / (t + 1 - desde)
 
-        prom_movil = forecast_promedio_movil(serie)[0]
-        ses = forecast_ses(serie)[0]
+@medido("comparativa")
+def generar_comparativa_forecasts(df, ajustes=None, backend=None):
+    """Valores ajustados de media móvil y SES para todos los SKUs en una matriz (sku × mes).
 
-        df_temp = pd.DataFrame({
-            'sku': sku,
-            'mes': prom_movil.index,
-            'forecast_promedio_movil': prom_movil.values,
-            'forecast_ses': ses.values,
-            'real': serie.values
-        })
-
-        comparativas.append(df_temp)
+    Reutiliza los ajustes SES de forecast_engine (`ajustes`) cuando la serie
+    coincide; el resto se ajusta en un único lote.
+    """
+    skus, limites, meses, sumas = series_mensuales(df, ['demanda_sin_outlier'])
 
-    if comparativas:
-        df_result = pd.concat(comparativas).reset_index(drop=True)
-        df_result['mes'] = pd.to_datetime(df_result['mes']).dt.strftime('%Y-%m')
-        return df_result
-    else:
+    # Solo meses con demanda limpia > 0, en SKUs con al menos 2 de ellos
+    valido = sumas['demanda_sin_outlier'] > 0
+    sku_fila = np.repeat(np.arange(len(skus)), np.diff(limites))
+    conteo = np.bincount(sku_fila[valido], minlength=len(skus))
+    valido &= conteo[sku_fila] >= 2
+    if not valido.any():
         return pd.DataFrame()
 
+    reales = sumas['demanda_sin_outlier'][valido]
+    longitudes_sku = conteo[conteo >= 2]
+    limites = np.append(0, np.cumsum(longitudes_sku))
+    skus = skus[conteo >= 2]
+    series = [reales[limites[j]:limites[j + 1]] for j in range(len(skus))]
+    y, longitudes = matriz_rellena([np.asarray(serie, dtype=float) for serie in series])
+
+    # Parámetros SES: los de forecast_engine si la serie es la misma, el resto en lote
+    ajustes = ajustes if ajustes is not None else {}
+    claves = [(sku, huella_serie(serie)) for sku, serie in zip(skus, series)]
+    faltantes = [j for j, clave in enumerate(claves) if clave not in ajustes]
+    if faltantes:
+        alpha_f, l0_f, _ = ajustar_ses_lote([pd.Series(series[j]) for j in faltantes], backend or BACKEND_FORECAST)
+        for k, j in enumerate(faltantes):
+            ajustes[claves[j]] = (alpha_f[k], l0_f[k])
+    alpha, l0 = np.array([ajustes[clave] for clave in claves], dtype=float).T
 
+    ses, _ = valores_ajustados(y, longitudes, alpha, l0)
+    prom_movil = _promedio_movil_matriz(y)
+    mascara = np.arange(y.shape[1]) < longitudes[:, None]
 
+    df_result = pd.DataFrame({
+        'sku': np.repeat(skus, longitudes),
+        'mes': np.datetime_as_string(meses[valido].astype('datetime64[M]')),
+        'forecast_promedio_movil': prom_movil[mascara],
+        'forecast_ses': ses[mascara],
+        'real': reales,
+    })
+    return df_result
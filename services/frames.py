@@ -0,0 +1,12 @@
+import pandas as pd
+
+
+def como_frame(datos) -> pd.DataFrame:
+    """DataFrame a partir de registros o de otro DataFrame, sin modificar el original.
+
+    Con un DataFrame se hace una copia superficial (sin copiar los datos):
+    reasignar columnas en el resultado no afecta al frame del llamador.
+    """
+    if isinstance(datos, pd.DataFrame):
+        return datos.copy(deep=False)
+    return pd.DataFrame(datos)
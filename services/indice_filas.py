@@ -0,0 +1,140 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from services.metricas import medido
+
+# Índices guardados (uno por archivo o dataset)
+MAX_INDICES = int(os.getenv("PLANITY_INDICES_MAX", "8"))
+MAX_LIMITE = 10000
+# Bits del día dentro de la clave (sku, fecha): ~2 800 años desde la primera fecha
+_BITS_DIA = 20
+_DIA_NULO = (1 << _BITS_DIA) - 1
+
+_indices = OrderedDict()
+_lock = threading.Lock()
+
+
+@dataclass
+class IndiceFilas:
+    """Tabla ordenada por (sku, fecha) con una clave entera para búsquedas binarias.
+
+    `claves` es código de SKU (posición en `skus`, ordenado) << 20 + días
+    desde `dia_base`; las fechas nulas van al final de cada SKU. Las filas
+    de un SKU en un rango de fechas son un tramo contiguo de `tabla`, que
+    se encuentra con dos searchsorted: O(log n + k).
+    """
+    skus: np.ndarray
+    claves: np.ndarray
+    dia_base: int
+    tabla: pd.DataFrame
+    categorias: pd.Series
+
+    def _dia(self, fecha, nombre: str) -> int:
+        """Días desde `dia_base` (negativo si la fecha es anterior a la primera de la tabla)."""
+        try:
+            dia = pd.Timestamp(fecha).to_datetime64().astype("datetime64[D]").astype(np.int64)
+        except (ValueError, TypeError):
+            raise ValueError(f"❌ '{nombre}' debe ser una fecha (YYYY-MM-DD): {fecha!r}")
+        return int(dia) - self.dia_base
+
+    def codigos(self, skus=None, categorias=None) -> np.ndarray:
+        """Códigos de los SKUs pedidos (búsqueda binaria en `skus`); todos si no se filtra."""
+        codigos = np.arange(len(self.skus))
+        if skus is not None and len(self.skus):
+            buscados = np.asarray([str(sku) for sku in skus])
+            posicion = np.minimum(np.searchsorted(self.skus, buscados), len(self.skus) - 1)
+            codigos = np.unique(posicion[self.skus[posicion] == buscados])
+        if categorias is not None:
+            en_categoria = self.categorias.reindex(self.skus[codigos]).isin(list(categorias)).to_numpy()
+            codigos = codigos[en_categoria]
+        return codigos
+
+    def tramos(self, codigos: np.ndarray, desde=None, hasta=None) -> tuple:
+        """Inicio y fin (exclusivo) en `tabla` de las filas de cada SKU en [desde, hasta]."""
+        base = codigos.astype(np.int64) << _BITS_DIA
+        if desde is None and hasta is None:
+            # Sin rango de fechas se incluyen también las fechas nulas
+            return np.searchsorted(self.claves, base), np.searchsorted(self.claves, base + _DIA_NULO, "right")
+        primero = 0 if desde is None else self._dia(desde, "desde")
+        ultimo = _DIA_NULO - 1 if hasta is None else self._dia(hasta, "hasta")
+        if desde is not None and hasta is not None and primero > ultimo:
+            raise ValueError(f"❌ 'desde' ({desde}) no puede ser posterior a 'hasta' ({hasta})")
+        primero, ultimo = max(primero, 0), min(ultimo, _DIA_NULO - 1)
+        inicios = np.searchsorted(self.claves, base + primero)
+        if ultimo < primero:
+            # Rango fuera de las fechas de la tabla (p. ej. `hasta` anterior a la primera)
+            return inicios, inicios
+        return inicios, np.searchsorted(self.claves, base + ultimo, "right")
+
+    def consultar(self, skus=None, categorias=None, desde=None, hasta=None, offset=0, limite=1000,
+                  columnas=None) -> tuple:
+        """Página [offset, offset + limite) de las filas filtradas y el total de filas del filtro."""
+        if not 0 < limite <= MAX_LIMITE or offset < 0:
+            raise ValueError(f"❌ 'limite' debe estar entre 1 y {MAX_LIMITE} y 'offset' ser >= 0")
+        if columnas is not None:
+            desconocidas = [c for c in columnas if c not in self.tabla.columns]
+            if desconocidas:
+                raise ValueError(f"❌ Columnas desconocidas: {desconocidas}")
+        inicios, fines = self.tramos(self.codigos(skus, categorias), desde, hasta)
+        largos = fines - inicios
+        acumulado = np.concatenate([[0], np.cumsum(largos)])
+        total = int(acumulado[-1])
+
+        # Solo se materializan las posiciones de la página
+        fin_pagina = min(offset + limite, total)
+        desde_tramo = np.searchsorted(acumulado, offset, "right") - 1
+        hasta_tramo = np.searchsorted(acumulado, fin_pagina, "left")
+        posiciones = [
+            np.arange(inicios[i] + max(offset - acumulado[i], 0), inicios[i] + min(fin_pagina - acumulado[i], largos[i]))
+            for i in range(max(desde_tramo, 0), hasta_tramo)
+        ] if fin_pagina > offset else []
+        filas = np.concatenate(posiciones) if posiciones else np.array([], dtype=np.int64)
+        pagina = self.tabla.iloc[filas]
+        return (pagina if columnas is None else pagina[list(columnas)]), total
+
+
+@medido("indice_filas")
+def construir_indice(df: pd.DataFrame, maestro: pd.DataFrame = None) -> IndiceFilas:
+    """Índice (sku, fecha) de una tabla con columnas sku y fecha; categorías desde el maestro."""
+    fechas = df['fecha'] if pd.api.types.is_datetime64_any_dtype(df['fecha']) else pd.to_datetime(df['fecha'], errors='coerce')
+    dias = fechas.to_numpy().astype("datetime64[D]")
+    nulos = np.isnat(dias)
+    enteros = dias.astype(np.int64)
+    dia_base = int(enteros[~nulos].min()) if (~nulos).any() else 0
+
+    validos = df['sku'].notna().to_numpy()
+    # Los SKUs se buscan como texto: se ordenan como texto (un SKU numérico 10 va antes que 2)
+    codigos, catalogo = pd.factorize(df['sku'].astype(str).where(validos), sort=True)
+    relativo = np.where(nulos, _DIA_NULO, np.clip(enteros - dia_base, 0, _DIA_NULO - 1))
+    claves = (codigos.astype(np.int64) << _BITS_DIA) + relativo
+    orden = np.argsort(claves[validos], kind="stable")
+    filas = np.flatnonzero(validos)[orden]
+
+    if maestro is not None and not maestro.empty and 'categoria' in maestro.columns:
+        maestro = maestro.drop_duplicates('sku', keep='first')
+        categorias = pd.Series(maestro['categoria'].to_numpy(), index=maestro['sku'].astype(str))
+    else:
+        categorias = pd.Series(dtype=object)
+    skus = catalogo.to_numpy(dtype=str)
+    return IndiceFilas(skus, claves[filas], dia_base, df.iloc[filas].reset_index(drop=True), categorias)
+
+
+def obtener_indice(clave, construir) -> IndiceFilas:
+    """Índice guardado bajo `clave` (archivo y su versión, o dataset_id); si no está, se construye."""
+    with _lock:
+        indice = _indices.get(clave)
+        if indice is not None:
+            _indices.move_to_end(clave)
+            return indice
+    indice = construir()
+    with _lock:
+        _indices[clave] = indice
+        _indices.move_to_end(clave)
+        while len(_indices) > MAX_INDICES:
+            _indices.popitem(last=False)
+    return indice
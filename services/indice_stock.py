@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from services.series import ORDINAL_NULO, codificar_skus, ordinal_mes, series_por_sku
+
+
+@dataclass
+class IndiceStock:
+    """Stock total por (sku, mes) con sumas acumuladas a lo largo de los meses.
+
+    Las columnas van de `mes_inicio` al último mes con registros de stock
+    (ordinales de services.series). Cada matriz `acumulado_*` tiene una
+    columna más que los meses: la suma de un rango de meses es una resta de
+    dos lecturas, y los meses fuera del índice cuentan como stock 0 sin
+    registro. `meses` son los meses con algún registro (de cualquier SKU).
+    """
+    skus: pd.Index
+    mes_inicio: int
+    minimo: int
+    meses: np.ndarray
+    acumulado_stock: np.ndarray
+    acumulado_con_minimo: np.ndarray
+    acumulado_sin_stock: np.ndarray
+
+    @property
+    def mes_fin(self) -> int:
+        return self.mes_inicio + self.acumulado_stock.shape[1] - 2
+
+    def _entre(self, acumulado, desde, hasta, filas=None):
+        """Suma de la matriz acumulada en los meses [desde, hasta] (todos los SKUs si filas es None)."""
+        n_meses = acumulado.shape[1] - 1
+        inicio = np.clip(np.asarray(desde, dtype=np.int64) - self.mes_inicio, 0, n_meses)
+        fin = np.maximum(np.clip(np.asarray(hasta, dtype=np.int64) - self.mes_inicio + 1, 0, n_meses), inicio)
+        if filas is None:
+            return acumulado[:, fin] - acumulado[:, inicio]
+        return acumulado[filas, fin] - acumulado[filas, inicio]
+
+    def stock_en(self, meses, filas=None):
+        """Stock de cada mes (0 si no hay registro)."""
+        return self._entre(self.acumulado_stock, meses, meses, filas)
+
+    def stock_entre(self, desde, hasta, filas=None):
+        """Stock sumado de los meses [desde, hasta]."""
+        return self._entre(self.acumulado_stock, desde, hasta, filas)
+
+    def meses_con_minimo(self, desde, hasta, filas=None):
+        """Cantidad de meses de [desde, hasta] con stock >= minimo."""
+        return self._entre(self.acumulado_con_minimo, desde, hasta, filas)
+
+    def obsoletos(self, meses: int = 12) -> np.ndarray:
+        """SKUs con registro de stock en 0 en cada uno de los últimos `meses` meses del índice."""
+        if len(self.meses) == 0:
+            return np.zeros(len(self.skus), dtype=bool)
+        return self._entre(self.acumulado_sin_stock, self.mes_fin - meses + 1, self.mes_fin) == meses
+
+
+def _acumular(matriz: np.ndarray, dtype) -> np.ndarray:
+    acumulado = np.zeros((matriz.shape[0], matriz.shape[1] + 1), dtype=dtype)
+    np.cumsum(matriz, axis=1, out=acumulado[:, 1:])
+    return acumulado
+
+
+def indice_stock(df_stock: pd.DataFrame, skus: pd.Index, minimo: int) -> IndiceStock:
+    """Índice de stock (sku × mes) de los `skus` a partir de registros sku/fecha/stock.
+
+    El rango de meses sale de todos los registros, también los de SKUs fuera
+    de `skus`, así el último mes es el último del archivo de stock.
+    """
+    codigos, _ = codificar_skus(df_stock["sku"], skus)
+    meses = ordinal_mes(df_stock["fecha"])
+    meses_registrados = np.unique(meses[meses != ORDINAL_NULO])
+    periodos = np.arange(meses_registrados[0], meses_registrados[-1] + 1) if len(meses_registrados) else meses_registrados
+
+    serie = series_por_sku(codigos, meses, df_stock["stock"].to_numpy(), skus, periodos, dtype=np.int64)
+    return IndiceStock(
+        skus=skus,
+        mes_inicio=int(periodos[0]) if len(periodos) else 0,
+        minimo=minimo,
+        meses=meses_registrados,
+        acumulado_stock=_acumular(serie.valores, np.int64),
+        acumulado_con_minimo=_acumular(serie.valores >= minimo, np.int32),
+        acumulado_sin_stock=_acumular(serie.presentes & (serie.valores == 0), np.int32),
+    )
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from services.metricas import medido
+
+# Filas por bloque al parsear un CSV subido (acota la memoria del parseo)
+FILAS_POR_BLOQUE_CSV = int(os.getenv("PLANITY_CSV_BLOQUE", "200000"))
+
+# Columnas requeridas de cada archivo y cómo se tipan al leerlas
+ESQUEMAS = {
+    "demanda": {"sku": "categoria", "fecha": "fecha", "demanda": "numero"},
+    "stock": {"sku": "categoria", "fecha": "fecha", "stock": "numero"},
+}
+VALORES_INVALIDOS = ["N/A", "n/a", "undefined", ""]
+
+
+def normalizar_columna(nombre: str) -> str:
+    return str(nombre).replace("﻿", "").strip().lower()
+
+
+def leer_encabezado(archivo) -> dict:
+    """{nombre original: nombre normalizado} de las columnas del CSV (solo lee la cabecera)."""
+    archivo.seek(0)
+    columnas = pd.read_csv(archivo, nrows=0, encoding="utf-8-sig").columns
+    archivo.seek(0)
+    return {c: normalizar_columna(c) for c in columnas}
+
+
+def validar_columnas(encabezado: dict, esquema: dict, nombre: str):
+    faltantes = [c for c in esquema if c not in encabezado.values()]
+    if faltantes:
+        raise ValueError(f"❌ Faltan columnas {faltantes} en {nombre}. Columnas actuales: {list(encabezado.values())}")
+
+
+def _tipar_bloque(bloque: pd.DataFrame, esquema: dict) -> pd.DataFrame:
+    for columna, tipo in esquema.items():
+        if tipo == "fecha":
+            bloque[columna] = pd.to_datetime(bloque[columna])
+        elif tipo == "numero":
+            bloque[columna] = pd.to_numeric(bloque[columna], errors="coerce").fillna(0)
+    return bloque
+
+
+def _unir_bloques(bloques: list, esquema: dict) -> pd.DataFrame:
+    """Concatena los bloques; los categóricos se unen con categorías ordenadas."""
+    datos = {}
+    for columna, tipo in esquema.items():
+        if tipo == "categoria":
+            datos[columna] = union_categoricals([b[columna] for b in bloques], sort_categories=True)
+        else:
+            datos[columna] = np.concatenate([b[columna].to_numpy() for b in bloques])
+    return pd.DataFrame(datos)
+
+
+@medido("ingesta")
+def leer_csv_subido(archivo, tipo: str, filas_por_bloque: int = None) -> pd.DataFrame:
+    """Parsea un CSV subido (archivo binario con seek) por bloques con tipos explícitos.
+
+    Valida la cabecera antes de leer el cuerpo, lee solo las columnas del
+    esquema y guarda cada bloque ya tipado (sku categórico, fecha datetime64,
+    cantidades numéricas con los inválidos en 0), así la memoria depende de
+    las columnas compactas y no del texto completo del archivo.
+    """
+    esquema = ESQUEMAS[tipo]
+    encabezado = leer_encabezado(archivo)
+    validar_columnas(encabezado, esquema, tipo)
+
+    originales = {n: o for o, n in encabezado.items() if n in esquema}
+    dtype = {originales[c]: ("category" if t == "categoria" else str) for c, t in esquema.items()}
+    lector = pd.read_csv(
+        archivo,
+        encoding="utf-8-sig",
+        usecols=list(originales.values()),
+        dtype=dtype,
+        na_values=VALORES_INVALIDOS,
+        keep_default_na=True,
+        chunksize=filas_por_bloque or FILAS_POR_BLOQUE_CSV,
+    )
+    bloques = []
+    for bloque in lector:
+        bloque = bloque.rename(columns={o: n for n, o in originales.items()})
+        bloques.append(_tipar_bloque(bloque, esquema))
+    if not bloques:
+        return pd.DataFrame({c: pd.Series(dtype=object) for c in esquema})
+    return _unir_bloques(bloques, esquema)
@@ -1,6 +1,27 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
 import pandas as pd
+import numpy as np
 from datetime import datetime
 
+from services.evaluar_compra_sku import evaluar_compra_lote, reposiciones_compactas
+from services.metricas import medido, tramo
+from services.series import ORDINAL_NULO, codificar_skus, ordinal_mes, series_por_sku
+
+# Parámetros de la política de inventario
+LEAD_TIME = 5
+FACTOR_SERVICIO = 1.65
+MESES_EOQ = 3
+
+# Bases por SKU guardadas (una por dataset_id)
+MAX_BASES = int(os.getenv("PLANITY_INVENTARIO_BASES_MAX", "8"))
+
+_bases = OrderedDict()
+_lock = threading.Lock()
+
 def calcular_politicas_inventario(df_forecast, sku, unidades_en_camino, df_maestro, df_demanda_limpia):
     fecha_actual = pd.to_datetime("today").replace(day=1)
 
@@ -24,11 +45,11 @@ def calcular_politicas_inventario(df_forecast, sku, unidades_en_camino, df_maest
     if pd.isna(desviacion_estandar):
         desviacion_estandar = 0
 
-    safety_stock = round(desviacion_estandar * 1.65)
-    lead_time = 5
+    safety_stock = round(desviacion_estandar * FACTOR_SERVICIO)
+    lead_time = LEAD_TIME
     rop_original = demanda_mensual * lead_time
     rop = rop_original + safety_stock
-    eoq = demanda_mensual * 3
+    eoq = demanda_mensual * MESES_EOQ
 
     return {
         "demanda_mensual": demanda_mensual,
@@ -38,3 +59,289 @@ def calcular_politicas_inventario(df_forecast, sku, unidades_en_camino, df_maest
         "eoq": eoq
     }
 
+
+def _media_primeros_meses(codigos, meses, forecast, n_skus, fecha_actual, ordenar=True) -> np.ndarray:
+    """Media redondeada de las primeras 4 proyecciones desde fecha_actual de cada código (0 si no hay).
+
+    `codigos`, `meses` (datetime64) y `forecast` son las filas de proyección
+    en el orden del frame; con ordenar=True se toman por mes.
+    """
+    desde = meses >= pd.Timestamp(fecha_actual).to_datetime64()
+    codigos, meses, forecast = codigos[desde], meses[desde], forecast[desde]
+    if ordenar:
+        orden = np.argsort(meses, kind='stable')
+        codigos, forecast = codigos[orden], forecast[orden]
+
+    # Primeras 4 filas de cada SKU (por código, en el orden dado)
+    orden = np.argsort(codigos, kind='stable')
+    ordenados = codigos[orden]
+    posicion = np.arange(len(orden)) - np.searchsorted(ordenados, ordenados)
+    primeras = orden[(posicion < 4) & (ordenados >= 0)]
+
+    forecast = forecast[primeras]
+    conocido = ~np.isnan(forecast)
+    sumas = np.bincount(codigos[primeras], weights=np.where(conocido, forecast, 0), minlength=n_skus)
+    conteo = np.bincount(codigos[primeras], weights=conocido, minlength=n_skus)
+    return np.where(conteo > 0, np.round(sumas / np.maximum(conteo, 1), 0), 0).astype(int)
+
+
+def demanda_mensual_proyectada(df_forecast, fecha_actual, ordenar=True):
+    """Media redondeada de los primeros 4 meses proyectados desde fecha_actual, por SKU.
+
+    `df_forecast['mes']` debe venir ya parseado. Con ordenar=False se toman
+    los 4 primeros en el orden del frame (como hace /gestion_inventario).
+    """
+    proy = df_forecast[df_forecast['tipo_mes'] == 'proyección']
+    codigos, catalogo = codificar_skus(proy['sku'])
+    medias = _media_primeros_meses(
+        codigos, np.asarray(proy['mes'], dtype='datetime64[ns]'),
+        pd.to_numeric(proy['forecast'], errors='coerce').to_numpy(dtype=float), len(catalogo), fecha_actual, ordenar,
+    )
+    return pd.Series(medias, index=catalogo)
+
+
+def desviacion_mensual_reciente(df_demanda_limpia, skus, meses=12):
+    """Desviación estándar de los últimos `meses` meses con demanda limpia > 0, por SKU.
+
+    Agrega sobre las series compactas (sku × mes ordinal) en lugar de
+    agrupar por Period; 0 si el SKU tiene menos de 2 meses.
+    """
+    desviacion = np.zeros(len(skus))
+    if not {'sku', 'fecha', 'demanda_sin_outlier'} <= set(df_demanda_limpia.columns):
+        return pd.Series(desviacion, index=skus)
+
+    valores = pd.to_numeric(df_demanda_limpia['demanda_sin_outlier'], errors='coerce').to_numpy(dtype=float)
+    codigos, _ = codificar_skus(df_demanda_limpia['sku'], skus)
+    mes = ordinal_mes(df_demanda_limpia['fecha'])
+    validos = (valores > 0) & (codigos >= 0) & (mes != ORDINAL_NULO)
+    if not validos.any():
+        return pd.Series(desviacion, index=skus)
+
+    mes = mes[validos]
+    serie = series_por_sku(codigos[validos], mes, valores[validos], skus, np.arange(mes.min(), mes.max() + 1), dtype=float)
+    sumas, presentes = serie.valores, serie.presentes
+
+    # Últimos `meses` meses presentes de cada SKU
+    desde_el_final = np.cumsum(presentes[:, ::-1], axis=1)[:, ::-1]
+    ultimos = presentes & (desde_el_final <= meses)
+    n = ultimos.sum(axis=1)
+    media = np.where(ultimos, sumas, 0).sum(axis=1) / np.maximum(n, 1)
+    cuadrados = np.where(ultimos, (sumas - media[:, None]) ** 2, 0).sum(axis=1)
+    desviacion = np.where(n >= 2, np.sqrt(cuadrados / np.maximum(n - 1, 1)), 0)
+    return pd.Series(desviacion, index=skus)
+
+
+def _politicas(demanda_mensual: pd.Series, desviacion) -> pd.DataFrame:
+    politicas = pd.DataFrame({'demanda_mensual': demanda_mensual}, index=demanda_mensual.index)
+    politicas['safety_stock'] = np.round(np.asarray(desviacion) * FACTOR_SERVICIO).astype(int)
+    politicas['rop_original'] = politicas['demanda_mensual'] * LEAD_TIME
+    politicas['rop'] = politicas['rop_original'] + politicas['safety_stock']
+    politicas['eoq'] = politicas['demanda_mensual'] * MESES_EOQ
+    return politicas
+
+
+def calcular_politicas_inventario_lote(df_forecast, skus, df_demanda_limpia, fecha_actual=None):
+    """Versión en lote de calcular_politicas_inventario para una lista de SKUs.
+
+    Devuelve un DataFrame indexado por SKU con demanda_mensual, safety_stock,
+    rop_original, rop y eoq.
+    """
+    if fecha_actual is None:
+        fecha_actual = pd.to_datetime("today").replace(day=1)
+    skus = pd.Index(skus)
+    demanda_mensual = demanda_mensual_proyectada(df_forecast, fecha_actual).reindex(skus, fill_value=0)
+    return _politicas(demanda_mensual, desviacion_mensual_reciente(df_demanda_limpia, skus).to_numpy())
+
+
+def primer_valor_por_sku(df, columna, skus):
+    """Valor de `columna` en el primer registro de cada SKU (0 si no existe)."""
+    if df.empty or 'sku' not in df.columns or columna not in df.columns:
+        return pd.Series(0, index=skus)
+    primeros = df.drop_duplicates('sku', keep='first').set_index('sku')[columna]
+    return primeros.reindex(skus, fill_value=0)
+
+
+@dataclass
+class BasesInventario:
+    """Magnitudes por SKU de un dataset que no dependen de la fecha actual.
+
+    `skus` son los del forecast en orden de aparición y cada array tiene un
+    valor por SKU. Las filas de proyección (código, mes, forecast) y las
+    reposiciones (código, mes ordinal, cantidad) quedan como arrays
+    compactos en el orden del frame: con ellos la demanda mensual y las
+    reposiciones de cualquier fecha actual se calculan sin volver a
+    recorrer (ni hashear) las tablas.
+    """
+    skus: pd.Index
+    stock_actual: np.ndarray
+    unidades_en_camino: np.ndarray
+    costo_fabricacion: np.ndarray
+    desviacion: np.ndarray
+    proyeccion: tuple
+    reposiciones: tuple
+
+
+@medido("inventario_bases")
+def construir_bases(df_forecast, df_maestro, df_demanda_limpia, df_stock, df_repos) -> BasesInventario:
+    """Bases por SKU de gestion_inventario_df; acepta meses, fechas y cantidades sin parsear."""
+    skus = pd.Index(df_forecast['sku'].dropna().unique())
+
+    proy = df_forecast[df_forecast['tipo_mes'] == 'proyección']
+    proyeccion = (
+        codificar_skus(proy['sku'], skus)[0],
+        pd.to_datetime(proy['mes'], errors='coerce').to_numpy(dtype='datetime64[ns]'),
+        pd.to_numeric(proy['forecast'], errors='coerce').to_numpy(dtype=float),
+    )
+
+    unidades_en_camino = pd.Series(0.0, index=skus)
+    reposiciones = None
+    if {'sku', 'cantidad'} <= set(df_repos.columns):
+        cantidad = pd.to_numeric(df_repos['cantidad'], errors='coerce').fillna(0)
+        unidades_en_camino = cantidad.groupby(df_repos['sku']).sum().reindex(skus, fill_value=0).astype(float)
+        if 'fecha' in df_repos.columns:
+            fechas = pd.to_datetime(df_repos['fecha'], errors='coerce')
+            reposiciones = reposiciones_compactas(df_repos.assign(fecha=fechas, cantidad=cantidad), skus)
+
+    return BasesInventario(
+        skus,
+        primer_valor_por_sku(df_stock, 'stock', skus).to_numpy(dtype=float),
+        unidades_en_camino.to_numpy(dtype=float),
+        primer_valor_por_sku(df_maestro, 'costo_fabricacion', skus).to_numpy(dtype=float),
+        desviacion_mensual_reciente(df_demanda_limpia, skus).to_numpy(),
+        proyeccion,
+        reposiciones,
+    )
+
+
+def obtener_bases(version, construir) -> BasesInventario:
+    """Bases guardadas bajo `version` (dataset_id); si no están, se construyen."""
+    with _lock:
+        bases = _bases.get(version)
+        if bases is not None:
+            _bases.move_to_end(version)
+            return bases
+    bases = construir()
+    with _lock:
+        _bases[version] = bases
+        _bases.move_to_end(version)
+        while len(_bases) > MAX_BASES:
+            _bases.popitem(last=False)
+    return bases
+
+
+@medido("gestion_inventario")
+def gestion_inventario_df(df_forecast, df_maestro, df_demanda_limpia, df_stock, df_repos, fecha_actual=None,
+                          version=None):
+    """Stock, política y acción de compra de todos los SKUs del forecast, una fila por SKU.
+
+    `demanda_mensual` es la del resumen (sin ordenar por mes) y
+    `politica_demanda_mensual` la usada en la política. Con `version`
+    (dataset_id) las bases por SKU se guardan y las llamadas siguientes
+    sobre el mismo dataset solo calculan lo que depende de fecha_actual.
+    """
+    if fecha_actual is None:
+        fecha_actual = pd.to_datetime(datetime.today()).replace(day=1)
+    construir = lambda: construir_bases(df_forecast, df_maestro, df_demanda_limpia, df_stock, df_repos)
+    bases = obtener_bases(version, construir) if version else construir()
+    skus = bases.skus
+
+    codigos, meses, forecast = bases.proyeccion
+    demanda_mensual = pd.Series(
+        _media_primeros_meses(codigos, meses, forecast, len(skus), fecha_actual, ordenar=False), index=skus
+    )
+    stock_actual = pd.Series(bases.stock_actual, index=skus)
+
+    with tramo("gestion_inventario.politicas", len(skus), log=False):
+        politicas = _politicas(
+            pd.Series(_media_primeros_meses(codigos, meses, forecast, len(skus), fecha_actual), index=skus),
+            bases.desviacion,
+        )
+    with tramo("gestion_inventario.simulacion", len(skus), log=False):
+        resultado = evaluar_compra_lote(
+            stock_actual, fecha_actual, demanda_mensual,
+            politicas["safety_stock"], politicas["eoq"], compactas=bases.reposiciones,
+        )
+
+    return pd.DataFrame({
+        'stock_actual': stock_actual,
+        'unidades_en_camino': bases.unidades_en_camino,
+        'demanda_mensual': demanda_mensual,
+        'stock_final_simulado': resultado['stock_final_simulado'],
+        'accion': resultado['accion'],
+        'costo_fabricacion': bases.costo_fabricacion,
+        'politica_demanda_mensual': politicas['demanda_mensual'],
+        'safety_stock': politicas['safety_stock'],
+        'rop_original': politicas['rop_original'],
+        'rop': politicas['rop'],
+        'eoq': politicas['eoq'],
+    }, index=skus)
+
+
+def gestion_inventario_lote(df_forecast, df_maestro, df_demanda_limpia, df_stock, df_repos, fecha_actual=None,
+                            version=None):
+    """Respuesta de /gestion_inventario (tabla resumen, detalle por SKU y KPIs) a partir de gestion_inventario_df."""
+    df = gestion_inventario_df(df_forecast, df_maestro, df_demanda_limpia, df_stock, df_repos, fecha_actual, version)
+    stock_actual = df['stock_actual'].tolist()
+    unidades_en_camino = df['unidades_en_camino'].tolist()
+    costo_fab = df['costo_fabricacion'].tolist()
+    # Dicts de políticas armados desde listas: to_dict(orient="records") es varias veces más lento
+    politicas = [
+        {"demanda_mensual": dm, "safety_stock": ss, "rop_original": rop_original, "rop": rop, "eoq": eoq}
+        for dm, ss, rop_original, rop, eoq in zip(
+            *(df[c].tolist() for c in ('politica_demanda_mensual', 'safety_stock', 'rop_original', 'rop', 'eoq'))
+        )
+    ]
+
+    costo_redondeado = [round(c, 2) for c in costo_fab]
+    tabla_resumen = [
+        {
+            "SKU": sku,
+            "Demanda Mensual": dm,
+            "Stock Actual": int(stock),
+            "Reposiciones": int(camino),
+            "Stock Proyectado (5M)": stock_final,
+            "ROP": rop_original,
+            "Safety Stock": ss,
+            "EOQ": eoq,
+            "Costo Fabricación (€)": costo,
+            "Acción": accion
+        }
+        for sku, dm, stock, camino, stock_final, rop_original, ss, eoq, costo, accion in zip(
+            df.index.tolist(), df['demanda_mensual'].tolist(), stock_actual, unidades_en_camino,
+            df['stock_final_simulado'].tolist(), df['rop_original'].tolist(),
+            df['safety_stock'].tolist(), df['eoq'].tolist(), costo_redondeado,
+            df['accion'].tolist(),
+        )
+    ]
+
+    detalles_por_sku = {
+        fila["SKU"]: {
+            "stock_actual": stock,
+            "unidades_en_camino": camino,
+            "demanda_mensual": fila["Demanda Mensual"],
+            "politicas": pol,
+            "accion": fila["Acción"],
+            "unidades_sugeridas": pol["eoq"] if fila["Acción"] == "Comprar" else 0,
+            "stock_final_simulado": fila["Stock Proyectado (5M)"],
+            "costo_fabricacion": costo
+        }
+        for fila, stock, camino, pol, costo in zip(
+            tabla_resumen, stock_actual, unidades_en_camino,
+            politicas, costo_fab,
+        )
+    }
+
+    compras = [r for r in tabla_resumen if r["Acción"] == "Comprar"]
+    total_skus = len(compras)
+    total_unidades = sum(r["EOQ"] for r in compras)
+    total_costo = sum(r["EOQ"] * r["Costo Fabricación (€)"] for r in compras)
+
+    return {
+        "tabla_resumen": tabla_resumen,
+        "detalles_por_sku": detalles_por_sku,
+        "kpis": {
+            "total_skus": total_skus,
+            "total_unidades": total_unidades,
+            "total_costo": total_costo
+        }
+    }
@@ -0,0 +1,301 @@
+import os
+import sys
+import time
+import uuid
+import math
+import resource
+import functools
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Configuración, sobrescribible por variables de entorno
+LOG_TRAMOS = os.getenv("PLANITY_METRICAS_LOG", "1") != "0"
+MEMORIA_SIEMPRE = os.getenv("PLANITY_METRICAS_MEMORIA", "0") == "1"
+INTERVALO_PERFIL = float(os.getenv("PLANITY_PERFIL_INTERVALO_MS", "5")) / 1000
+MAX_PERFILES = int(os.getenv("PLANITY_PERFILES_MAX", "20"))
+
+# Límites (segundos / bytes) de los buckets de los histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BUCKETS_BYTES = tuple(2**20 * mb for mb in (1, 4, 16, 64, 256, 1024, 4096))
+
+_AYUDA = {
+    "planity_etapa_segundos": ("histogram", "Duración de cada etapa de servicio (tramos)"),
+    "planity_etapa_filas_total": ("counter", "Filas de entrada y salida procesadas por etapa"),
+    "planity_request_segundos": ("histogram", "Duración de cada request HTTP por ruta"),
+    "planity_requests_total": ("counter", "Requests HTTP por ruta, método y código de estado"),
+    "planity_request_memoria_pico_bytes": ("histogram", "Pico de memoria Python (tracemalloc) durante el request"),
+}
+
+_histogramas = {}
+_contadores = {}
+_valores = {}
+_lock = threading.Lock()
+
+
+def _clave(nombre: str, etiquetas: dict) -> tuple:
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def observar(nombre: str, valor: float, buckets=BUCKETS_SEGUNDOS, **etiquetas):
+    """Agrega una observación al histograma `nombre` con esas etiquetas."""
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        histograma = _histogramas.get(clave)
+        if histograma is None:
+            histograma = _histogramas[clave] = {"buckets": buckets, "cuentas": [0] * len(buckets), "suma": 0.0, "total": 0}
+        for i, limite in enumerate(buckets):
+            if valor <= limite:
+                histograma["cuentas"][i] += 1
+        histograma["suma"] += valor
+        histograma["total"] += 1
+
+
+def incrementar(nombre: str, valor: float = 1, **etiquetas):
+    """Suma `valor` al contador `nombre`."""
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+
+def fijar(nombre: str, valor: float, **etiquetas):
+    """Fija el valor actual del gauge `nombre`."""
+    with _lock:
+        _valores[_clave(nombre, etiquetas)] = valor
+
+
+def registrar_ayuda(nombre: str, tipo: str, ayuda: str):
+    """Tipo y descripción de una métrica para la salida en formato Prometheus."""
+    _AYUDA[nombre] = (tipo, ayuda)
+
+
+def _filas(objeto):
+    if isinstance(objeto, (pd.DataFrame, list)):
+        return len(objeto)
+    return None
+
+
+# --- Perfilador por muestreo: se activa por request y muestrea solo sus hilos ---
+
+_perfil_actual = contextvars.ContextVar("planity_perfil", default=None)
+_perfiles = OrderedDict()
+
+
+class Perfil:
+    """Muestreo periódico de las pilas de los hilos que trabajan para un request.
+
+    Un hilo se agrega al entrar en un tramo (o desde el middleware HTTP); cada
+    `intervalo` segundos se lee su pila con sys._current_frames y se cuenta
+    en formato "colapsado" (archivo:función;…), el de flamegraph.pl y speedscope.
+    """
+
+    def __init__(self, ruta: str, intervalo: float = INTERVALO_PERFIL):
+        self.id = uuid.uuid4().hex[:12]
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.hilos = set()
+        self.muestras = Counter()
+        self.inicio = time.time()
+        self.segundos = None
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name=f"planity-perfil-{self.id}", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def _muestrear(self):
+        while not self._parar.wait(self.intervalo):
+            marcos = sys._current_frames()
+            for ident in list(self.hilos):
+                marco = marcos.get(ident)
+                pila = []
+                while marco is not None:
+                    pila.append(f"{os.path.basename(marco.f_code.co_filename)}:{marco.f_code.co_name}")
+                    marco = marco.f_back
+                if pila:
+                    self.muestras[";".join(reversed(pila))] += 1
+
+    def detener(self):
+        self._parar.set()
+        self._hilo.join()
+        self.segundos = round(time.time() - self.inicio, 3)
+
+    def resumen(self) -> dict:
+        return {"perfil_id": self.id, "ruta": self.ruta, "inicio": self.inicio,
+                "segundos": self.segundos, "muestras": sum(self.muestras.values())}
+
+    def colapsado(self) -> str:
+        return "".join(f"{pila} {n}\n" for pila, n in self.muestras.most_common())
+
+
+def iniciar_perfil(ruta: str) -> tuple:
+    """Empieza a perfilar el contexto actual (request) y el hilo que llama; devuelve (perfil, token)."""
+    perfil = Perfil(ruta)
+    perfil.hilos.add(threading.get_ident())
+    perfil.iniciar()
+    return perfil, _perfil_actual.set(perfil)
+
+
+def finalizar_perfil(perfil: Perfil, token):
+    """Detiene el muestreo y guarda el perfil (se conservan los MAX_PERFILES más recientes)."""
+    perfil.detener()
+    _perfil_actual.reset(token)
+    with _lock:
+        _perfiles[perfil.id] = perfil
+        while len(_perfiles) > MAX_PERFILES:
+            _perfiles.popitem(last=False)
+
+
+def perfiles() -> list:
+    with _lock:
+        return [p.resumen() for p in reversed(_perfiles.values())]
+
+
+def obtener_perfil(perfil_id: str):
+    with _lock:
+        return _perfiles.get(perfil_id)
+
+
+# --- Pico de memoria por request (tracemalloc, solo mientras haya requests que lo pidan) ---
+
+_memoria = {"activos": 0}
+
+
+def iniciar_memoria():
+    """Empieza a medir el pico de memoria; con requests concurrentes el pico es del proceso."""
+    with _lock:
+        _memoria["activos"] += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+
+def finalizar_memoria() -> int:
+    """Pico de memoria (bytes) desde iniciar_memoria; apaga tracemalloc con el último request."""
+    with _lock:
+        pico = tracemalloc.get_traced_memory()[1]
+        _memoria["activos"] -= 1
+        if _memoria["activos"] == 0:
+            tracemalloc.stop()
+    return pico
+
+
+class _Tramo:
+    __slots__ = ("etapa", "filas_entrada", "filas_salida", "segundos")
+
+    def __init__(self, etapa, filas_entrada):
+        self.etapa = etapa
+        self.filas_entrada = filas_entrada
+        self.filas_salida = None
+        self.segundos = None
+
+
+@contextmanager
+def tramo(etapa: str, filas: int = None, log: bool = True):
+    """Mide la duración de un bloque y la registra en planity_etapa_segundos{etapa}.
+
+    Se puede completar `t.filas_salida` dentro del bloque; las filas de
+    entrada/salida se suman en planity_etapa_filas_total. Con `log` se
+    imprime la duración (PLANITY_METRICAS_LOG=0 lo silencia); para caminos
+    calientes por SKU conviene log=False. En el ejecutor por procesos los
+    tramos que corren dentro de los workers no se registran.
+    """
+    perfil = _perfil_actual.get()
+    ident = threading.get_ident()
+    agregado = perfil is not None and ident not in perfil.hilos
+    if agregado:
+        perfil.hilos.add(ident)
+    t = _Tramo(etapa, filas)
+    t0 = time.perf_counter()
+    try:
+        yield t
+    finally:
+        t.segundos = time.perf_counter() - t0
+        if agregado:
+            perfil.hilos.discard(ident)
+        observar("planity_etapa_segundos", t.segundos, etapa=etapa)
+        if t.filas_entrada is not None:
+            incrementar("planity_etapa_filas_total", t.filas_entrada, etapa=etapa, sentido="entrada")
+        if t.filas_salida is not None:
+            incrementar("planity_etapa_filas_total", t.filas_salida, etapa=etapa, sentido="salida")
+        if log and LOG_TRAMOS:
+            filas = f" ({t.filas_salida} filas)" if t.filas_salida is not None else ""
+            print(f"⏱️ {etapa}: {round(t.segundos, 2)} seg{filas}", flush=True)
+
+
+def medido(etapa: str):
+    """Decorador: la función entera es un tramo; filas = largo del primer argumento y del resultado."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with tramo(etapa, _filas(args[0]) if args else None) as t:
+                resultado = funcion(*args, **kwargs)
+                t.filas_salida = _filas(resultado)
+                return resultado
+        return envoltura
+    return decorador
+
+
+# --- Exportación en formato de texto de Prometheus ---
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _etiquetas(pares) -> str:
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _numero(valor) -> str:
+    if isinstance(valor, float) and math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _memoria_proceso():
+    # ru_maxrss está en KB en Linux; la RSS actual sale de /proc (si existe)
+    fijar("planity_proceso_memoria_pico_bytes", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    try:
+        with open("/proc/self/statm") as f:
+            fijar("planity_proceso_memoria_rss_bytes", int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError):
+        pass
+
+
+registrar_ayuda("planity_proceso_memoria_pico_bytes", "gauge", "Pico de memoria residente del proceso")
+registrar_ayuda("planity_proceso_memoria_rss_bytes", "gauge", "Memoria residente actual del proceso")
+
+
+def exportar() -> str:
+    """Todas las métricas registradas en formato de texto de Prometheus (0.0.4)."""
+    _memoria_proceso()
+    with _lock:
+        por_nombre = {}
+        for (nombre, pares), valor in _contadores.items():
+            por_nombre.setdefault(nombre, []).append((pares, valor))
+        for (nombre, pares), valor in _valores.items():
+            por_nombre.setdefault(nombre, []).append((pares, valor))
+        for (nombre, pares), histograma in _histogramas.items():
+            por_nombre.setdefault(nombre, []).append((pares, {**histograma, "cuentas": list(histograma["cuentas"])}))
+
+    lineas = []
+    for nombre in sorted(por_nombre):
+        tipo, ayuda = _AYUDA.get(nombre, ("untyped", nombre))
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for pares, valor in sorted(por_nombre[nombre], key=lambda x: x[0]):
+            if not isinstance(valor, dict):
+                lineas.append(f"{nombre}{_etiquetas(pares)} {_numero(valor)}")
+                continue
+            for limite, cuenta in zip(valor["buckets"], valor["cuentas"]):
+                lineas.append(f"{nombre}_bucket{_etiquetas(pares + (('le', _numero(float(limite))),))} {cuenta}")
+            lineas.append(f"{nombre}_bucket{_etiquetas(pares + (('le', '+Inf'),))} {valor['total']}")
+            lineas.append(f"{nombre}_sum{_etiquetas(pares)} {_numero(valor['suma'])}")
+            lineas.append(f"{nombre}_count{_etiquetas(pares)} {valor['total']}")
+    return "\n".join(lineas) + "\n"
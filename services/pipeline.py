@@ -0,0 +1,409 @@
+import os
+import time
+import zlib
+import pickle
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from services.almacen_columnar import leer_tabla, leer_csv_normalizado, descategorizar
+from services.cleaner import clean_demand_df
+from services.forecast import BACKEND_FORECAST, PREDICCION_SES, VERSION_CACHE, forecast_engine
+from services.metricas import tramo
+from services.stock_projector import project_stock_multi
+
+# Archivos de la carpeta cloud/ y columnas numéricas que se normalizan al leer
+ARCHIVOS = {
+    "demanda": "demanda.csv",
+    "stock_historico": "stock_historico.csv",
+    "stock_actual": "stock_actual.csv",
+    "reposiciones": "reposiciones.csv",
+    "maestro": "maestro_productos.csv",
+}
+COLUMNAS_NUMERICAS = {
+    "stock_historico": "stock",
+    "stock_actual": "stock",
+    "reposiciones": "cantidad",
+}
+# Tablas grandes que se leen desde su copia columnar tipada (y sus columnas enteras)
+TABLAS_COLUMNARES = {
+    "demanda": ("demanda",),
+    "stock_historico": ("stock",),
+}
+
+# Etapas de ejecutar_pipeline en orden, tal como se informan a `progreso`
+ETAPAS_PIPELINE = ("lectura", "limpieza", "forecast", "proyeccion")
+
+# Multiplicadores impares para combinar huellas de varias tablas sin simetría
+_MEZCLA = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5], dtype=np.uint64)
+
+# Snapshot del último resultado completo (tablas + huellas de los CSV) para arrancar en caliente.
+# Por defecto va en <carpeta>/.snapshot/, que se pierde en cada deploy si la carpeta es
+# parte del código (Render): para que sobreviva, PLANITY_SNAPSHOT_DIR debe apuntar a un disco persistente.
+SNAPSHOT = os.getenv("PLANITY_SNAPSHOT", "1") != "0"
+CARPETA_SNAPSHOT = os.getenv("PLANITY_SNAPSHOT_DIR")
+VERSION_SNAPSHOT = 2
+
+# Estado por carpeta: archivos leídos y resultado de cada etapa
+_estado = {}
+_lock = threading.Lock()
+
+
+def huella_archivo(ruta: str, previa: tuple = None) -> tuple:
+    """(mtime_ns, tamaño, hash) del archivo.
+
+    Si mtime y tamaño coinciden con `previa` no se vuelve a leer el contenido.
+    """
+    info = os.stat(ruta)
+    if previa is not None and previa[:2] == (info.st_mtime_ns, info.st_size):
+        return previa
+    with open(ruta, "rb") as f:
+        contenido = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    return info.st_mtime_ns, info.st_size, contenido
+
+
+def leer_csv(ruta: str, nombre: str) -> pd.DataFrame:
+    if nombre in TABLAS_COLUMNARES:
+        return descategorizar(leer_tabla(ruta, TABLAS_COLUMNARES[nombre]))
+    df = leer_csv_normalizado(ruta)
+    columna = COLUMNAS_NUMERICAS.get(nombre)
+    if columna in df.columns:
+        df[columna] = pd.to_numeric(df[columna], errors="coerce").fillna(0)
+    return df
+
+
+def huellas_por_sku(df: pd.DataFrame) -> pd.Series:
+    """Huella uint64 de las filas de cada SKU (sensible al orden dentro del SKU)."""
+    if "sku" not in df.columns or df.empty:
+        return pd.Series(dtype=np.uint64)
+    filas = pd.util.hash_pandas_object(df.assign(_pos=df.groupby("sku").cumcount()), index=False)
+    return pd.Series(filas.to_numpy(), index=df["sku"].to_numpy()).groupby(level=0).sum()
+
+
+def combinar_huellas(*huellas: pd.Series) -> pd.Series:
+    """Huella conjunta por SKU de varias tablas (SKUs ausentes cuentan como 0)."""
+    indice = huellas[0].index
+    for h in huellas[1:]:
+        indice = indice.union(h.index)
+    total = np.zeros(len(indice), dtype=np.uint64)
+    for i, h in enumerate(huellas):
+        total += h.reindex(indice, fill_value=0).to_numpy(dtype=np.uint64) * _MEZCLA[i % len(_MEZCLA)]
+    return pd.Series(total, index=indice)
+
+
+def _fecha_como_texto(df: pd.DataFrame) -> pd.DataFrame:
+    """`fecha` en texto AAAA-MM-DD, como en el CSV de origen, para las respuestas."""
+    if "fecha" not in df.columns or not pd.api.types.is_datetime64_any_dtype(df["fecha"]):
+        return df
+    texto = np.datetime_as_string(df["fecha"].to_numpy().astype("datetime64[D]"))
+    return df.assign(fecha=pd.Series(texto, index=df.index, dtype=object).where(df["fecha"].notna()))
+
+
+def _filtrar_skus(df: pd.DataFrame, skus) -> pd.DataFrame:
+    if "sku" not in df.columns:
+        return df
+    return df[df["sku"].isin(skus)]
+
+
+def _etapa(estado: dict, nombre: str, huellas: pd.Series, contexto, calcular, unir):
+    """Ejecuta una etapa recalculando solo los SKUs cuya huella de entrada cambió.
+
+    `calcular(skus)` devuelve el resultado para esos SKUs (o para todos con
+    None) y `unir(partes)` junta lo conservado con lo recalculado en el orden
+    de un cálculo completo. Si cambia el `contexto` (parámetros globales de la
+    etapa) se recalcula todo. Devuelve (resultado, SKUs recalculados o None).
+    """
+    previo = estado.get(nombre)
+    if previo is not None and previo["contexto"] == contexto:
+        anteriores = previo["huellas"].reindex(huellas.index, fill_value=0).to_numpy()
+        nuevos = ~huellas.index.isin(previo["huellas"].index)
+        cambiados = huellas.index[(huellas.to_numpy() != anteriores) | nuevos]
+        if len(cambiados) == 0 and len(huellas) == len(previo["huellas"]):
+            return previo["resultado"], []
+        conservado = _filtrar_skus(previo["resultado"], huellas.index.difference(cambiados))
+        partes = [conservado, calcular(list(cambiados))] if len(cambiados) else [conservado]
+        resultado = unir(partes)
+        recalculados = list(cambiados)
+    else:
+        resultado = calcular(None)
+        recalculados = None
+    estado[nombre] = {"huellas": huellas, "contexto": contexto, "resultado": resultado}
+    return resultado, recalculados
+
+
+def _limpiar(df_demanda, df_stock_historico, skus=None):
+    # Se pasa la demanda completa: la grilla de semanas sale de todo el
+    # dataset y `skus` solo elige qué SKUs se limpian
+    df_demanda_limpia = clean_demand_df(df_demanda, df_stock_historico, skus=skus)
+
+    if "demanda_original" not in df_demanda_limpia.columns:
+        df_demanda_limpia["demanda_original"] = 0
+
+    if "demanda_sin_outlier" not in df_demanda_limpia.columns:
+        df_demanda_limpia["demanda_sin_outlier"] = df_demanda_limpia["demanda_original"]
+
+    # ✅ Reconstruir columna 'demanda'
+    df_demanda_limpia["demanda"] = df_demanda_limpia["demanda_sin_outlier"].fillna(0)
+
+    if "fecha" not in df_demanda_limpia.columns and "semana" in df_demanda_limpia.columns:
+        df_demanda_limpia["fecha"] = pd.to_datetime(df_demanda_limpia["semana"], errors="coerce")
+    else:
+        df_demanda_limpia["fecha"] = pd.to_datetime(df_demanda_limpia["fecha"], errors="coerce")
+
+    df_demanda_limpia["demanda_sin_outlier"] = df_demanda_limpia["demanda_sin_outlier"].fillna(0)
+    return df_demanda_limpia
+
+
+def _contexto_limpieza(df_demanda, df_stock_historico):
+    """Parámetros globales de la limpieza: grilla de semanas y último mes de stock."""
+    fechas = pd.to_datetime(df_demanda["fecha"])
+    semanas = (fechas - pd.to_timedelta(fechas.dt.weekday, unit="D")).unique()
+    mes_max = pd.to_datetime(df_stock_historico["fecha"]).max().to_period("M")
+    return hashlib.blake2b(np.sort(semanas.to_numpy()).tobytes(), digest_size=16).hexdigest(), str(mes_max)
+
+
+def _unir_limpieza(partes):
+    return pd.concat(partes).sort_values(["sku", "fecha"]).reset_index(drop=True)
+
+
+def _unir_forecast(partes):
+    return pd.concat(partes).sort_values("sku", kind="stable").reset_index(drop=True)
+
+
+def _unir_proyeccion(orden_skus):
+    def unir(partes):
+        partes = [p for p in partes if not p.empty]
+        if not partes:
+            return pd.DataFrame([])
+        df = pd.concat(partes)
+        df = df.iloc[np.argsort(orden_skus.get_indexer(df["sku"]), kind="stable")].reset_index(drop=True)
+        # Misma regla de tipos que una proyección completa: el stock inicial es
+        # entero salvo que algún mes posterior al primero arrastre stock
+        posterior = df["sku"].duplicated().to_numpy()
+        if not (posterior & (df["stock_inicial_mes"].to_numpy() > 0)).any():
+            df["stock_inicial_mes"] = df["stock_inicial_mes"].astype(np.int64)
+        return df
+    return unir
+
+
+def ejecutar_pipeline(base: str, progreso=None) -> dict:
+    """Lectura, limpieza, forecast y proyección de la carpeta `base` con caché por etapa.
+
+    Cada archivo se identifica por (mtime, tamaño, hash): si nada cambió se
+    devuelven las tablas de la ejecución anterior. Si cambió algo, cada etapa
+    recalcula solo los SKUs cuyas entradas cambiaron (p. ej. un cambio en
+    reposiciones.csv solo reproyecta el stock de los SKUs afectados).
+
+    `progreso(etapa)` se llama al empezar cada etapa de ETAPAS_PIPELINE; si
+    lanza una excepción (p. ej. para cancelar) la ejecución se corta ahí y
+    no quedan tablas a medias: la próxima ejecución retoma desde las etapas
+    ya guardadas.
+    """
+    with _lock:
+        estado = _estado.setdefault(os.path.abspath(base), {"archivos": {}, "etapas": {}})
+        try:
+            with tramo("pipeline", log=False):
+                return _ejecutar_etapas(base, estado, progreso or (lambda etapa: None))
+        except BaseException:
+            estado.pop("tablas", None)
+            raise
+
+
+def ruta_snapshot(base: str) -> str:
+    base = os.path.abspath(base)
+    if CARPETA_SNAPSHOT:
+        # Carpeta compartida: un archivo por carpeta de origen
+        return os.path.join(CARPETA_SNAPSHOT, f"pipeline-{hashlib.blake2b(base.encode(), digest_size=4).hexdigest()}.pkl.z")
+    return os.path.join(base, ".snapshot", "pipeline.pkl.z")
+
+
+_huella_codigo = None
+
+
+def motor_snapshot() -> dict:
+    """Configuración y código que producen las tablas: un snapshot de otro motor no se reutiliza."""
+    global _huella_codigo
+    if _huella_codigo is None:
+        carpeta = os.path.dirname(os.path.abspath(__file__))
+        h = hashlib.blake2b(digest_size=16)
+        for archivo in sorted(a for a in os.listdir(carpeta) if a.endswith(".py")):
+            h.update(archivo.encode())
+            with open(os.path.join(carpeta, archivo), "rb") as f:
+                h.update(f.read())
+        _huella_codigo = h.hexdigest()
+    return {
+        "backend": BACKEND_FORECAST, "version_cache": VERSION_CACHE,
+        "prediccion_ses": PREDICCION_SES, "codigo": _huella_codigo,
+    }
+
+
+def guardar_snapshot(base: str, estado: dict):
+    """Guarda las tablas del pipeline y el hash de contenido de cada CSV (pickle comprimido).
+
+    Se escribe en un temporal y se reemplaza al final; si no se puede
+    escribir (disco de solo lectura) solo se avisa.
+    """
+    ruta = ruta_snapshot(base)
+    contenido = {
+        "version": VERSION_SNAPSHOT,
+        "pandas": pd.__version__,
+        "motor": motor_snapshot(),
+        "huellas": {nombre: datos["huella"][2] for nombre, datos in estado["archivos"].items()},
+        "tablas": estado["tablas"],
+    }
+    try:
+        with tramo("pipeline.snapshot", log=False):
+            datos = zlib.compress(pickle.dumps(contenido, protocol=pickle.HIGHEST_PROTOCOL), 1)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(ruta))
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el snapshot del pipeline de {base}: {e}", flush=True)
+
+
+def cargar_snapshot(base: str):
+    """Tablas del último pipeline guardado de `base` si sus CSV no cambiaron de contenido, o None.
+
+    Se valida el hash de contenido de cada archivo (no el mtime: un deploy
+    reescribe los archivos iguales) y que el motor (backend, predicción SES,
+    versión de la caché y código de services/) sea el mismo que lo guardó. Las tablas quedan como resultado en
+    caché del pipeline; los CSV se leen recién cuando alguno cambie, y
+    entonces las etapas se recalculan completas.
+    """
+    if not SNAPSHOT:
+        return None
+    t0 = time.time()
+    try:
+        with open(ruta_snapshot(base), "rb") as f:
+            contenido = pickle.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Snapshot del pipeline ilegible, se ignora: {e}", flush=True)
+        return None
+    if contenido.get("version") != VERSION_SNAPSHOT or contenido.get("pandas") != pd.__version__:
+        return None
+    if contenido.get("motor") != motor_snapshot():
+        print("🗂️ Snapshot del pipeline descartado: cambió el código o la configuración del motor", flush=True)
+        return None
+
+    with _lock:
+        estado = _estado.setdefault(os.path.abspath(base), {"archivos": {}, "etapas": {}})
+        if "tablas" in estado:
+            return estado["tablas"]
+        archivos = {}
+        try:
+            for nombre, archivo in ARCHIVOS.items():
+                huella = huella_archivo(os.path.join(base, archivo))
+                if contenido["huellas"].get(nombre) != huella[2]:
+                    print(f"🗂️ Snapshot del pipeline descartado: cambió {archivo}", flush=True)
+                    return None
+                archivos[nombre] = {"huella": huella, "df": None, "por_sku": None}
+        except FileNotFoundError:
+            return None
+        estado["archivos"] = archivos
+        estado["tablas"] = contenido["tablas"]
+    print(f"🗂️ Snapshot del pipeline cargado en {round(time.time() - t0, 3)} seg", flush=True)
+    return contenido["tablas"]
+
+
+def _ejecutar_etapas(base: str, estado: dict, progreso) -> dict:
+    t0 = time.time()
+
+    # --- Lectura: solo se releen los archivos cuya huella cambió ---
+    progreso("lectura")
+    cambios = []
+    with tramo("pipeline.lectura", log=False):
+        for nombre, archivo in ARCHIVOS.items():
+            ruta = os.path.join(base, archivo)
+            previo = estado["archivos"].get(nombre)
+            huella = huella_archivo(ruta, previo["huella"] if previo else None)
+            if previo is None or previo["huella"] != huella:
+                df = leer_csv(ruta, nombre)
+                estado["archivos"][nombre] = {"huella": huella, "df": df, "por_sku": huellas_por_sku(df)}
+                cambios.append(nombre)
+
+    if not cambios and "tablas" in estado:
+        print(f"♻️ Pipeline sin cambios en {base}: {round(time.time() - t0, 2)} seg", flush=True)
+        return estado["tablas"]
+
+    archivos = estado["archivos"]
+    # Archivos restaurados desde el snapshot: se leen al primer cambio
+    for nombre, datos in archivos.items():
+        if datos["df"] is None:
+            datos["df"] = leer_csv(os.path.join(base, ARCHIVOS[nombre]), nombre)
+            datos["por_sku"] = huellas_por_sku(datos["df"])
+    df_demanda = archivos["demanda"]["df"]
+    df_stock_historico = archivos["stock_historico"]["df"]
+    if "demanda" not in df_demanda.columns:
+        raise ValueError(f"❌ Falta columna 'demanda'. Columnas: {df_demanda.columns.tolist()}")
+
+    # --- Limpieza: por SKU de demanda, con la huella de demanda + stock histórico ---
+    progreso("limpieza")
+    huellas = combinar_huellas(archivos["demanda"]["por_sku"], archivos["stock_historico"]["por_sku"])
+    huellas = huellas[huellas.index.isin(df_demanda["sku"].unique())]
+    df_demanda_limpia, rec_limpieza = _etapa(
+        estado["etapas"], "limpieza", huellas, _contexto_limpieza(df_demanda, df_stock_historico),
+        lambda skus: _limpiar(df_demanda, df_stock_historico, skus), _unir_limpieza,
+    )
+
+    # --- Forecast: por SKU, con la huella de su demanda limpia ---
+    progreso("forecast")
+    columnas = ["sku", "fecha", "demanda", "demanda_sin_outlier"]
+
+    def pronosticar(skus):
+        df = df_demanda_limpia if skus is None else _filtrar_skus(df_demanda_limpia, skus)
+        return forecast_engine(df[columnas]).fillna(0)
+
+    df_forecast, rec_forecast = _etapa(
+        estado["etapas"], "forecast", huellas_por_sku(df_demanda_limpia[columnas]), None,
+        pronosticar, _unir_forecast,
+    )
+
+    # --- Proyección: por SKU, con forecast + stock actual + reposiciones + precio ---
+    progreso("proyeccion")
+    df_stock_actual = archivos["stock_actual"]["df"]
+    df_reposiciones = archivos["reposiciones"]["df"]
+    df_maestro = archivos["maestro"]["df"]
+    huellas = combinar_huellas(
+        huellas_por_sku(df_forecast), archivos["stock_actual"]["por_sku"],
+        archivos["reposiciones"]["por_sku"], archivos["maestro"]["por_sku"],
+    )
+
+    def proyectar(skus):
+        tablas = [df_forecast, df_stock_actual, df_reposiciones, df_maestro]
+        if skus is not None:
+            tablas = [_filtrar_skus(df, skus) for df in tablas]
+        return project_stock_multi(*tablas).fillna(0)
+
+    df_stock_proj, rec_proyeccion = _etapa(
+        estado["etapas"], "proyeccion", huellas, None, proyectar,
+        _unir_proyeccion(pd.Index(df_forecast["sku"].unique())),
+    )
+
+    def resumen(recalculados):
+        return "todos" if recalculados is None else len(recalculados)
+    print(
+        f"🔁 Pipeline ({', '.join(cambios)} cambiados): limpieza {resumen(rec_limpieza)}, "
+        f"forecast {resumen(rec_forecast)}, proyección {resumen(rec_proyeccion)} SKUs "
+        f"en {round(time.time() - t0, 2)} seg",
+        flush=True,
+    )
+
+    estado["tablas"] = {
+        "demanda_limpia": df_demanda_limpia.fillna(0),
+        "forecast": df_forecast,
+        "maestro": df_maestro.fillna(0),
+        "reposiciones": df_reposiciones.fillna(0),
+        "stock_actual": df_stock_actual.fillna(0),
+        "stock_historico": _fecha_como_texto(df_stock_historico).fillna(0),
+        "stock_proyectado": df_stock_proj,
+    }
+    if SNAPSHOT:
+        guardar_snapshot(base, estado)
+    return estado["tablas"]
@@ -1,8 +1,13 @@
 import pandas as pd
 
-def consolidar_historico_stock(demanda_limpia: list, maestro: list) -> pd.DataFrame:
-    df_demanda = pd.DataFrame(demanda_limpia)
-    df_maestro = pd.DataFrame(maestro)
+from services.frames import como_frame
+from services.metricas import medido
+
+@medido("resumen")
+def consolidar_historico_stock(demanda_limpia, maestro) -> pd.DataFrame:
+    """Ventas y pérdidas mensuales por SKU; recibe DataFrames (o registros) y devuelve un DataFrame."""
+    df_demanda = como_frame(demanda_limpia)
+    df_maestro = como_frame(maestro)
 
     if df_demanda.empty or df_maestro.empty:
         return pd.DataFrame()
@@ -0,0 +1,104 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+# Formatos de respuesta: "json" es la respuesta completa de siempre (lista de
+# registros); el resto se envía por bloques sin construir un dict por fila
+FORMATOS = ("json", "stream", "ndjson", "split")
+FILAS_POR_BLOQUE = int(os.getenv("PLANITY_FILAS_BLOQUE", "20000"))
+
+
+def validar_formato(formato: str) -> str:
+    if formato not in FORMATOS:
+        raise ValueError(f"❌ Formato de respuesta desconocido: {formato}. Opciones: {FORMATOS}")
+    return formato
+
+
+def _bloques(df: pd.DataFrame):
+    """Slices de a lo sumo FILAS_POR_BLOQUE filas con las fechas ya en texto ISO."""
+    fechas = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        bloque = df.iloc[inicio:inicio + FILAS_POR_BLOQUE]
+        if fechas:
+            # Mismo texto que el encoder de FastAPI (isoformat, sin milisegundos)
+            bloque = bloque.assign(**{
+                c: pd.Series(np.datetime_as_string(bloque[c].to_numpy().astype("datetime64[s]")),
+                             index=bloque.index, dtype=object).where(bloque[c].notna(), None)
+                for c in fechas
+            })
+        yield bloque
+
+
+def _a_json(df: pd.DataFrame, orient: str, **kwargs) -> str:
+    return df.to_json(orient=orient, double_precision=15, force_ascii=False, **kwargs)
+
+
+def registros_json(df: pd.DataFrame):
+    """Lista JSON de registros por partes: '[', bloques separados por comas, ']'."""
+    yield "["
+    primero = True
+    for bloque in _bloques(df):
+        if not primero:
+            yield ","
+        yield _a_json(bloque, "records")[1:-1]
+        primero = False
+    yield "]"
+
+
+def registros_ndjson(df: pd.DataFrame):
+    """Un registro JSON por línea."""
+    for bloque in _bloques(df):
+        yield _a_json(bloque, "records", lines=True).rstrip("\n") + "\n"
+
+
+def columnas_json(df: pd.DataFrame):
+    """Formato columnar {"columns": [...], "data": [[...], ...]} por partes."""
+    yield '{"columns":' + json.dumps([str(c) for c in df.columns], ensure_ascii=False) + ',"data":['
+    primero = True
+    for bloque in _bloques(df):
+        if not primero:
+            yield ","
+        yield _a_json(bloque, "values")[1:-1]
+        primero = False
+    yield "]}"
+
+
+def serializar(tablas, formato: str, extra: dict = None):
+    """Generador de texto para una tabla o un dict {nombre: tabla} en el formato pedido.
+
+    - "stream": mismo JSON que la respuesta completa (registros), por bloques.
+    - "ndjson": un registro por línea; con varias tablas, antes de las filas de
+      cada una va una línea {"tabla": nombre, "filas": n}.
+    - "split": {"columns", "data"} por tabla.
+    `extra` (p. ej. el dataset_id) se añade como claves del objeto raíz o,
+    en NDJSON, como primera línea.
+    """
+    validar_formato(formato)
+    extra = extra or {}
+    if isinstance(tablas, pd.DataFrame):
+        if formato == "ndjson":
+            yield from registros_ndjson(tablas)
+        elif formato == "split":
+            yield from columnas_json(tablas)
+        else:
+            yield from registros_json(tablas)
+        return
+
+    if formato == "ndjson":
+        if extra:
+            yield json.dumps(extra, ensure_ascii=False) + "\n"
+        for nombre, df in tablas.items():
+            yield json.dumps({"tabla": nombre, "filas": len(df)}, ensure_ascii=False) + "\n"
+            yield from registros_ndjson(df)
+        return
+
+    partes = columnas_json if formato == "split" else registros_json
+    yield "{"
+    for i, (nombre, df) in enumerate(tablas.items()):
+        yield ("," if i else "") + json.dumps(nombre) + ":"
+        yield from partes(df)
+    for clave, valor in extra.items():
+        yield "," + json.dumps(clave) + ":" + json.dumps(valor, ensure_ascii=False)
+    yield "}"
@@ -0,0 +1,131 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Ordinal para fechas nulas (NaT): muy negativo, queda fuera de cualquier rango
+ORDINAL_NULO = np.iinfo(np.int32).min
+# 1970-01-01 fue jueves: el lunes 1970-01-05 (día 4) abre la semana 0
+_DIA_LUNES_CERO = 4
+
+
+def codificar_skus(skus, catalogo: pd.Index = None) -> tuple:
+    """Códigos int32 de cada SKU y el catálogo (código → sku).
+
+    Sin catálogo se construye uno ordenado con los SKUs presentes (mismo orden
+    que un groupby('sku')). Con catálogo, los SKUs que no están quedan en -1,
+    igual que los nulos.
+    """
+    if catalogo is None:
+        codigos, catalogo = pd.factorize(pd.Series(skus), sort=True)
+        return codigos.astype(np.int32), pd.Index(catalogo)
+    return catalogo.get_indexer(skus).astype(np.int32), catalogo
+
+
+def entero_compacto(valores: np.ndarray):
+    """int32 si todos los valores caben en 32 bits; si no, int64."""
+    limite = np.iinfo(np.int32).max
+    if len(valores) == 0 or np.abs(np.nan_to_num(valores)).max() <= limite:
+        return np.int32
+    return np.int64
+
+
+def _dias(fechas) -> np.ndarray:
+    return pd.to_datetime(fechas).to_numpy().astype("datetime64[D]")
+
+
+def ordinal_semana(fechas) -> np.ndarray:
+    """Semana (de lunes a domingo) de cada fecha como entero: semanas desde 1970-01-05."""
+    dias = _dias(fechas)
+    ordinal = (dias.astype(np.int64) - _DIA_LUNES_CERO) // 7
+    return np.where(np.isnat(dias), ORDINAL_NULO, ordinal).astype(np.int32)
+
+
+def ordinal_mes(fechas) -> np.ndarray:
+    """Mes de cada fecha como entero: meses desde 1970-01."""
+    dias = _dias(fechas)
+    validos = ~np.isnat(dias)
+    enteros = dias.astype(np.int64)
+    meses = np.full(len(dias), ORDINAL_NULO, dtype=np.int32)
+    if not validos.any():
+        return meses
+    todos = validos.all()
+    conocidos = enteros if todos else enteros[validos]
+    desde, hasta = conocidos.min(), conocidos.max()
+    if hasta - desde < len(dias):
+        # Pocas fechas distintas: tabla día → mes del rango (datetime64[M] por fila es lento)
+        tabla = np.arange(desde, hasta + 1).astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+        conocidos = tabla[conocidos - desde]
+    else:
+        conocidos = conocidos.astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+    if todos:
+        return conocidos
+    meses[validos] = conocidos
+    return meses
+
+
+def lunes_de_semana(ordinales: np.ndarray) -> np.ndarray:
+    """Fecha (datetime64[D]) del lunes de cada ordinal de semana."""
+    return (np.asarray(ordinales, dtype=np.int64) * 7 + _DIA_LUNES_CERO).astype("datetime64[D]")
+
+
+def inicio_de_mes(ordinales: np.ndarray) -> np.ndarray:
+    """Primer día (datetime64[M]) de cada ordinal de mes."""
+    return np.asarray(ordinales, dtype=np.int64).astype("datetime64[M]")
+
+
+@dataclass
+class SeriesSku:
+    """Series densas por SKU: fila = código del catálogo, columna = periodo.
+
+    `periodos` son los ordinales (semana o mes) de cada columna, en orden
+    creciente; `presentes` marca las celdas que tenían al menos un registro.
+    """
+    skus: pd.Index
+    periodos: np.ndarray
+    valores: np.ndarray
+    presentes: np.ndarray
+
+    def columna(self, ordinales: np.ndarray) -> np.ndarray:
+        """Columna de cada ordinal (-1 si el periodo no está en la grilla)."""
+        ordinales = np.asarray(ordinales, dtype=np.int64)
+        if len(self.periodos) == 0:
+            return np.full(len(ordinales), -1)
+        if self.periodos[-1] - self.periodos[0] + 1 == len(self.periodos):
+            # Grilla contigua (p. ej. meses de un rango): basta restar el inicio
+            posicion = ordinales - self.periodos[0]
+            return np.where((posicion >= 0) & (posicion < len(self.periodos)), posicion, -1)
+        posicion = np.minimum(np.searchsorted(self.periodos, ordinales), len(self.periodos) - 1)
+        return np.where(self.periodos[posicion] == ordinales, posicion, -1)
+
+
+def series_por_sku(codigos, ordinales, valores, skus: pd.Index, periodos: np.ndarray = None, dtype=np.int32) -> SeriesSku:
+    """Suma `valores` por (código, periodo) en una matriz densa (n_skus × periodos).
+
+    Sin `periodos` la grilla son los ordinales presentes. Se ignoran las filas
+    con código -1 o con periodo fuera de la grilla (los NaN suman 0). Con
+    `valores` 2-D (columnas × filas) se suman varias columnas a la vez y
+    `valores` queda (columnas × n_skus × periodos). Las sumas se hacen en
+    float64 (exactas para enteros < 2**53) y se devuelven en `dtype`.
+    """
+    codigos = np.asarray(codigos)
+    ordinales = np.asarray(ordinales)
+    validos = (codigos >= 0) & (ordinales != ORDINAL_NULO)
+    if periodos is None:
+        periodos = np.unique(ordinales[validos])
+    serie = SeriesSku(skus, np.asarray(periodos), None, None)
+    columna = serie.columna(ordinales)
+    validos &= columna >= 0
+
+    forma = (len(skus), len(periodos))
+    clave = codigos[validos].astype(np.int64) * len(periodos) + columna[validos]
+    serie.presentes = np.bincount(clave, minlength=forma[0] * forma[1]).reshape(forma) > 0
+
+    valores = np.asarray(valores)
+    matrices = [
+        np.bincount(clave, weights=np.nan_to_num(np.asarray(columna_valores[validos], dtype=float)),
+                    minlength=forma[0] * forma[1]).reshape(forma).astype(dtype)
+        for columna_valores in np.atleast_2d(valores)
+    ]
+    serie.valores = matrices[0] if valores.ndim == 1 else np.stack(matrices)
+    return serie
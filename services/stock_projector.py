@@ -1,19 +1,132 @@
+import os
+
 import pandas as pd
+import numpy as np
+
+from services.frames import como_frame
+from services.metricas import medido, tramo
+from services.series import ORDINAL_NULO, codificar_skus, inicio_de_mes, ordinal_mes, series_por_sku
+
+# Simulación de riesgo: caminos por defecto y máximo, y celdas (camino × SKU) por bloque
+CAMINOS_RIESGO = 10000
+MAX_CAMINOS_RIESGO = 100000
+CELDAS_RIESGO = int(os.getenv("PLANITY_RIESGO_BLOQUE", "4000000"))
+
+
+def _alinear_proyeccion(df_forecast, df_stock, df_repos):
+    """Forecast, stock inicial y reposiciones alineados en matrices (sku × mes proyectado).
+
+    Trabaja con SKUs codificados (orden de aparición en el forecast) y meses
+    ordinales. Cada SKU ocupa una fila con sus meses de forecast > 0 (desde
+    el mes de su stock inicial) en columnas consecutivas; `filas` son las
+    filas de df_forecast proyectadas y `fila`/`columna` su posición en las
+    matrices. None si no hay nada que proyectar.
+    """
+    orden_skus = pd.Index(df_forecast['sku'].unique())
+
+    # Stock inicial y mes de inicio (ordinal): primer registro de cada SKU
+    primeros = df_stock.drop_duplicates('sku', keep='first')
+    codigos_stock, _ = codificar_skus(primeros['sku'], orden_skus)
+    en_forecast = codigos_stock >= 0
+    iniciales = np.array([int(float(v or 0)) for v in primeros['stock']], dtype=np.int64)
+    tiene_stock = np.zeros(len(orden_skus), dtype=bool)
+    stock_inicial = np.zeros(len(orden_skus), dtype=np.int64)
+    mes_inicio = np.zeros(len(orden_skus), dtype=np.int32)
+    tiene_stock[codigos_stock[en_forecast]] = True
+    stock_inicial[codigos_stock[en_forecast]] = iniciales[en_forecast]
+    mes_inicio[codigos_stock[en_forecast]] = ordinal_mes(primeros['fecha'])[en_forecast]
+
+    codigos, _ = codificar_skus(df_forecast['sku'], orden_skus)
+    meses = ordinal_mes(df_forecast['mes'])
+    valores = df_forecast['forecast'].to_numpy()
+    filas = np.flatnonzero(
+        (valores > 0) & (meses != ORDINAL_NULO) & tiene_stock[codigos] & (meses >= mes_inicio[codigos])
+    )
+    if len(filas) == 0:
+        return None
+
+    # Filas ordenadas por (orden del SKU en el forecast, mes); lexsort es estable
+    filas = filas[np.lexsort((meses[filas], codigos[filas]))]
+    codigos, meses = codigos[filas], meses[filas]
+    skus, fila = np.unique(codigos, return_inverse=True)
+    columna = np.arange(len(filas)) - np.searchsorted(codigos, codigos)
+
+    # Reposiciones agregadas en una matriz (sku × mes) sobre los meses proyectados
+    periodos = np.arange(meses.min(), meses.max() + 1)
+    repos = series_por_sku(
+        codificar_skus(df_repos['sku'], orden_skus)[0], ordinal_mes(df_repos['fecha']),
+        df_repos['cantidad'].astype(float).to_numpy(), orden_skus, periodos, dtype=float,
+    )
+    cantidad = repos.valores[codigos, meses - periodos[0]]
+
+    forecast = np.zeros((len(skus), columna.max() + 1))
+    repos_mes = np.zeros_like(forecast)
+    forecast[fila, columna] = valores[filas]
+    repos_mes[fila, columna] = cantidad
 
-def project_stock_multi(forecast_raw, stock_raw, repos_raw, maestro_raw):
-    df_forecast = pd.DataFrame(forecast_raw)
-    df_stock = pd.DataFrame(stock_raw)
-    df_repos = pd.DataFrame(repos_raw)
-    df_maestro = pd.DataFrame(maestro_raw)
+    return {
+        "skus": orden_skus[skus], "filas": filas, "fila": fila, "columna": columna, "meses": meses,
+        "cantidad": cantidad, "forecast": forecast, "repos_mes": repos_mes, "stock_inicial": stock_inicial[skus],
+    }
+
+
+def _proyectar_vectorizado(df_forecast, df_stock, df_repos, precio_map):
+    """Proyección de todos los SKUs en una pasada.
+
+    Alinea forecast, stock inicial y reposiciones agregadas por (sku, mes)
+    una sola vez y recorre los meses como columnas de una matriz (sku × mes),
+    aplicando el mismo arrastre de stock que el cálculo fila a fila.
+    """
+    alineado = _alinear_proyeccion(df_forecast, df_stock, df_repos)
+    if alineado is None:
+        return pd.DataFrame([])
+    filas, fila, columna, meses = alineado["filas"], alineado["fila"], alineado["columna"], alineado["meses"]
+    forecast, repos_mes, cantidad = alineado["forecast"], alineado["repos_mes"], alineado["cantidad"]
+    valores = df_forecast['forecast'].to_numpy()
+
+    stock = alineado["stock_inicial"].astype(float)
+    inicio_mes = np.zeros_like(forecast)
+    final_mes = np.zeros_like(forecast)
+    perdidas = np.zeros_like(forecast)
+    for k in range(forecast.shape[1]):
+        inicio_mes[:, k] = stock
+        stock = stock + repos_mes[:, k] - forecast[:, k]
+        perdidas[:, k] = np.maximum(0, -stock) + 0.0  # evita -0.0
+        stock = np.maximum(0, stock) + 0.0
+        final_mes[:, k] = stock
+
+    precios = np.array([float(precio_map.get(sku, 0) or 0) for sku in alineado["skus"]])
+    perdida_euros = perdidas[fila, columna] * precios[fila]
+
+    # Tras el primer mes el stock arrastrado es float salvo que haya quedado en 0
+    stock_inicial_mes = inicio_mes[fila, columna]
+    if not ((columna > 0) & (stock_inicial_mes > 0)).any():
+        stock_inicial_mes = stock_inicial_mes.astype(np.int64)
+
+    return pd.DataFrame({
+        'sku': df_forecast['sku'].to_numpy()[filas],
+        'mes': np.datetime_as_string(inicio_de_mes(meses)),
+        'stock_inicial_mes': stock_inicial_mes,
+        'repos_aplicadas': cantidad.astype(np.int64),
+        'forecast': valores[filas],
+        'stock_final_mes': final_mes[fila, columna].astype(np.int64),
+        'unidades_perdidas': perdidas[fila, columna].astype(np.int64),
+        'perdida_proyectada_euros': np.round(perdida_euros, 1),
+    })
+
+
+def _preparar_entradas(forecast_raw, stock_raw, repos_raw, maestro_raw):
+    """Copias tipadas de las entradas de la proyección y mapa de precios de venta."""
+    df_forecast = como_frame(forecast_raw)
+    df_stock = como_frame(stock_raw)
+    df_repos = como_frame(repos_raw)
+    df_maestro = como_frame(maestro_raw)
 
     # --- Asegurar tipos y limpiar ---
     df_forecast['mes'] = pd.to_datetime(df_forecast['mes'], errors='coerce')
     df_stock['fecha'] = pd.to_datetime(df_stock['fecha'], errors='coerce')
     df_repos['fecha'] = pd.to_datetime(df_repos['fecha'], errors='coerce')
 
-    df_stock['mes'] = df_stock['fecha'].dt.to_period('M').dt.to_timestamp()
-    df_repos['mes'] = df_repos['fecha'].dt.to_period('M').dt.to_timestamp()
-
     # Asegurar que forecast sea numérico
     df_forecast['forecast'] = pd.to_numeric(df_forecast['forecast'], errors='coerce').fillna(0).astype(int)
 
@@ -25,6 +138,24 @@ def project_stock_multi(forecast_raw, stock_raw, repos_raw, maestro_raw):
 
     # Mapa de precios
     precio_map = df_maestro.set_index('sku')['precio_venta'].to_dict()
+    return df_forecast, df_stock, df_repos, precio_map
+
+
+@medido("proyeccion")
+def project_stock_multi(forecast_raw, stock_raw, repos_raw, maestro_raw, motor="vectorizado"):
+    """Proyección mensual de stock por SKU; recibe DataFrames (o registros) y devuelve un DataFrame.
+
+    Los frames de entrada no se modifican.
+    """
+    df_forecast, df_stock, df_repos, precio_map = _preparar_entradas(forecast_raw, stock_raw, repos_raw, maestro_raw)
+
+    if motor == "vectorizado":
+        return _proyectar_vectorizado(df_forecast, df_stock, df_repos, precio_map)
+    if motor != "iterativo":
+        raise ValueError(f"❌ Motor de proyección desconocido: {motor}")
+
+    df_stock['mes'] = df_stock['fecha'].dt.to_period('M').dt.to_timestamp()
+    df_repos['mes'] = df_repos['fecha'].dt.to_period('M').dt.to_timestamp()
 
     resultados = []
 
@@ -75,3 +206,109 @@ def project_stock_multi(forecast_raw, stock_raw, repos_raw, maestro_raw):
 
 
 
+
+
+def _simular_bloque(stock_inicial, forecast, desviacion, repos_mes, precios, mes_celda, total_camino, rng, percentil):
+    """Recursión de stock de un bloque de SKUs para todos los caminos a la vez.
+
+    La demanda de cada mes se muestrea como normal(forecast, desviación)
+    truncada en 0 y redondeada. Solo se guarda en memoria el mes en curso
+    (camino × SKU): de cada mes quedan la probabilidad de quiebre, las
+    unidades perdidas medias y su percentil, y la pérdida en euros de cada
+    camino se suma en `total_camino` (camino × mes de calendario).
+    """
+    caminos = total_camino.shape[0]
+    prob, media, cuantil = (np.zeros(forecast.shape) for _ in range(3))
+
+    stock = np.broadcast_to(stock_inicial.astype(float), (caminos, len(stock_inicial)))
+    for k in range(forecast.shape[1]):
+        ruido = rng.standard_normal((caminos, len(stock_inicial)), dtype=np.float32)
+        demanda = np.maximum(0, np.rint(forecast[:, k] + desviacion[:, k] * ruido))
+        stock = stock + repos_mes[:, k] - demanda
+        perdidas = np.maximum(0, -stock)
+        stock = np.maximum(0, stock)
+        prob[:, k] = (perdidas > 0).mean(axis=0)
+        media[:, k] = perdidas.mean(axis=0)
+        cuantil[:, k] = np.quantile(perdidas, percentil, axis=0)
+        for m in np.unique(mes_celda[:, k][mes_celda[:, k] >= 0]):
+            en_mes = mes_celda[:, k] == m
+            total_camino[:, m] += perdidas[:, en_mes] @ precios[en_mes]
+    return prob, media, cuantil
+
+
+@medido("riesgo_stock")
+def proyectar_riesgo_stock(forecast_raw, stock_raw, repos_raw, maestro_raw, caminos=CAMINOS_RIESGO,
+                           semilla=0, percentil=0.9):
+    """Proyección probabilística de quiebres de stock (Monte Carlo sobre project_stock_multi).
+
+    Misma recursión y meses que la proyección determinista, pero con la
+    demanda de cada mes muestreada de normal(forecast, forecast_up -
+    forecast) en `caminos` caminos por SKU. La simulación es una sola
+    cuenta (camino × SKU × mes) partida en bloques de SKUs de hasta
+    PLANITY_RIESGO_BLOQUE celdas por mes; con la misma semilla y bloque el
+    resultado es reproducible. Sin `forecast_up` la desviación es 0 y se
+    reproduce la proyección determinista.
+
+    Devuelve (detalle, totales): por (sku, mes) prob_quiebre,
+    unidades_perdidas_esperadas, perdida_euros_esperada y perdida_euros_pXX;
+    por mes lo mismo agregado sobre el catálogo (el percentil, de la
+    pérdida total de cada camino).
+    """
+    if not 1 <= caminos <= MAX_CAMINOS_RIESGO:
+        raise ValueError(f"❌ 'caminos' debe estar entre 1 y {MAX_CAMINOS_RIESGO}")
+    if not 0 <= percentil <= 1:
+        raise ValueError("❌ 'percentil' debe estar entre 0 y 1")
+    df_forecast, df_stock, df_repos, precio_map = _preparar_entradas(forecast_raw, stock_raw, repos_raw, maestro_raw)
+    etiqueta = f"perdida_euros_p{round(percentil * 100):02d}"
+
+    alineado = _alinear_proyeccion(df_forecast, df_stock, df_repos)
+    if alineado is None:
+        return pd.DataFrame([]), pd.DataFrame([])
+    filas, fila, columna, meses = alineado["filas"], alineado["fila"], alineado["columna"], alineado["meses"]
+
+    # Desviación mensual implícita en el forecast: forecast_up = round(pred + std)
+    desviacion = np.zeros_like(alineado["forecast"])
+    if 'forecast_up' in df_forecast.columns:
+        arriba = pd.to_numeric(df_forecast['forecast_up'], errors='coerce').to_numpy(dtype=float)[filas]
+        desviacion[fila, columna] = np.maximum(0, np.nan_to_num(arriba - df_forecast['forecast'].to_numpy()[filas]))
+    precios = np.array([float(precio_map.get(sku, 0) or 0) for sku in alineado["skus"]])
+
+    # Mes (posición en `calendario`) de cada celda de las matrices; -1 si la celda está vacía
+    calendario = np.unique(meses)
+    posicion = np.searchsorted(calendario, meses)
+    mes_celda = np.full(alineado["forecast"].shape, -1)
+    mes_celda[fila, columna] = posicion
+
+    prob, media, cuantil = (np.zeros(alineado["forecast"].shape) for _ in range(3))
+    total_camino = np.zeros((caminos, len(calendario)))
+    rng = np.random.default_rng(semilla)
+    paso = max(1, CELDAS_RIESGO // caminos)
+    with tramo("riesgo_stock.simulacion", caminos * len(filas), log=False):
+        for inicio in range(0, len(precios), paso):
+            bloque = slice(inicio, inicio + paso)
+            prob[bloque], media[bloque], cuantil[bloque] = _simular_bloque(
+                alineado["stock_inicial"][bloque], alineado["forecast"][bloque], desviacion[bloque],
+                alineado["repos_mes"][bloque], precios[bloque], mes_celda[bloque], total_camino, rng, percentil,
+            )
+
+    prob, media, cuantil = prob[fila, columna], media[fila, columna], cuantil[fila, columna]
+    detalle = pd.DataFrame({
+        'sku': df_forecast['sku'].to_numpy()[filas],
+        'mes': np.datetime_as_string(inicio_de_mes(meses)),
+        'forecast': df_forecast['forecast'].to_numpy()[filas],
+        'desviacion': desviacion[fila, columna],
+        'prob_quiebre': prob,
+        'unidades_perdidas_esperadas': media,
+        'perdida_euros_esperada': np.round(media * precios[fila], 1),
+        etiqueta: np.round(cuantil * precios[fila], 1),
+    })
+    por_mes = lambda pesos: np.bincount(posicion, weights=pesos, minlength=len(calendario))
+    totales = pd.DataFrame({
+        'mes': np.datetime_as_string(inicio_de_mes(calendario)),
+        'skus': por_mes(None).astype(int),
+        'skus_en_riesgo': por_mes(prob > 0.5).astype(int),
+        'unidades_perdidas_esperadas': por_mes(media),
+        'perdida_euros_esperada': np.round(por_mes(media * precios[fila]), 1),
+        etiqueta: np.round(np.quantile(total_camino, percentil, axis=0), 1),
+    })
+    return detalle, totales
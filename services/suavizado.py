@@ -0,0 +1,140 @@
+import numpy as np
+
+# Grilla de arranque de alpha (misma que usa statsmodels con use_brute=True)
+GRILLA_ARRANQUE = np.linspace(0.005, 0.995, 87)
+# Grilla fina sobre la que se desciende hasta el mínimo local
+GRILLA_FINA = np.linspace(0, 1, 201)
+ITERACIONES_REFINAMIENTO = 30
+# SKUs evaluados a la vez en las grillas (acota la memoria a BLOQUE × puntos)
+BLOQUE_SKUS = 2048
+
+_RAZON_AUREA = (np.sqrt(5) - 1) / 2
+
+
+def matriz_rellena(series: list) -> tuple:
+    """Alinea series de distinto largo a la izquierda en una matriz (n, T_max).
+
+    Devuelve (valores, longitudes); las posiciones de relleno quedan en 0.
+    """
+    longitudes = np.array([len(s) for s in series], dtype=np.int64)
+    valores = np.zeros((len(series), int(longitudes.max()) if len(series) else 0))
+    for i, s in enumerate(series):
+        valores[i, :len(s)] = s
+    return valores, longitudes
+
+
+def _acumular(y: np.ndarray, mascara: np.ndarray, alpha: np.ndarray) -> tuple:
+    """Sumas que definen el SSE de SES como cuadrática en el nivel inicial.
+
+    Con alpha fijo el valor ajustado es A_t + (1 - alpha)^t * l0, así que
+    SSE(l0) = s_ee - 2 * l0 * s_be + l0^2 * s_bb. `alpha` es (n, G).
+    """
+    a = np.zeros_like(alpha)
+    b = np.ones_like(alpha)
+    s_ee = np.zeros_like(alpha)
+    s_be = np.zeros_like(alpha)
+    s_bb = np.zeros_like(alpha)
+    for t in range(y.shape[1]):
+        y_t = y[:, t:t + 1]
+        m_t = mascara[:, t:t + 1]
+        e = (y_t - a) * m_t
+        s_ee += e * e
+        s_be += b * e
+        s_bb += b * b * m_t
+        a = alpha * y_t + (1 - alpha) * a
+        b = (1 - alpha) * b
+    return s_ee, s_be, s_bb
+
+
+def _sse_perfil(y, mascara, alpha):
+    """SSE con el nivel inicial óptimo (forma cerrada) y ese nivel."""
+    s_ee, s_be, s_bb = _acumular(y, mascara, alpha)
+    l0 = s_be / s_bb
+    return s_ee - s_be * l0, l0
+
+
+def _nivel_inicial_heuristico(y: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Nivel de arranque de statsmodels: y[0] o, con >= 10 datos, el intercepto
+    de una regresión lineal sobre las 10 primeras observaciones."""
+    nivel = y[:, 0].copy()
+    if y.shape[1] >= 10:
+        x = np.arange(1, 11)
+        primeros = y[:, :10]
+        pendiente = ((x - x.mean()) * (primeros - primeros.mean(axis=1, keepdims=True))).sum(axis=1) / ((x - x.mean()) ** 2).sum()
+        intercepto = primeros.mean(axis=1) - pendiente * x.mean()
+        nivel = np.where(longitudes >= 10, intercepto, nivel)
+    return nivel
+
+
+def _por_bloques(funcion, y, mascara, *args):
+    """Aplica una búsqueda por grilla en bloques de filas y concatena los índices."""
+    partes = [funcion(y[f], mascara[f], *(a[f] for a in args)) for f in
+              (slice(i, i + BLOQUE_SKUS) for i in range(0, len(y), BLOQUE_SKUS))]
+    return np.concatenate(partes) if partes else np.empty(0, dtype=np.int64)
+
+
+def _indice_arranque(y, mascara, l0_ini):
+    s_ee, s_be, s_bb = _acumular(y, mascara, np.broadcast_to(GRILLA_ARRANQUE, (len(y), len(GRILLA_ARRANQUE))).copy())
+    sse = s_ee - 2 * l0_ini[:, None] * s_be + l0_ini[:, None] ** 2 * s_bb
+    return np.argmin(sse, axis=1)
+
+
+def _descenso_local(y, mascara, inicio):
+    """Baja por la grilla fina desde `inicio` hasta el mínimo local del SSE de perfil."""
+    sse, _ = _sse_perfil(y, mascara, np.broadcast_to(GRILLA_FINA, (len(y), len(GRILLA_FINA))).copy())
+    relleno = np.pad(sse, ((0, 0), (1, 1)), constant_values=np.inf)
+    vecinos = np.stack([relleno[:, :-2], relleno[:, 1:-1], relleno[:, 2:]])
+    siguiente = np.arange(sse.shape[1]) + np.argmin(vecinos, axis=0) - 1
+    # Salto de punteros: tras log2(puntos) pasos cada índice llega a su mínimo local
+    for _ in range(int(np.ceil(np.log2(sse.shape[1]))) + 1):
+        siguiente = np.take_along_axis(siguiente, siguiente, axis=1)
+    return siguiente[np.arange(len(y)), inicio]
+
+
+def ajustar_ses(y: np.ndarray, longitudes: np.ndarray) -> tuple:
+    """Ajusta SES (alpha y nivel inicial estimados) para todas las filas a la vez.
+
+    Reproduce `SimpleExpSmoothing(..., initialization_method="estimated")`:
+    arranque por grilla de alpha con el nivel heurístico fijo y búsqueda
+    local del mínimo de SSE desde ese punto (grilla fina + sección áurea).
+    Devuelve (alpha, l0).
+    """
+    mascara = (np.arange(y.shape[1]) < longitudes[:, None]).astype(float)
+    l0_ini = _nivel_inicial_heuristico(y, longitudes)
+
+    arranque = GRILLA_ARRANQUE[_por_bloques(_indice_arranque, y, mascara, l0_ini)]
+    inicio = np.clip(np.rint(arranque * (len(GRILLA_FINA) - 1)).astype(np.int64), 0, len(GRILLA_FINA) - 1)
+    minimo = _por_bloques(_descenso_local, y, mascara, inicio)
+
+    paso = GRILLA_FINA[1] - GRILLA_FINA[0]
+    bajo = np.clip(GRILLA_FINA[minimo] - paso, 0, 1)
+    alto = np.clip(GRILLA_FINA[minimo] + paso, 0, 1)
+    for _ in range(ITERACIONES_REFINAMIENTO):
+        c = alto - _RAZON_AUREA * (alto - bajo)
+        d = bajo + _RAZON_AUREA * (alto - bajo)
+        izquierda = _sse_perfil(y, mascara, c[:, None])[0][:, 0] < _sse_perfil(y, mascara, d[:, None])[0][:, 0]
+        alto = np.where(izquierda, d, alto)
+        bajo = np.where(izquierda, bajo, c)
+
+    # Se conserva el punto de la grilla si el refinamiento no lo mejora
+    candidato = (bajo + alto) / 2
+    sse_grilla, _ = _sse_perfil(y, mascara, GRILLA_FINA[minimo][:, None])
+    sse_refinado, _ = _sse_perfil(y, mascara, candidato[:, None])
+    alpha = np.where(sse_refinado[:, 0] <= sse_grilla[:, 0], candidato, GRILLA_FINA[minimo])
+    _, l0 = _sse_perfil(y, mascara, alpha[:, None])
+    return alpha, l0[:, 0]
+
+
+def valores_ajustados(y: np.ndarray, longitudes: np.ndarray, alpha: np.ndarray, l0: np.ndarray) -> tuple:
+    """Valores ajustados de un paso (n, T_max) y nivel tras la última observación.
+
+    El nivel final es la predicción SES para el mes siguiente a cada serie.
+    """
+    ajustados = np.zeros_like(y)
+    nivel = l0.astype(float).copy()
+    nivel_final = nivel.copy()
+    for t in range(y.shape[1]):
+        ajustados[:, t] = nivel
+        nivel = alpha * y[:, t] + (1 - alpha) * nivel
+        nivel_final = np.where(longitudes == t + 1, nivel, nivel_final)
+    return ajustados, nivel_final
@@ -0,0 +1,173 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Límites de la cola de trabajos en segundo plano, sobrescribibles por variables de entorno
+MAX_CONCURRENTES = int(os.getenv("PLANITY_TRABAJOS_CONCURRENTES", "1"))
+MAX_EN_COLA = int(os.getenv("PLANITY_TRABAJOS_COLA", "20"))
+MAX_GUARDADOS = int(os.getenv("PLANITY_TRABAJOS_GUARDADOS", "100"))
+
+ESTADOS_ACTIVOS = ("en_cola", "en_curso")
+ESTADOS_FINALES = ("completado", "error", "cancelado")
+
+_trabajos = OrderedDict()
+_lock = threading.Lock()
+_pool = None
+
+
+class TrabajoCancelado(Exception):
+    """Se lanza desde el aviso de progreso cuando el trabajo fue cancelado."""
+
+
+def _obtener_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=max(1, MAX_CONCURRENTES), thread_name_prefix="planity-trabajo")
+    return _pool
+
+
+def _vista(trabajo: dict) -> dict:
+    """Copia serializable del trabajo (sin función, futuro ni resultado)."""
+    etapas = trabajo["etapas"]
+    completadas = sum(1 for e in etapas if etapas[e]["estado"] == "completada")
+    return {
+        "trabajo_id": trabajo["id"],
+        "tipo": trabajo["tipo"],
+        "estado": trabajo["estado"],
+        "etapa": trabajo["etapa"],
+        "progreso": round(completadas / len(etapas), 3) if etapas else None,
+        "etapas": {e: dict(v) for e, v in etapas.items()},
+        "creado": trabajo["creado"],
+        "iniciado": trabajo["iniciado"],
+        "finalizado": trabajo["finalizado"],
+        "error": trabajo["error"],
+    }
+
+
+def _purgar():
+    """Descarta los trabajos terminados más antiguos por encima de MAX_GUARDADOS."""
+    terminados = [k for k, v in _trabajos.items() if v["estado"] in ESTADOS_FINALES]
+    for trabajo_id in terminados[:max(0, len(_trabajos) - MAX_GUARDADOS)]:
+        del _trabajos[trabajo_id]
+
+
+def _cerrar_etapa(trabajo: dict, ahora: float, estado: str):
+    etapa = trabajo["etapa"]
+    if etapa is not None and trabajo["etapas"][etapa]["estado"] == "en_curso":
+        info = trabajo["etapas"][etapa]
+        info["estado"] = estado
+        info["segundos"] = round(ahora - info["inicio"], 3)
+
+
+def _ejecutar(trabajo: dict, funcion, args: tuple):
+    def progreso(etapa: str):
+        ahora = time.time()
+        with _lock:
+            if trabajo["cancelar"]:
+                raise TrabajoCancelado()
+            _cerrar_etapa(trabajo, ahora, "completada")
+            trabajo["etapa"] = etapa
+            trabajo["etapas"].setdefault(etapa, {"estado": "pendiente"})
+            trabajo["etapas"][etapa].update(estado="en_curso", inicio=ahora)
+
+    with _lock:
+        if trabajo["cancelar"]:
+            trabajo.update(estado="cancelado", finalizado=time.time())
+            return
+        trabajo["estado"] = "en_curso"
+        trabajo["iniciado"] = time.time()
+
+    try:
+        resultado = funcion(*args, progreso=progreso)
+        estado, error = "completado", None
+    except TrabajoCancelado:
+        resultado, estado, error = None, "cancelado", None
+    except Exception as e:
+        print(f"❌ Trabajo {trabajo['id']} ({trabajo['tipo']}) con error:", e, flush=True)
+        resultado, estado, error = None, "error", str(e)
+
+    ahora = time.time()
+    with _lock:
+        _cerrar_etapa(trabajo, ahora, {"completado": "completada", "cancelado": "cancelada"}.get(estado, estado))
+        trabajo.update(estado=estado, error=error, resultado=resultado, finalizado=ahora)
+        if estado == "completado":
+            trabajo["etapa"] = None
+    print(f"🧵 Trabajo {trabajo['id']} ({trabajo['tipo']}) {estado} en "
+          f"{round(ahora - trabajo['iniciado'], 2)} seg", flush=True)
+
+
+def encolar(tipo: str, clave, etapas: tuple, funcion, *args) -> tuple:
+    """Encola `funcion(*args, progreso=...)` y devuelve (trabajo, nuevo).
+
+    Si ya hay un trabajo activo con la misma `clave` (misma operación sobre
+    las mismas entradas) se devuelve ese en lugar de lanzar otro. La función
+    recibe `progreso(etapa)` para avisar cada etapa que empieza; ahí se corta
+    la ejecución si el trabajo fue cancelado. Como mucho MAX_CONCURRENTES
+    trabajos corren a la vez y MAX_EN_COLA esperan.
+    """
+    with _lock:
+        for trabajo in _trabajos.values():
+            if trabajo["clave"] == clave and trabajo["estado"] in ESTADOS_ACTIVOS and not trabajo["cancelar"]:
+                return _vista(trabajo), False
+        en_cola = sum(1 for t in _trabajos.values() if t["estado"] == "en_cola")
+        if en_cola >= MAX_EN_COLA:
+            raise ValueError(f"❌ Cola de trabajos llena ({MAX_EN_COLA} en espera)")
+
+        trabajo = {
+            "id": uuid.uuid4().hex[:16],
+            "tipo": tipo,
+            "clave": clave,
+            "estado": "en_cola",
+            "etapa": None,
+            "etapas": {etapa: {"estado": "pendiente"} for etapa in etapas},
+            "creado": time.time(),
+            "iniciado": None,
+            "finalizado": None,
+            "error": None,
+            "resultado": None,
+            "cancelar": False,
+        }
+        _trabajos[trabajo["id"]] = trabajo
+        _purgar()
+        trabajo["futuro"] = _obtener_pool().submit(_ejecutar, trabajo, funcion, args)
+        return _vista(trabajo), True
+
+
+def obtener(trabajo_id: str):
+    """Estado del trabajo, o None si no existe (o ya se purgó)."""
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        return _vista(trabajo) if trabajo else None
+
+
+def resultado(trabajo_id: str):
+    """(estado, resultado) del trabajo, o None si no existe."""
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        return (trabajo["estado"], trabajo["resultado"]) if trabajo else None
+
+
+def listar() -> list:
+    """Estado de todos los trabajos guardados, del más reciente al más antiguo."""
+    with _lock:
+        return [_vista(t) for t in reversed(_trabajos.values())]
+
+
+def cancelar(trabajo_id: str):
+    """Pide cancelar el trabajo y devuelve su estado (None si no existe).
+
+    Un trabajo en cola se cancela en el acto; uno en curso se corta al
+    empezar su próxima etapa.
+    """
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        if trabajo is None:
+            return None
+        if trabajo["estado"] in ESTADOS_ACTIVOS:
+            trabajo["cancelar"] = True
+            if trabajo["estado"] == "en_cola" and trabajo["futuro"].cancel():
+                trabajo.update(estado="cancelado", finalizado=time.time())
+        return _vista(trabajo)
@@ -0,0 +1,62 @@
+import math
+from bisect import bisect_left, insort
+from collections import deque
+
+
+def percentil_lineal(ordenados, percentil: float) -> float:
+    """Percentil con interpolación lineal sobre valores ya ordenados.
+
+    Reproduce la aritmética de np.percentile (método "linear"): índice
+    virtual (n - 1) * q y la misma interpolación que numpy según el peso
+    quede por debajo o por encima de 0.5, así el resultado es idéntico bit a bit.
+    """
+    n = len(ordenados)
+    if n == 0:
+        raise ValueError("❌ No hay valores para calcular el percentil")
+    indice = (n - 1) * (percentil / 100)
+    if indice >= n - 1:
+        return float(ordenados[-1])
+    anterior = math.floor(indice)
+    peso = indice - anterior
+    a, b = ordenados[anterior], ordenados[anterior + 1]
+    diferencia = b - a
+    if peso >= 0.5:
+        return b - diferencia * (1 - peso)
+    return a + diferencia * peso
+
+
+class VentanaPercentiles:
+    """Ventana deslizante de los últimos `tamano` valores con sus positivos ordenados.
+
+    Cada paso agrega un valor y descarta el más antiguo: la posición se
+    busca por bisección (O(log W)) sobre una lista ordenada que solo contiene
+    los valores > 0 de la ventana, así los percentiles de esos valores se leen
+    sin ordenar ni copiar la ventana. También lleva la suma de la ventana
+    (exacta con enteros; con floats acumula el redondeo de cada paso).
+    """
+
+    def __init__(self, tamano: int):
+        self.tamano = tamano
+        self.valores = deque()
+        self.positivos = []
+        self.suma = 0
+
+    def __len__(self):
+        return len(self.valores)
+
+    def agregar(self, valor):
+        self.valores.append(valor)
+        self.suma += valor
+        if valor > 0:
+            insort(self.positivos, valor)
+        if len(self.valores) > self.tamano:
+            saliente = self.valores.popleft()
+            self.suma -= saliente
+            if saliente > 0:
+                del self.positivos[bisect_left(self.positivos, saliente)]
+
+    def percentil(self, percentil: float, defecto=0):
+        """Percentil de los valores positivos de la ventana (`defecto` si no hay)."""
+        if not self.positivos:
+            return defecto
+        return percentil_lineal(self.positivos, percentil)
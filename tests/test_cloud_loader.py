@@ -0,0 +1,26 @@
+import pandas as pd
+
+from routes import cloud_loader
+from services import dataset_store
+
+
+def _tablas(sku):
+    return {"demanda_limpia": pd.DataFrame({"sku": [sku], "fecha": ["2024-01-01"], "demanda": [1]})}
+
+
+def test_demanda_limpia_sin_dataset_id_es_la_del_ultimo_pipeline_de_la_nube(monkeypatch):
+    monkeypatch.setattr(cloud_loader, "_dataset_nube", None)
+    monkeypatch.setattr(cloud_loader, "_tablas_nube", None)
+    # Sin pipeline de la nube todavía: lista vacía, como el global del código original
+    assert cloud_loader.obtener_demanda_limpia() == []
+
+    cloud_loader._guardar_dataset_nube(_tablas("NUBE"))
+    otro = dataset_store.guardar_dataset(_tablas("OTRO"))
+    assert [fila["sku"] for fila in cloud_loader.obtener_demanda_limpia()] == ["NUBE"]
+    assert [fila["sku"] for fila in cloud_loader.obtener_demanda_limpia(dataset_id=otro)] == ["OTRO"]
+
+    # El almacén expulsa todo (TTL): el dataset de la nube sigue disponible, un ID explícito no
+    with dataset_store._lock:
+        dataset_store._datasets.clear()
+    assert [fila["sku"] for fila in cloud_loader.obtener_demanda_limpia()] == ["NUBE"]
+    assert cloud_loader.obtener_demanda_limpia(dataset_id=otro).status_code == 404
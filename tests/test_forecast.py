@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from fastapi.testclient import TestClient
+
+from benchmarks.generador import generar_dataset
+from main import app
+from services import cache_forecast, forecast
+from services.cleaner import clean_demand_df
+from services.forecast import forecast_engine
+
+
+@pytest.fixture(scope="module")
+def entrada():
+    tablas = generar_dataset(escala=1, semilla=0)
+    limpia = clean_demand_df(tablas["demanda"], tablas["stock_historico"])
+    return pd.DataFrame({
+        "sku": limpia["sku"], "fecha": limpia["fecha"],
+        "demanda": limpia["demanda_sin_outlier"], "demanda_sin_outlier": limpia["demanda_sin_outlier"],
+    })
+
+
+def test_forecast_con_cache_igual_a_sin_cache(entrada, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_forecast, "RUTA_CACHE", str(tmp_path / "forecast.sqlite"))
+    sin_cache = forecast_engine(entrada, cache=False, prediccion_ses="modelo")
+
+    antes = cache_forecast.estadisticas()
+    llenado = forecast_engine(entrada, cache=True, prediccion_ses="modelo")
+    medio = cache_forecast.estadisticas()
+    leido = forecast_engine(entrada, cache=True, prediccion_ses="modelo")
+    despues = cache_forecast.estadisticas()
+
+    assert medio["guardadas"] > antes["guardadas"]
+    # La segunda corrida sale entera de la caché
+    assert despues["aciertos"] - medio["aciertos"] == medio["guardadas"] - antes["guardadas"]
+    assert despues["fallos"] == medio["fallos"]
+    pd.testing.assert_frame_equal(llenado, sin_cache)
+    pd.testing.assert_frame_equal(leido, sin_cache)
+
+
+def test_comparativa_servida_ajusta_cada_sku_una_vez(entrada, monkeypatch):
+    monkeypatch.setattr(cache_forecast, "CACHE_ACTIVA", False)
+    ajustadas = []
+    ajustar = forecast.ajustar_ses_lote
+    monkeypatch.setattr(forecast, "ajustar_ses_lote", lambda series, *a: ajustadas.extend(series) or ajustar(series, *a))
+
+    payload = entrada.assign(fecha=entrada["fecha"].dt.strftime("%Y-%m-%d")).to_dict(orient="records")
+    respuesta = TestClient(app).post("/forecast/comparativa", json=payload)
+
+    assert respuesta.status_code == 200
+    comparativa = pd.DataFrame(respuesta.json()["comparativa"])
+    assert len(ajustadas) == comparativa["sku"].nunique()
+    pd.testing.assert_frame_equal(
+        comparativa, forecast.generar_comparativa_forecasts(entrada).fillna(0), check_dtype=False
+    )
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from routes import cloud_loader
+from services.dataset_store import guardar_dataset
+from services.indice_filas import construir_indice
+
+
+@pytest.fixture
+def indice():
+    df = pd.DataFrame({
+        "sku": ["A", "A", "A", "B", "B"],
+        "fecha": ["2024-01-01", "2024-01-08", "2024-01-15", "2024-01-01", "2024-01-22"],
+        "stock": [1, 2, 3, 4, 5],
+    })
+    return construir_indice(df)
+
+
+def test_hasta_anterior_a_la_primera_fecha_no_devuelve_filas(indice):
+    pagina, total = indice.consultar(hasta="2023-12-31")
+    assert total == 0 and pagina.empty
+    pagina, total = indice.consultar(desde="2023-01-01", hasta="2023-12-31")
+    assert total == 0 and pagina.empty
+    # El primer día sí entra
+    _, total = indice.consultar(hasta="2024-01-01")
+    assert total == 2
+
+
+def test_desde_posterior_a_hasta_se_rechaza(indice):
+    with pytest.raises(ValueError, match="desde"):
+        indice.consultar(desde="2024-01-15", hasta="2024-01-08")
+    # Rango vacío dentro de las fechas de la tabla: total 0, no negativo
+    pagina, total = indice.consultar(desde="2024-01-09", hasta="2024-01-14")
+    assert total == 0 and pagina.empty
+    pagina, total = indice.consultar(desde="2025-01-01")
+    assert total == 0 and pagina.empty
+
+
+def test_skus_numericos():
+    df = pd.DataFrame({"sku": [10, 2, 9, 10], "fecha": ["2024-01-01", "2024-01-01", "2024-01-01", "2024-01-08"],
+                       "stock": [1, 2, 3, 4]})
+    maestro = pd.DataFrame({"sku": [2, 9, 10], "categoria": ["x", "y", "x"]})
+    indice = construir_indice(df, maestro)
+    assert list(indice.skus) == sorted(indice.skus)
+
+    pagina, total = indice.consultar(skus=["10"])
+    assert total == 2 and set(pagina["stock"]) == {1, 4}
+    _, total = indice.consultar(skus=[2, 9])
+    assert total == 2
+    pagina, total = indice.consultar(categorias=["x"])
+    assert total == 3 and set(pagina["sku"]) == {2, 10}
+
+
+def test_demanda_limpia_sin_dataset_id_usa_el_dataset_de_la_nube(monkeypatch):
+    limpia = lambda sku: pd.DataFrame({"sku": [sku], "fecha": ["2024-01-01"], "demanda": [1]})
+    nube = guardar_dataset({"demanda_limpia": limpia("NUBE"), "maestro": pd.DataFrame()})
+    # Un dataset guardado después por otro cliente no debe responder por defecto
+    guardar_dataset({"demanda_limpia": limpia("OTRO"), "maestro": pd.DataFrame()})
+
+    consultar = lambda: cloud_loader.consultar_demanda_limpia(sku=None, categoria=None)
+    monkeypatch.setattr(cloud_loader, "_dataset_nube", None)
+    assert consultar().status_code == 404
+
+    monkeypatch.setattr(cloud_loader, "_dataset_nube", nube)
+    respuesta = consultar()
+    assert [fila["sku"] for fila in respuesta["filas"]] == ["NUBE"]
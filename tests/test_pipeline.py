@@ -0,0 +1,86 @@
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.generador import escribir_dataset, generar_dataset
+from services import cache_forecast, pipeline
+
+
+def _reescribir(ruta, df):
+    """Escribe el CSV y adelanta su mtime: el pipeline no relee archivos con mtime y tamaño iguales."""
+    info = os.stat(ruta)
+    df.to_csv(ruta, index=False)
+    os.utime(ruta, ns=(info.st_atime_ns, info.st_mtime_ns + 10**9))
+
+
+@pytest.fixture
+def carpeta(tmp_path, monkeypatch):
+    """Dataset sintético con un SKU de alta tardía: sin ninguna fila de demanda antes de 2024.
+
+    El generador escribe todas las semanas de todos los SKUs (con 0 antes
+    del alta), así que la grilla de semanas de un subconjunto coincidiría
+    con la del dataset aunque se calculara mal.
+    """
+    monkeypatch.setattr(pipeline, "SNAPSHOT", False)
+    monkeypatch.setattr(cache_forecast, "CACHE_ACTIVA", False)
+    tablas = generar_dataset(escala=1, semilla=0)
+    demanda = tablas["demanda"]
+    sku = demanda["sku"].iloc[0]
+    tablas["demanda"] = demanda[(demanda["sku"] != sku) | (pd.to_datetime(demanda["fecha"]) >= "2024-01-01")]
+    escribir_dataset(tablas, str(tmp_path))
+    yield str(tmp_path), sku
+    pipeline._estado.pop(os.path.abspath(tmp_path), None)
+
+
+def _completo(base):
+    pipeline._estado.pop(os.path.abspath(base), None)
+    return pipeline.ejecutar_pipeline(base)
+
+
+def _comparar(incremental, completo):
+    assert incremental.keys() == completo.keys()
+    for nombre in completo:
+        pd.testing.assert_frame_equal(incremental[nombre], completo[nombre], obj=nombre)
+
+
+def test_incremental_igual_a_completo_con_sku_disperso(carpeta):
+    base, sku = carpeta
+    pipeline.ejecutar_pipeline(base)
+
+    ruta = os.path.join(base, pipeline.ARCHIVOS["demanda"])
+    demanda = pd.read_csv(ruta)
+    fila = demanda.index[demanda["sku"] == sku][5]
+    demanda.loc[fila, "demanda"] += 3
+    _reescribir(ruta, demanda)
+    incremental = pipeline.ejecutar_pipeline(base)
+
+    limpia = incremental["demanda_limpia"]
+    assert (limpia["sku"] == sku).sum() == (limpia["sku"] == limpia["sku"].iloc[-1]).sum()
+    _comparar(incremental, _completo(base))
+
+
+def test_incremental_reposiciones_igual_a_completo(carpeta):
+    base, _ = carpeta
+    pipeline.ejecutar_pipeline(base)
+
+    ruta = os.path.join(base, pipeline.ARCHIVOS["reposiciones"])
+    reposiciones = pd.read_csv(ruta)
+    reposiciones.loc[reposiciones.index[:5], "cantidad"] += 7
+    _reescribir(ruta, reposiciones)
+
+    _comparar(pipeline.ejecutar_pipeline(base), _completo(base))
+
+
+def test_snapshot_de_otro_motor_se_descarta(carpeta, tmp_path_factory, monkeypatch):
+    base, _ = carpeta
+    monkeypatch.setattr(pipeline, "SNAPSHOT", True)
+    monkeypatch.setattr(pipeline, "CARPETA_SNAPSHOT", str(tmp_path_factory.mktemp("snapshot")))
+    pipeline.ejecutar_pipeline(base)
+
+    pipeline._estado.pop(os.path.abspath(base), None)
+    assert pipeline.cargar_snapshot(base) is not None
+
+    pipeline._estado.pop(os.path.abspath(base), None)
+    monkeypatch.setattr(pipeline, "PREDICCION_SES", "modelo")
+    assert pipeline.cargar_snapshot(base) is None
@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from routes import cloud_loader
+from services import trabajos
+
+ESPERA = 5
+
+
+@pytest.fixture(autouse=True)
+def cola(monkeypatch):
+    """Cola vacía con un único worker y un pool propio para cada test."""
+    monkeypatch.setattr(trabajos, "_trabajos", OrderedDict())
+    monkeypatch.setattr(trabajos, "_pool", None)
+    monkeypatch.setattr(trabajos, "MAX_CONCURRENTES", 1)
+    monkeypatch.setattr(trabajos, "MAX_EN_COLA", 1)
+    yield
+    for trabajo in list(trabajos._trabajos.values()):
+        trabajo["cancelar"] = True
+    if trabajos._pool is not None:
+        trabajos._pool.shutdown(wait=True, cancel_futures=True)
+
+
+class Etapas:
+    """Función por etapas falsa: avisa cada etapa con `progreso` y espera a que el test la libere."""
+
+    def __init__(self, etapas=("lectura", "calculo")):
+        self.etapas = etapas
+        self.empezadas = {etapa: threading.Event() for etapa in etapas}
+        self.liberadas = {etapa: threading.Event() for etapa in etapas}
+        self.llamadas = 0
+
+    def __call__(self, valor, progreso=None):
+        self.llamadas += 1
+        for etapa in self.etapas:
+            progreso(etapa)
+            self.empezadas[etapa].set()
+            assert self.liberadas[etapa].wait(ESPERA)
+        return valor * 2
+
+    def liberar(self):
+        for evento in self.liberadas.values():
+            evento.set()
+
+
+def _encolar(funcion, clave="a", valor=1):
+    return trabajos.encolar("prueba", clave, funcion.etapas, funcion, valor)
+
+
+def _esperar(trabajo_id):
+    trabajos._trabajos[trabajo_id]["futuro"].result(timeout=ESPERA)
+    return trabajos.obtener(trabajo_id)
+
+
+def test_completa_con_progreso_por_etapa():
+    funcion = Etapas()
+    trabajo, nuevo = _encolar(funcion, valor=21)
+    assert nuevo and trabajo["progreso"] == 0
+
+    assert funcion.empezadas["lectura"].wait(ESPERA)
+    en_curso = trabajos.obtener(trabajo["trabajo_id"])
+    assert en_curso["estado"] == "en_curso" and en_curso["etapa"] == "lectura"
+    funcion.liberar()
+
+    final = _esperar(trabajo["trabajo_id"])
+    assert final["estado"] == "completado" and final["progreso"] == 1
+    assert all(etapa["estado"] == "completada" for etapa in final["etapas"].values())
+    assert trabajos.resultado(trabajo["trabajo_id"]) == ("completado", 42)
+
+
+def test_deduplica_trabajos_activos_con_la_misma_clave():
+    funcion = Etapas()
+    primero, _ = _encolar(funcion)
+    repetido, nuevo = _encolar(funcion)
+    assert not nuevo and repetido["trabajo_id"] == primero["trabajo_id"]
+
+    funcion.liberar()
+    _esperar(primero["trabajo_id"])
+    assert funcion.llamadas == 1
+    # Terminado el trabajo, la misma clave lanza uno nuevo
+    otro, nuevo = _encolar(funcion)
+    assert nuevo and otro["trabajo_id"] != primero["trabajo_id"]
+    _esperar(otro["trabajo_id"])
+
+
+def test_cola_llena_da_429():
+    funcion = Etapas()
+    _encolar(funcion, clave="a")
+    assert funcion.empezadas["lectura"].wait(ESPERA)
+    _encolar(funcion, clave="b")
+    with pytest.raises(ValueError, match="Cola de trabajos llena"):
+        _encolar(funcion, clave="c")
+
+    respuesta = cloud_loader.crear_trabajo()
+    assert respuesta.status_code == 429
+    funcion.liberar()
+
+
+def test_cancelar_trabajo_en_cola():
+    funcion = Etapas()
+    en_curso, _ = _encolar(funcion, clave="a")
+    assert funcion.empezadas["lectura"].wait(ESPERA)
+    en_cola, _ = _encolar(funcion, clave="b")
+    assert en_cola["estado"] == "en_cola"
+
+    assert trabajos.cancelar(en_cola["trabajo_id"])["estado"] == "cancelado"
+    funcion.liberar()
+    assert _esperar(en_curso["trabajo_id"])["estado"] == "completado"
+    assert funcion.llamadas == 1
+    assert trabajos.obtener(en_cola["trabajo_id"])["estado"] == "cancelado"
+
+
+def test_cancelar_entre_etapas():
+    funcion = Etapas()
+    trabajo, _ = _encolar(funcion)
+    assert funcion.empezadas["lectura"].wait(ESPERA)
+
+    # En curso: se corta al empezar la etapa siguiente
+    assert trabajos.cancelar(trabajo["trabajo_id"])["estado"] == "en_curso"
+    funcion.liberadas["lectura"].set()
+
+    final = _esperar(trabajo["trabajo_id"])
+    assert final["estado"] == "cancelado"
+    assert final["etapas"]["lectura"]["estado"] == "cancelada"
+    assert final["etapas"]["calculo"]["estado"] == "pendiente"
+    assert not funcion.empezadas["calculo"].is_set()
+    assert trabajos.resultado(trabajo["trabajo_id"]) == ("cancelado", None)
+
+
+def test_purga_los_trabajos_terminados_mas_antiguos(monkeypatch):
+    monkeypatch.setattr(trabajos, "MAX_GUARDADOS", 2)
+    funcion = Etapas()
+    funcion.liberar()
+    ids = []
+    for clave in ("a", "b", "c"):
+        trabajo, _ = _encolar(funcion, clave=clave)
+        _esperar(trabajo["trabajo_id"])
+        ids.append(trabajo["trabajo_id"])
+
+    assert trabajos.obtener(ids[0]) is None
+    assert [t["trabajo_id"] for t in trabajos.listar()] == ids[:0:-1]